@@ -0,0 +1,52 @@
+"""
+Construction time of very wide tables, by parse_obj and parse_obj_bulk.
+
+Usage: python benchmarks/wide_table.py [column counts...]
+"""
+import sys
+import time
+from typing import Callable, List
+
+from firebolt_ingest.table_model import Table
+
+TYPES = ["INTEGER", "TEXT", "TIMESTAMP", "ARRAY(TEXT)", "ARRAY(ARRAY(BIGINT))"]
+
+
+def wide_table_dict(column_count: int) -> dict:
+    columns = [
+        {"name": f"event.col_{i}", "alias": f"col_{i}", "type": TYPES[i % len(TYPES)]}
+        for i in range(column_count)
+    ]
+    return {
+        "table_name": "wide_events",
+        "columns": columns,
+        "primary_index": ["col_0", "col_1"],
+        "partitions": [{"column_name": "col_2", "datetime_part": "DAY"}],
+        "file_type": "PARQUET",
+        "object_pattern": "*.parquet",
+    }
+
+
+def best_of(parse: Callable[[dict], Table], obj: dict, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(obj)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(column_counts: List[int]) -> None:
+    print(f"{'columns':>8} {'parse_obj':>12} {'bulk':>12} {'bulk/column':>12}")
+    for count in column_counts:
+        obj = wide_table_dict(count)
+        assert Table.parse_obj(obj) == Table.parse_obj_bulk(obj)
+        full, bulk = best_of(Table.parse_obj, obj), best_of(Table.parse_obj_bulk, obj)
+        print(
+            f"{count:>8} {full * 1000:>10.1f}ms {bulk * 1000:>10.1f}ms "
+            f"{bulk / count * 1e6:>10.2f}us"
+        )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 2500, 5000, 10000, 20000])
@@ -0,0 +1,308 @@
+import logging
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from firebolt_ingest.column_types import parse_column_type
+from firebolt_ingest.sampling import SamplingSettings, sample_condition
+from firebolt_ingest.table_model import DatetimePart, Partition, Table
+from firebolt_ingest.table_service import TableService
+
+logger = logging.getLogger(__name__)
+
+# files read by sample_external_table, if no sampling is given
+DEFAULT_SAMPLED_FILES = 100
+
+# candidate date/time partitionings, coarsest first. Cyclic parts,
+# e.g. MONTH or DAY, are only combined with the YEAR: alone, each of their
+# partitions would mix data of every year or month of the table.
+PARTITION_DATETIME_GRAINS: List[List[DatetimePart]] = [
+    [DatetimePart.YEAR],
+    [DatetimePart.YEAR, DatetimePart.QUARTER],
+    [DatetimePart.YEAR, DatetimePart.MONTH],
+    [DatetimePart.YEAR, DatetimePart.MONTH, DatetimePart.DAY],
+]
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+_EXTRACTORS: Dict[DatetimePart, Callable[[datetime], int]] = {
+    DatetimePart.YEAR: lambda d: d.year,
+    DatetimePart.QUARTER: lambda d: (d.month - 1) // 3 + 1,
+    DatetimePart.MONTH: lambda d: d.month,
+    DatetimePart.WEEK: lambda d: d.isocalendar()[1],
+    DatetimePart.WEEKISO: lambda d: d.isocalendar()[1],
+    DatetimePart.DAY: lambda d: d.day,
+    DatetimePart.DOW: lambda d: d.isoweekday() % 7,
+    DatetimePart.HOUR: lambda d: d.hour,
+    DatetimePart.MINUTE: lambda d: d.minute,
+    DatetimePart.SECOND: lambda d: d.second,
+    DatetimePart.EPOCH: lambda d: int(d.timestamp()),
+}
+
+
+def extract_datetime_part(value: Any, part: DatetimePart) -> Optional[int]:
+    """
+    Evaluate EXTRACT(part FROM value) locally, None if value isn't a date/time
+    """
+    value = _to_datetime(value)
+    return None if value is None else _EXTRACTORS[part](value)
+
+
+def _hashable(value: Any) -> Any:
+    return tuple(_hashable(v) for v in value) if isinstance(value, list) else value
+
+
+class ColumnStatistics(NamedTuple):
+    column_name: str
+    column_type: str
+    row_count: int
+    distinct_count: int
+    null_ratio: float
+    # the most frequent values with their number of rows
+    top_values: List[tuple]
+
+
+class PartitionCandidate(NamedTuple):
+    partitions: List[Partition]
+    partition_count: int
+    # rows of the largest partition divided by the average rows per partition
+    skew: float
+
+
+class Recommendation(NamedTuple):
+    primary_index: List[str]
+    partitions: List[Partition]
+    column_statistics: List[ColumnStatistics]
+    partition_candidates: List[PartitionCandidate]
+    # explanation of every recommendation, based on the statistics
+    reasons: List[str]
+
+    def apply(self, table: Table) -> Table:
+        """
+        Returns: a copy of the table with the recommended
+            primary index and partitions
+        """
+        return table.copy(
+            update={
+                "primary_index": self.primary_index or table.primary_index,
+                "partitions": self.partitions,
+            },
+            deep=True,
+        )
+
+
+def compute_column_statistics(
+    table: Table, rows: Sequence[Sequence], top: int = 5
+) -> List[ColumnStatistics]:
+    """
+    Compute per-column statistics of sampled rows, whose values
+    are ordered as table.internal_columns.
+    """
+    statistics = []
+    for i, column in enumerate(table.internal_columns):
+        counter = Counter(_hashable(row[i]) for row in rows)
+        null_count = counter.pop(None, 0)
+        statistics.append(
+            ColumnStatistics(
+                column_name=column.alias or column.name,
+                column_type=column.type,
+                row_count=len(rows),
+                distinct_count=len(counter),
+                null_ratio=null_count / len(rows) if rows else 0.0,
+                top_values=counter.most_common(top),
+            )
+        )
+    return statistics
+
+
+def compute_partition_candidates(
+    table: Table,
+    rows: Sequence[Sequence],
+    statistics: List[ColumnStatistics],
+    max_partitions: int,
+) -> List[PartitionCandidate]:
+    """
+    Estimate partition count and skew of candidate partitions:
+    the PARTITION_DATETIME_GRAINS of date/time columns
+    and low-cardinality columns.
+    """
+    candidates = []
+
+    def add_candidate(partitions: List[Partition], values: List[Any]) -> None:
+        counter = Counter(values)
+        if not counter:
+            return
+        mean = len(values) / len(counter)
+        candidates.append(
+            PartitionCandidate(partitions, len(counter), max(counter.values()) / mean)
+        )
+
+    for i, (column, stats) in enumerate(zip(table.internal_columns, statistics)):
+        if column.column_type.is_date_time:
+            for parts in PARTITION_DATETIME_GRAINS:
+                add_candidate(
+                    [
+                        Partition(column_name=stats.column_name, datetime_part=part)
+                        for part in parts
+                    ],
+                    [
+                        tuple(extract_datetime_part(row[i], part) for part in parts)
+                        for row in rows
+                    ],
+                )
+        elif (
+            not column.column_type.is_array
+            and 1 < stats.distinct_count <= max_partitions
+        ):
+            add_candidate(
+                [Partition(column_name=stats.column_name)],
+                [_hashable(row[i]) for row in rows],
+            )
+
+    return candidates
+
+
+def recommend(
+    table: Table,
+    rows: Sequence[Sequence],
+    max_primary_index_columns: int = 3,
+    max_null_ratio: float = 0.5,
+    max_distinct_ratio: float = 0.9,
+    min_partitions: int = 2,
+    max_partitions: int = 1000,
+    max_skew: float = 5.0,
+    min_rows_per_partition: int = 10,
+) -> Recommendation:
+    """
+    Recommend primary index and partitioning from sampled rows,
+    whose values are ordered as table.internal_columns.
+
+    The primary index consists of the columns with the lowest cardinality,
+    ordered by ascending cardinality, skipping constant, mostly-null, array
+    and almost unique columns, i.e. with more than max_distinct_ratio
+    distinct values per non-null row. The partition is the candidate with
+    the lowest skew among those with min_partitions to max_partitions
+    partitions and at least min_rows_per_partition sampled rows per partition
+    on average, preferring more partitions on equal skew.
+    """
+    statistics = compute_column_statistics(table, rows)
+    candidates = compute_partition_candidates(table, rows, statistics, max_partitions)
+    reasons = []
+
+    index_candidates = sorted(
+        (
+            s
+            for s in statistics
+            if s.distinct_count > 1
+            and s.null_ratio <= max_null_ratio
+            and s.distinct_count
+            <= max_distinct_ratio * s.row_count * (1 - s.null_ratio)
+            and not parse_column_type(s.column_type).is_array
+        ),
+        key=lambda s: s.distinct_count,
+    )[:max_primary_index_columns]
+    for s in index_candidates:
+        reasons.append(
+            f"primary index {s.column_name}: {s.distinct_count} distinct values "
+            f"in {s.row_count} sampled rows, null ratio {s.null_ratio:.2f}"
+        )
+
+    partitions: List[Partition] = []
+    acceptable = [
+        c
+        for c in candidates
+        if min_partitions <= c.partition_count <= max_partitions
+        and c.partition_count * min_rows_per_partition <= len(rows)
+        and c.skew <= max_skew
+    ]
+    if acceptable:
+        best = min(acceptable, key=lambda c: (c.skew, -c.partition_count))
+        partitions = best.partitions
+        reasons.append(
+            f"partition by {', '.join(p.as_sql_string() for p in partitions)}: "
+            f"{best.partition_count} partitions in the sample, skew {best.skew:.2f}"
+        )
+    else:
+        reasons.append(
+            f"no partitioning: no candidate has {min_partitions} to "
+            f"{max_partitions} partitions of at least {min_rows_per_partition} "
+            f"sampled rows with skew below {max_skew}"
+        )
+
+    return Recommendation(
+        primary_index=[s.column_name for s in index_candidates],
+        partitions=partitions,
+        column_statistics=statistics,
+        partition_candidates=candidates,
+        reasons=reasons,
+    )
+
+
+def sample_external_table(
+    table_service: TableService,
+    sample_size: int = 100_000,
+    sampling: Optional[SamplingSettings] = None,
+) -> List[Sequence]:
+    """
+    Read a sample of at most sample_size rows of the external table, that pass
+    the table filter, with transformed columns ordered as table.internal_columns.
+    The files are sampled by the hash of source_file_name, like in sampling
+    mode, so only the sampled files are read, and sample_size bounds
+    the rows held in memory.
+    Works on any DB-API connection, e.g. a sqlite3 database with a CITY_HASH
+    function standing in for the engine.
+
+    Args:
+        table_service: service of the table to sample
+        sample_size: maximum number of rows to read
+        sampling: (Optional) the files to read,
+            DEFAULT_SAMPLED_FILES files by default
+    """
+    table = table_service.table
+    sampling = sampling or SamplingSettings(file_count=DEFAULT_SAMPLED_FILES)
+    conditions = [sample_condition(sampling, table_service.external_table_name)]
+    if table.filter:
+        conditions.append(f"({table.filter})")
+    query = (
+        f"SELECT {', '.join(table.generate_select_list())} "
+        f"FROM {table_service.external_table_name} "
+        f"WHERE {' AND '.join(conditions)} "
+        "LIMIT ?"
+    )
+
+    cursor = table_service.connection.cursor()
+    cursor.execute(query, [sample_size])
+    rows = cursor.fetchall()
+    logger.info(f"Sampled {len(rows)} rows of {table_service.external_table_name}")
+    return rows  # type: ignore
+
+
+def advise(
+    table_service: TableService,
+    sample_size: int = 100_000,
+    sampling: Optional[SamplingSettings] = None,
+    **kwargs,
+) -> Recommendation:
+    """
+    Sample the external table and recommend primary index and partitioning.
+
+    Args:
+        table_service: service of the table to advise on
+        sample_size: number of rows to sample
+        sampling: (Optional) the files to sample, see sample_external_table
+        **kwargs: Additional keyword arguments which are passed to recommend.
+    """
+    rows = sample_external_table(table_service, sample_size, sampling)
+    return recommend(table_service.table, rows, **kwargs)
@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Union
+
+PartitionValue = Union[int, date]
+
+
+class BackfillResult(NamedTuple):
+    completed: List[PartitionValue]
+    # values completed by a previous, interrupted run
+    skipped: List[PartitionValue]
+    # partition value -> error
+    failed: Dict[PartitionValue, str]
+
+
+def partition_values(
+    start: PartitionValue, end: PartitionValue
+) -> List[PartitionValue]:
+    """
+    Enumerate partition values between start and end, both inclusive.
+    Integers are enumerated with step 1, dates day by day.
+    """
+    if isinstance(start, date) and isinstance(end, date):
+        return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    if isinstance(start, int) and isinstance(end, int):
+        return list(range(start, end + 1))
+    raise ValueError(
+        f"Cannot enumerate partition values from {start!r} to {end!r}, "
+        f"expected two integers or two dates"
+    )
+
+
+class BackfillProgress:
+    def __init__(
+        self, path: str, table_name: str, start: PartitionValue, end: PartitionValue
+    ):
+        """
+        Completed backfill units, persisted in a json file after every unit,
+        so an interrupted backfill resumes where it left off.
+        Progress is kept per table and range, a backfill of another range
+        doesn't skip the values completed by this one.
+
+        Args:
+            path: path of the progress file
+            table_name: name of the backfilled table, progress of other tables
+                and ranges in the same file is kept
+            start: first partition value of the range
+            end: last partition value of the range
+        """
+        self.path = path
+        self.key = f"{table_name}:{start}..{end}"
+        self._lock = threading.Lock()
+
+        self._state: Dict[str, List[str]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._state = json.load(f)
+        self._completed = set(self._state.get(self.key, []))
+
+    def is_completed(self, value: PartitionValue) -> bool:
+        return str(value) in self._completed
+
+    def mark_completed(self, value: PartitionValue) -> None:
+        with self._lock:
+            self._completed.add(str(value))
+            self._state[self.key] = sorted(self._completed)
+            self._save()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._completed.clear()
+            self._state.pop(self.key, None)
+            self._save()
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.path)
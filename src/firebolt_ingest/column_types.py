@@ -0,0 +1,211 @@
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# accepted type names -> canonical name
+# see: https://docs.firebolt.io/general-reference/data-types.html
+TYPE_ALIASES: Dict[str, str] = {
+    "INT": "INTEGER",
+    "INTEGER": "INTEGER",
+    "BIGINT": "BIGINT",
+    "LONG": "BIGINT",
+    "REAL": "REAL",
+    "FLOAT": "REAL",
+    "DOUBLE": "DOUBLE",
+    "DOUBLE PRECISION": "DOUBLE",
+    "DECIMAL": "DECIMAL",
+    "NUMERIC": "DECIMAL",
+    "TEXT": "TEXT",
+    "VARCHAR": "TEXT",
+    "STRING": "TEXT",
+    "DATE": "DATE",
+    "PGDATE": "DATE",
+    "DATETIME": "TIMESTAMP",
+    "TIMESTAMP": "TIMESTAMP",
+    "TIMESTAMPNTZ": "TIMESTAMP",
+    "TIMESTAMPTZ": "TIMESTAMPTZ",
+    "BOOLEAN": "BOOLEAN",
+}
+
+DECIMAL_DEFAULT_PARAMS = (38, 9)
+
+_TOKEN_REGEX = re.compile(r"\s*(?:([A-Za-z_]+)|(\d+)|([(),]))")
+
+
+class ColumnType:
+    """
+    A parsed column type with normalized aliases. Instances are interned:
+    equal types are the same object, so equality and hashing are O(1).
+    """
+
+    __slots__ = ("name", "params", "element")
+
+    _interned: Dict[Tuple, "ColumnType"] = {}
+    _lock = threading.Lock()
+
+    name: str
+    params: Tuple[int, ...]
+    element: Optional["ColumnType"]
+
+    def __new__(
+        cls,
+        name: str,
+        params: Tuple[int, ...] = (),
+        element: Optional["ColumnType"] = None,
+    ) -> "ColumnType":
+        key = (name, params, element)
+        instance = cls._interned.get(key)
+        if instance is None:
+            with cls._lock:
+                instance = cls._interned.get(key)
+                if instance is None:
+                    instance = super().__new__(cls)
+                    object.__setattr__(instance, "name", name)
+                    object.__setattr__(instance, "params", params)
+                    object.__setattr__(instance, "element", element)
+                    cls._interned[key] = instance
+        return instance
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ColumnType is immutable")
+
+    def __reduce__(self):
+        return ColumnType, (self.name, self.params, self.element)
+
+    def __eq__(self, other: object) -> bool:
+        return self is other
+
+    def __hash__(self) -> int:
+        return id(self)
+
+    def __str__(self) -> str:
+        if self.element is not None:
+            return f"ARRAY({self.element})"
+        if self.params:
+            return f"{self.name}({','.join(str(p) for p in self.params)})"
+        return self.name
+
+    def __repr__(self) -> str:
+        return f"ColumnType({str(self)!r})"
+
+    @property
+    def is_array(self) -> bool:
+        return self.element is not None
+
+    @property
+    def is_date_time(self) -> bool:
+        return self.name in {"DATE", "TIMESTAMP"}
+
+
+def _tokenize(type_: str) -> List[str]:
+    tokens, position = [], 0
+    type_ = type_.rstrip()
+    while position < len(type_):
+        match = _TOKEN_REGEX.match(type_, position)
+        if not match:
+            raise ValueError(f"Unexpected character in column type {type_}")
+        tokens.append(match.group(match.lastindex).upper())  # type: ignore
+        position = match.end()
+    return tokens
+
+
+@lru_cache(maxsize=None)
+def parse_column_type(type_: str) -> ColumnType:
+    """
+    Parse a column type, e.g. "INT", "ARRAY(ARRAY(TEXT))" or "DECIMAL(10, 2)".
+    Parsing is case-insensitive and cached per type string.
+
+    Raises:
+        ValueError: if the type is unknown or malformed
+    """
+    tokens = _tokenize(type_)
+    position = 0
+
+    def expect(token: str) -> None:
+        nonlocal position
+        if position >= len(tokens) or tokens[position] != token:
+            raise ValueError(f"Expected {token} in column type {type_}")
+        position += 1
+
+    def parse() -> ColumnType:
+        nonlocal position
+        if position >= len(tokens) or not tokens[position][0].isalpha():
+            raise ValueError(f"Expected a type name in column type {type_}")
+        name = tokens[position]
+        position += 1
+        if name == "DOUBLE" and tokens[position : position + 1] == ["PRECISION"]:
+            name, position = "DOUBLE PRECISION", position + 1
+
+        if name == "ARRAY":
+            expect("(")
+            element = parse()
+            expect(")")
+            return ColumnType("ARRAY", (), element)
+
+        if name not in TYPE_ALIASES:
+            raise ValueError(f"Unknown column type {name} in {type_}")
+        canonical = TYPE_ALIASES[name]
+
+        params: Tuple[int, ...] = ()
+        if canonical == "DECIMAL":
+            params = DECIMAL_DEFAULT_PARAMS
+            if tokens[position : position + 1] == ["("]:
+                position += 1
+                values = [_parse_int(tokens, position, type_)]
+                position += 1
+                if tokens[position : position + 1] == [","]:
+                    values.append(_parse_int(tokens, position + 1, type_))
+                    position += 2
+                else:
+                    values.append(0)
+                expect(")")
+                params = (values[0], values[1])
+        return ColumnType(canonical, params)
+
+    column_type = parse()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {tokens[position]} in column type {type_}")
+    return column_type
+
+
+def _parse_int(tokens: List[str], position: int, type_: str) -> int:
+    if position >= len(tokens) or not tokens[position].isdigit():
+        raise ValueError(f"Expected a number in column type {type_}")
+    return int(tokens[position])
+
+
+def normalize_column_type(type_: str) -> str:
+    """
+    Returns: the canonical form of a type, or the upper-cased type
+        if it cannot be parsed, e.g. a type unknown to this library
+    """
+    try:
+        return str(parse_column_type(type_))
+    except ValueError:
+        return type_.strip().upper()
+
+
+# zero values of the column types, by canonical type name
+_ZERO_VALUES: Dict[str, str] = {
+    "INTEGER": "0",
+    "BIGINT": "0",
+    "REAL": "0",
+    "DOUBLE": "0",
+    "DECIMAL": "0",
+    "TEXT": "''",
+    "DATE": "'1970-01-01'",
+    "TIMESTAMP": "'1970-01-01 00:00:00'",
+    "TIMESTAMPTZ": "'1970-01-01 00:00:00+00'",
+    "BOOLEAN": "FALSE",
+}
+
+
+def zero_value_sql(column_type: ColumnType) -> str:
+    """
+    Returns: a sql expression of the zero value of the type,
+        e.g. 0, '' or an empty array
+    """
+    if column_type.element is not None:
+        return f"CAST([] AS {column_type})"
+    return f"CAST({_ZERO_VALUES[column_type.name]} AS {column_type})"
@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from pydantic import BaseModel, Field, root_validator
+
+from firebolt_ingest.metrics import IngestionMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencySettings(BaseModel):
+    """
+    Bounds and tuning of the adaptive concurrency limit.
+
+    The limit grows by increase_step after every limit consecutive statements,
+    which were faster than latency_target_seconds, and is multiplied by
+    decrease_factor after a failed or slow statement.
+    """
+
+    min_limit: int = Field(default=1, ge=1)
+    max_limit: int = Field(default=16, ge=1)
+    initial_limit: int = Field(default=2, ge=1)
+    latency_target_seconds: float = Field(default=300.0, gt=0)
+    increase_step: int = Field(default=1, ge=1)
+    decrease_factor: float = Field(default=0.5, gt=0, lt=1)
+
+    @root_validator(skip_on_failure=True)
+    def limits_validator(cls, values):
+        if not values["min_limit"] <= values["initial_limit"] <= values["max_limit"]:
+            raise ValueError(
+                "Expected min_limit <= initial_limit <= max_limit, got "
+                f"{values['min_limit']}, {values['initial_limit']}, "
+                f"{values['max_limit']}"
+            )
+        return values
+
+
+class AdaptiveConcurrency:
+    def __init__(
+        self,
+        settings: Optional[ConcurrencySettings] = None,
+        engine_name: str = "default",
+        metrics: Optional[IngestionMetrics] = None,
+    ):
+        """
+        AIMD limit of the statements running at the same time on one engine.
+        Share one instance between everything ingesting into the engine.
+
+        Args:
+            settings: (Optional) bounds and tuning of the limit
+            engine_name: label of the engine in the metrics
+            metrics: (Optional) metrics to publish the limit and in-flight count to
+        """
+        self.settings = settings or ConcurrencySettings()
+        self.engine_name = engine_name
+        self.metrics = metrics
+        self._limit = self.settings.initial_limit
+        self._in_flight = 0
+        self._successes = 0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        """
+        Wait until the limit allows another statement, then time the block
+        and adjust the limit to its latency and outcome.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+            self._publish()
+
+        started = time.monotonic()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._record(started, time.monotonic() - started, failed)
+                self._condition.notify_all()
+
+    def record(self, started: float, latency: float, failed: bool) -> None:
+        """
+        Adjust the limit to a statement, that started at the given
+        time.monotonic() and took latency seconds.
+        """
+        with self._condition:
+            self._record(started, latency, failed)
+            self._condition.notify_all()
+
+    def _record(self, started: float, latency: float, failed: bool) -> None:
+        if failed or latency > self.settings.latency_target_seconds:
+            self._successes = 0
+            # statements, that were running at the last decrease,
+            # saw the same overload and must not decrease again
+            if started >= self._last_decrease:
+                self._last_decrease = time.monotonic()
+                limit = max(
+                    self.settings.min_limit,
+                    int(self._limit * self.settings.decrease_factor),
+                )
+                if limit != self._limit:
+                    logger.info(
+                        f"Decrease concurrency of {self.engine_name} "
+                        f"to {limit}, latency {latency:.1f}s, failed {failed}"
+                    )
+                self._limit = limit
+        else:
+            self._successes += 1
+            if self._successes >= self._limit:
+                self._successes = 0
+                self._limit = min(
+                    self.settings.max_limit, self._limit + self.settings.increase_step
+                )
+        self._publish()
+
+    def _publish(self) -> None:
+        if self.metrics:
+            self.metrics.concurrency_limit.set(self._limit, engine=self.engine_name)
+            self.metrics.concurrency_in_flight.set(
+                self._in_flight, engine=self.engine_name
+            )
@@ -0,0 +1,76 @@
+import hashlib
+import logging
+import os
+import pickle
+import sys
+from typing import Dict, List
+
+from pydantic import VERSION as PYDANTIC_VERSION
+
+from firebolt_ingest import __version__
+from firebolt_ingest.table_model import Table
+
+logger = logging.getLogger(__name__)
+
+# cached models are only valid for the same library, pydantic and python versions
+CACHE_VERSION = (
+    f"{__version__}-{PYDANTIC_VERSION}-{sys.version_info[0]}.{sys.version_info[1]}"
+)
+
+
+class TableConfigCache:
+    def __init__(self, cache_dir: str):
+        """
+        On-disk cache of parsed and validated Table configs.
+
+        Entries are keyed by the hash of the yaml content, so an edited config
+        is parsed and validated again, and are stored pickled, so a cached
+        config loads without parsing yaml and without running the validators.
+        The cache directory must only be writable by trusted users,
+        since unpickling its files can execute code.
+
+        Args:
+            cache_dir: directory of the cache files, created if it doesn't exist
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, content: bytes) -> str:
+        key = hashlib.sha256(CACHE_VERSION.encode() + b"\0" + content).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.pickle")
+
+    def load(self, path: str) -> Table:
+        """
+        Returns: the table of a yaml config file, from the cache if possible
+        """
+        with open(path, "rb") as f:
+            content = f.read()
+
+        cache_path = self._cache_path(content)
+        try:
+            with open(cache_path, "rb") as f:
+                table = pickle.load(f)
+            if isinstance(table, Table):
+                return table
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.warning(f"Ignore unreadable cache entry {cache_path} of {path}")
+
+        table = Table.parse_yaml(content)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        return table
+
+    def load_many(self, paths: List[str]) -> Dict[str, Table]:
+        """
+        Returns: config path -> table
+        """
+        return {path: self.load(path) for path in paths}
+
+    def clear(self) -> None:
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pickle"):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+# a statement and its parameters
+Statement = Tuple[str, Sequence]
+
+
+class EnsureResult(NamedTuple):
+    # one of "created", "recreated", "unchanged", "rebuild_required"
+    action: str
+    # human-readable explanation of the action
+    reason: str
+
+
+def render_ddl(statements: Sequence[Statement]) -> str:
+    """
+    Returns: the statements with their parameters, one per line,
+        with whitespace collapsed, so formatting doesn't change fingerprints
+    """
+    return "\n".join(
+        f"{' '.join(query.split())};"
+        + (f" -- {json.dumps(list(params), default=str)}" if params else "")
+        for query, params in statements
+    )
+
+
+def ddl_fingerprint(statements: Sequence[Statement]) -> str:
+    """
+    Returns: a hash of the statements and their parameters
+    """
+    return hashlib.sha256(render_ddl(statements).encode()).hexdigest()
+
+
+class DdlFingerprintStore:
+    def __init__(self, path: str):
+        """
+        Fingerprints of the DDL, tables were created with,
+        persisted in a json file after every change.
+
+        Args:
+            path: path of the fingerprint file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        self._state: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._state = json.load(f)
+
+    def get(self, table_name: str) -> Optional[Dict[str, str]]:
+        """
+        Returns: the stored "fingerprint" and "ddl" of the table, if any
+        """
+        return self._state.get(table_name)
+
+    def set(self, table_name: str, fingerprint: str, ddl: str) -> None:
+        with self._lock:
+            self._state[table_name] = {"fingerprint": fingerprint, "ddl": ddl}
+            self._save()
+
+    def remove(self, table_name: str) -> None:
+        with self._lock:
+            if self._state.pop(table_name, None) is not None:
+                self._save()
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,139 @@
+import hashlib
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
+from typing import Any, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class SourceFile(NamedTuple):
+    """
+    A single object found in the source location.
+
+    name is the value the external table reports as source_file_name.
+    """
+
+    name: str
+    size: int
+    timestamp: datetime
+    etag: Optional[str] = None
+
+
+class FileSource(ABC):
+    """
+    Lists the objects of the location an external table reads from.
+    Listing should be cheap compared to scanning the external table.
+    """
+
+    @abstractmethod
+    def list_files(self) -> List[SourceFile]:
+        raise NotImplementedError
+
+
+def match_object_pattern(name: str, relative_name: str, object_pattern: str) -> bool:
+    """
+    Check whether an object matches the object_pattern of the external table.
+    The pattern is applied both to the full name and to the name relative
+    to the table url.
+    """
+    return fnmatchcase(relative_name, object_pattern) or fnmatchcase(
+        name, object_pattern
+    )
+
+
+class LocalFileSource(FileSource):
+    """
+    Local directory standing in for an S3 prefix, useful for tests
+    and local development. File names are reported relative to the root,
+    with "/" as the separator. With content_hash, the etag of a file
+    is the md5 of its content, the same as S3 reports for simple uploads.
+    """
+
+    def __init__(
+        self, root: str, object_pattern: str = "*", content_hash: bool = False
+    ):
+        self.root = root
+        self.object_pattern = object_pattern
+        self.content_hash = content_hash
+
+    def list_files(self) -> List[SourceFile]:
+        files = []
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if not match_object_pattern(name, name, self.object_pattern):
+                    continue
+
+                stat = os.stat(path)
+                files.append(
+                    SourceFile(
+                        name=name,
+                        size=stat.st_size,
+                        timestamp=datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+                        etag=file_md5(path) if self.content_hash else None,
+                    )
+                )
+        return sorted(files)
+
+
+def file_md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_s3_url(s3_url: str) -> Tuple[str, str]:
+    """
+    Split an s3 url into the bucket and the key prefix
+    """
+    parsed = urlparse(s3_url)
+    return parsed.netloc, parsed.path.lstrip("/")
+
+
+class S3FileSource(FileSource):
+    """
+    Lists objects under an S3 prefix. File names are the full object keys,
+    the same way Firebolt reports them in source_file_name.
+
+    Requires boto3, install it with `pip install firebolt-ingest[s3]`
+    """
+
+    def __init__(self, s3_url: str, object_pattern: str = "*", client: Any = None):
+        self.bucket, self.prefix = parse_s3_url(s3_url)
+        self.object_pattern = object_pattern
+
+        if client is None:
+            try:
+                import boto3  # type: ignore
+            except ImportError as e:
+                raise ImportError(
+                    "boto3 is required for S3FileSource, "
+                    "install it with `pip install firebolt-ingest[s3]`"
+                ) from e
+            client = boto3.client("s3")
+        self.client = client
+
+    def list_files(self) -> List[SourceFile]:
+        files = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if not match_object_pattern(
+                    key, key[len(self.prefix) :], self.object_pattern
+                ):
+                    continue
+
+                files.append(
+                    SourceFile(
+                        name=key,
+                        size=obj["Size"],
+                        timestamp=obj["LastModified"],
+                        etag=obj.get("ETag", "").strip('"') or None,
+                    )
+                )
+        return files
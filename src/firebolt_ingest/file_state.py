@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from firebolt_ingest.file_source import SourceFile
+
+
+class FileChanges(NamedTuple):
+    # files, that aren't ingested yet
+    new: List[SourceFile]
+    # ingested files, whose etag differs from the stored one
+    changed: List[SourceFile]
+    # ingested files with the stored etag, or without an etag to compare
+    unchanged: List[SourceFile]
+
+
+class FileStateStore:
+    def __init__(self, path: str, table_name: str):
+        """
+        ETags of the ingested source files, persisted in a json file
+        after every change. Files of other tables in the same file are kept.
+
+        Args:
+            path: path of the state file
+            table_name: name of the table, the files are ingested into
+        """
+        self.path = path
+        self.table_name = table_name
+        self._lock = threading.Lock()
+
+        self._state: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._state = json.load(f)
+        self._etags: Dict[str, str] = self._state.setdefault(table_name, {})
+        self._names_by_etag: Dict[str, str] = {}
+        for name, etag in self._etags.items():
+            self._names_by_etag.setdefault(etag, name)
+
+    def get_etag(self, file_name: str) -> Optional[str]:
+        return self._etags.get(file_name)
+
+    def get_file_name(self, etag: str) -> Optional[str]:
+        """
+        Returns: the name of an ingested file with this etag, if any
+        """
+        return self._names_by_etag.get(etag)
+
+    def mark_ingested(self, files: Iterable[SourceFile]) -> None:
+        """
+        Store the etags of ingested files, files without an etag are ignored
+        """
+        with self._lock:
+            for f in files:
+                if f.etag:
+                    self._etags[f.name] = f.etag
+                    self._names_by_etag.setdefault(f.etag, f.name)
+            self._save()
+
+    def remove(self, file_names: Iterable[str]) -> None:
+        with self._lock:
+            for name in file_names:
+                self._etags.pop(name, None)
+            self._names_by_etag = {}
+            for name, etag in self._etags.items():
+                self._names_by_etag.setdefault(etag, name)
+            self._save()
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.path)
+
+
+def split_identical_files(
+    files: Sequence[SourceFile],
+    state: FileStateStore,
+    pending: Iterable[SourceFile] = (),
+) -> Tuple[List[SourceFile], Dict[str, str]]:
+    """
+    Separate files, that are byte-identical to an ingested or pending file
+    or to an earlier file of the list, judged by the etag.
+    Files without an etag are never considered identical.
+    Used by the watch mode, other insert modes don't list the source
+    and don't skip identical files.
+
+    Args:
+        files: candidate files
+        state: etags of the ingested files
+        pending: files, that are buffered or being ingested
+
+    Returns: the files to ingest, and duplicate file name -> identical file name
+    """
+    seen = {f.etag: f.name for f in pending if f.etag}
+    unique_files, duplicates = [], {}
+    for f in files:
+        identical = (
+            (state.get_file_name(f.etag) or seen.get(f.etag)) if f.etag else None
+        )
+        if identical is not None and identical != f.name:
+            duplicates[f.name] = identical
+            continue
+        if f.etag:
+            seen.setdefault(f.etag, f.name)
+        unique_files.append(f)
+    return unique_files, duplicates
+
+
+def detect_file_changes(
+    files: Sequence[SourceFile],
+    state: FileStateStore,
+    ingested_file_names: Set[str],
+) -> FileChanges:
+    """
+    Classify listed files by their etag, regardless of their timestamp,
+    so a touched but unchanged file is unchanged, and a rewritten file
+    with a preserved timestamp is changed.
+    Ingested files without a stored etag are taken as unchanged,
+    their current etag becomes the baseline, once stored.
+
+    Args:
+        files: listed source files
+        state: etags of the ingested files
+        ingested_file_names: names of the files in the internal table
+
+    Returns: new, changed and unchanged files
+    """
+    changes = FileChanges([], [], [])
+    for f in files:
+        if f.name not in ingested_file_names:
+            changes.new.append(f)
+            continue
+        stored_etag = state.get_etag(f.name)
+        if f.etag and stored_etag and f.etag != stored_etag:
+            changes.changed.append(f)
+        else:
+            changes.unchanged.append(f)
+    return changes
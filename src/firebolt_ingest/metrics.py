@@ -0,0 +1,339 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from firebolt_ingest.run_log import IngestionRun, RunOutcome
+
+DEFAULT_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    labels = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.label_names}, "
+                f"got {tuple(labels)}"
+            )
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}"
+                for k, v in sorted(self._values.items())
+            ]
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> (bucket counts, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels: str) -> int:
+        counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+        return counts[-1]
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    le = f'le="{_format_value(bound)}"'
+                    labels = _format_labels(self.label_names, key, le)
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Any) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str]) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str]) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """
+        Returns: all metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() + "\n" for metric in metrics)
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Write the metrics for the node_exporter textfile collector.
+        The file is replaced atomically, so a scrape never sees a partial file.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port: int, addr: str = "") -> ThreadingHTTPServer:
+        """
+        Serve the metrics over http in a daemon thread, e.g. for watch mode.
+        Stop the server with server.shutdown().
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        server = ThreadingHTTPServer((addr, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+
+def statement_kind(query: str) -> str:
+    """
+    Returns: the first keyword of a statement, e.g. SELECT or INSERT
+    """
+    words = query.split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+def statement_argument(args: tuple, kwargs: Dict[str, Any]) -> str:
+    """
+    Returns: the query of cursor.execute arguments, passed by position or name
+    """
+    return kwargs["query"] if "query" in kwargs else args[0]
+
+
+class IngestionMetrics:
+    def __init__(
+        self,
+        registry: Optional[MetricsRegistry] = None,
+        prefix: str = "firebolt_ingest",
+    ):
+        """
+        Ingestion metrics, labeled by table. Pass it to TableService to have
+        statements and ingest runs recorded. Recording never adds statements:
+        rows and files ingested are only counted where the statements of
+        the run report them.
+
+        Args:
+            registry: (Optional) registry to add the metrics to
+            prefix: prefix of the metric names
+        """
+        self.registry = registry or MetricsRegistry()
+        self.statements = self.registry.counter(
+            f"{prefix}_statements_total",
+            "Statements executed, by kind",
+            ["table", "kind"],
+        )
+        self.statement_errors = self.registry.counter(
+            f"{prefix}_statement_errors_total",
+            "Statements failed, by kind",
+            ["table", "kind"],
+        )
+        self.step_duration = self.registry.histogram(
+            f"{prefix}_step_duration_seconds",
+            "Duration of ingestion steps",
+            ["table", "step"],
+        )
+        self.runs = self.registry.counter(
+            f"{prefix}_runs_total", "Ingestion runs, by outcome", ["table", "outcome"]
+        )
+        self.rows_ingested = self.registry.counter(
+            f"{prefix}_rows_ingested_total", "Rows ingested", ["table"]
+        )
+        self.files_ingested = self.registry.counter(
+            f"{prefix}_files_ingested_total", "Files ingested", ["table"]
+        )
+        self.verification_failures = self.registry.counter(
+            f"{prefix}_verification_failures_total",
+            "Ingestions, that failed verification",
+            ["table"],
+        )
+        self.retries = self.registry.counter(
+            f"{prefix}_retries_total", "Retried inserts", ["table"]
+        )
+        self.in_flight = self.registry.gauge(
+            f"{prefix}_in_flight_ingestions", "Ingestions in progress", ["table"]
+        )
+        self.concurrency_limit = self.registry.gauge(
+            f"{prefix}_concurrency_limit",
+            "Adaptive limit of concurrent statements",
+            ["engine"],
+        )
+        self.concurrency_in_flight = self.registry.gauge(
+            f"{prefix}_concurrency_in_flight",
+            "Statements running under the adaptive limit",
+            ["engine"],
+        )
+
+    def observe_statement(self, table: str, query: str, failed: bool) -> None:
+        kind = statement_kind(query)
+        self.statements.inc(table=table, kind=kind)
+        if failed:
+            self.statement_errors.inc(table=table, kind=kind)
+
+    def observe_run(self, run: IngestionRun) -> None:
+        """
+        Record the step durations, ingested data and outcome of an ingest run,
+        rows and files are skipped if the run did not report them
+        """
+        table = run.table_name
+        for step, duration in run.step_durations.items():
+            self.step_duration.observe(duration, table=table, step=step)
+        self.runs.inc(
+            table=table, outcome=run.outcome.value if run.outcome else "unknown"
+        )
+        if run.outcome == RunOutcome.UNVERIFIED:
+            self.verification_failures.inc(table=table)
+        if run.retries:
+            self.retries.inc(run.retries, table=table)
+        if run.rows_ingested:
+            self.rows_ingested.inc(max(run.rows_ingested, 0), table=table)
+        if run.files_ingested:
+            self.files_ingested.inc(max(run.files_ingested, 0), table=table)
+
+
+class MeteredCursor:
+    def __init__(self, cursor: Any, metrics: IngestionMetrics, table: str):
+        """
+        Cursor proxy counting the executed statements by kind
+        """
+        self._cursor = cursor
+        self._metrics = metrics
+        self._table = table
+
+    def execute(self, *args: Any, **kwargs: Any) -> Any:
+        query = statement_argument(args, kwargs)
+        try:
+            result = self._cursor.execute(*args, **kwargs)
+        except Exception:
+            self._metrics.observe_statement(self._table, query, failed=True)
+            raise
+        self._metrics.observe_statement(self._table, query, failed=False)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
@@ -0,0 +1,376 @@
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+from urllib.parse import unquote_plus
+
+from firebolt.common.exception import FireboltError
+
+from firebolt_ingest.file_source import match_object_pattern, parse_s3_url
+from firebolt_ingest.table_service import TableService
+from firebolt_ingest.table_utils import is_engine_unavailable_error
+
+logger = logging.getLogger(__name__)
+
+
+class S3ObjectEvent(NamedTuple):
+    event_name: str
+    bucket: str
+    key: str
+    size: int = 0
+    etag: Optional[str] = None
+
+
+def parse_s3_event_notification(body: str) -> List[S3ObjectEvent]:
+    """
+    Parse the body of an S3 event notification, either delivered
+    to SQS directly or wrapped into an SNS notification.
+
+    Raises:
+        ValueError, KeyError or TypeError if the body is malformed
+    """
+    payload = json.loads(body)
+    if isinstance(payload.get("Message"), str):
+        payload = json.loads(payload["Message"])
+
+    events = []
+    for record in payload.get("Records", []):
+        s3_object = record["s3"]["object"]
+        events.append(
+            S3ObjectEvent(
+                event_name=record["eventName"],
+                bucket=record["s3"]["bucket"]["name"],
+                key=unquote_plus(s3_object["key"]),
+                size=s3_object.get("size", 0),
+                etag=s3_object.get("eTag"),
+            )
+        )
+    return events
+
+
+class QueueMessage(NamedTuple):
+    message_id: str
+    body: str
+    receipt_handle: Any = None
+
+
+class MessageQueue(ABC):
+    """
+    A queue of notifications. Received messages, that are neither acknowledged
+    nor dead-lettered, are expected to be redelivered by the queue.
+    """
+
+    @abstractmethod
+    def receive(self, max_messages: int) -> List[QueueMessage]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def ack(self, message: QueueMessage) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def dead_letter(self, message: QueueMessage, reason: str) -> None:
+        raise NotImplementedError
+
+
+class LocalMessageQueue(MessageQueue):
+    """
+    In-memory queue standing in for SQS, useful for tests and local development
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._pending: Deque[QueueMessage] = deque()
+        self.in_flight: Dict[str, QueueMessage] = OrderedDict()
+        self.dead_letters: List[Tuple[QueueMessage, str]] = []
+
+    def send(self, body: str) -> QueueMessage:
+        with self._lock:
+            self._next_id += 1
+            message = QueueMessage(message_id=str(self._next_id), body=body)
+            self._pending.append(message)
+        return message
+
+    def receive(self, max_messages: int) -> List[QueueMessage]:
+        with self._lock:
+            messages: List[QueueMessage] = []
+            while self._pending and len(messages) < max_messages:
+                message = self._pending.popleft()
+                self.in_flight[message.message_id] = message
+                messages.append(message)
+        return messages
+
+    def ack(self, message: QueueMessage) -> None:
+        with self._lock:
+            self.in_flight.pop(message.message_id, None)
+
+    def dead_letter(self, message: QueueMessage, reason: str) -> None:
+        with self._lock:
+            self.in_flight.pop(message.message_id, None)
+            self.dead_letters.append((message, reason))
+
+    def redeliver(self) -> None:
+        """
+        Return unacknowledged messages to the queue,
+        like an expired SQS visibility timeout does
+        """
+        with self._lock:
+            self._pending.extendleft(reversed(list(self.in_flight.values())))
+            self.in_flight.clear()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class SQSMessageQueue(MessageQueue):
+    """
+    SQS queue receiving S3 event notifications.
+
+    Failed messages are sent to dead_letter_queue_url, if provided. Otherwise,
+    they are left in the queue for its redrive policy to move them.
+
+    Requires boto3, install it with `pip install firebolt-ingest[s3]`
+    """
+
+    def __init__(
+        self,
+        queue_url: str,
+        dead_letter_queue_url: Optional[str] = None,
+        wait_time_seconds: int = 20,
+        client: Any = None,
+    ):
+        self.queue_url = queue_url
+        self.dead_letter_queue_url = dead_letter_queue_url
+        self.wait_time_seconds = wait_time_seconds
+
+        if client is None:
+            try:
+                import boto3  # type: ignore
+            except ImportError as e:
+                raise ImportError(
+                    "boto3 is required for SQSMessageQueue, "
+                    "install it with `pip install firebolt-ingest[s3]`"
+                ) from e
+            client = boto3.client("sqs")
+        self.client = client
+
+    def receive(self, max_messages: int) -> List[QueueMessage]:
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=self.wait_time_seconds,
+        )
+        return [
+            QueueMessage(m["MessageId"], m["Body"], m["ReceiptHandle"])
+            for m in response.get("Messages", [])
+        ]
+
+    def ack(self, message: QueueMessage) -> None:
+        self.client.delete_message(
+            QueueUrl=self.queue_url, ReceiptHandle=message.receipt_handle
+        )
+
+    def dead_letter(self, message: QueueMessage, reason: str) -> None:
+        if self.dead_letter_queue_url is None:
+            logger.error(f"Message {message.message_id} failed: {reason}")
+            return
+
+        self.client.send_message(
+            QueueUrl=self.dead_letter_queue_url,
+            MessageBody=message.body,
+            MessageAttributes={
+                "failure_reason": {"DataType": "String", "StringValue": reason}
+            },
+        )
+        self.ack(message)
+
+
+class NotificationConsumer:
+    def __init__(
+        self,
+        table_services: Sequence[TableService],
+        queue: MessageQueue,
+        default_s3_url: Optional[str] = None,
+        max_messages: int = 10,
+        wait_seconds: float = 1.0,
+        **kwargs,
+    ):
+        """
+        Consumes S3 ObjectCreated notifications and appends the created files
+        to the matching tables, without listing the prefix or scanning
+        the external table for new files.
+
+        A notification matches a table, if the object is under the table s3_url
+        and matches its object_pattern. A message is acknowledged only after
+        all of its files are inserted and verified, messages with files failing
+        to insert or verify are dead-lettered. If the engine is unavailable,
+        the messages of the table are neither acknowledged nor dead-lettered,
+        so the queue redelivers them.
+
+        Args:
+            table_services: services of the tables to ingest into
+            queue: queue with S3 event notifications
+            default_s3_url: url for tables, that don't define s3_url
+            max_messages: maximum number of messages ingested in one batch
+            wait_seconds: pause between empty receives in run()
+            **kwargs: Additional keyword arguments which are passed
+                to TableService.insert_files.
+        """
+        self.queue = queue
+        self.max_messages = max_messages
+        self.wait_seconds = wait_seconds
+        self._insert_kwargs = kwargs
+        self._stop_event = threading.Event()
+
+        self._locations: List[Tuple[TableService, str, str]] = []
+        for table_service in table_services:
+            s3_url = table_service.table.s3_url or default_s3_url
+            if not s3_url:
+                raise FireboltError(
+                    f"S3 URL wasn't provided for table {table_service.table.table_name}"
+                )
+            bucket, prefix = parse_s3_url(s3_url)
+            self._locations.append((table_service, bucket, prefix))
+
+    def match(self, event: S3ObjectEvent) -> Optional[TableService]:
+        """
+        Find the table, whose location the object belongs to
+        """
+        for table_service, bucket, prefix in self._locations:
+            if (
+                event.bucket == bucket
+                and event.key.startswith(prefix)
+                and match_object_pattern(
+                    event.key,
+                    event.key[len(prefix) :],
+                    table_service.table.object_pattern,
+                )
+            ):
+                return table_service
+        return None
+
+    def process_batch(self) -> int:
+        """
+        Receive a batch of messages, ingest the created files and acknowledge
+        or dead-letter every message. If the tables don't match their
+        definition, the error is raised and the messages are left
+        for redelivery.
+
+        Returns: the number of received messages
+        """
+        messages = self.queue.receive(self.max_messages)
+
+        # table service -> file name -> messages mentioning the file
+        pending: Dict[TableService, Dict[str, List[QueueMessage]]] = OrderedDict()
+        parsed_messages = []
+        for message in messages:
+            try:
+                events = parse_s3_event_notification(message.body)
+            except (ValueError, KeyError, TypeError) as e:
+                self.queue.dead_letter(message, f"Malformed notification: {e!r}")
+                continue
+
+            parsed_messages.append(message)
+            for event in events:
+                if not event.event_name.startswith("ObjectCreated"):
+                    continue
+                table_service = self.match(event)
+                if table_service is None:
+                    logger.warning(f"No table matches s3://{event.bucket}/{event.key}")
+                    continue
+                pending.setdefault(table_service, OrderedDict()).setdefault(
+                    event.key, []
+                ).append(message)
+
+        failed_messages: Dict[str, str] = {}
+        retried_messages: Set[str] = set()
+        for table_service, files in pending.items():
+            try:
+                # a schema mismatch is raised, not blamed on the files
+                table_service.check_compatibility()
+                failed_files = self._ingest(table_service, list(files))
+            except Exception as e:
+                if not is_engine_unavailable_error(e):
+                    raise
+                logger.warning(
+                    f"Engine unavailable for {table_service.internal_table_name}, "
+                    f"leave {len(files)} files for redelivery: {e!r}"
+                )
+                for file_messages in files.values():
+                    retried_messages.update(m.message_id for m in file_messages)
+                continue
+            for file_name, reason in failed_files.items():
+                for message in files[file_name]:
+                    failed_messages[message.message_id] = f"{file_name}: {reason}"
+
+        for message in parsed_messages:
+            if message.message_id in retried_messages:
+                continue
+            if message.message_id in failed_messages:
+                self.queue.dead_letter(message, failed_messages[message.message_id])
+            else:
+                self.queue.ack(message)
+
+        return len(messages)
+
+    def _ingest(self, table_service: TableService, files: List[str]) -> Dict[str, str]:
+        """
+        Insert and verify the files, that are not ingested yet. If the batch
+        fails, it is bisected to find the failing files.
+
+        Returns: failed file names with the failure reason
+
+        Raises:
+            the error of an unavailable engine, without bisecting
+        """
+        try:
+            ingested = table_service.get_ingested_file_names(files)
+            table_service.insert_files(
+                [f for f in files if f not in ingested],
+                check_compatibility=False,
+                **self._insert_kwargs,
+            )
+            if not table_service.verify_files_ingestion(files):
+                raise FireboltError("Ingestion verification failed")
+            return {}
+        except Exception as e:
+            if is_engine_unavailable_error(e):
+                raise
+            logger.exception(
+                f"Ingestion of {len(files)} files into "
+                f"{table_service.internal_table_name} failed"
+            )
+            if len(files) == 1:
+                return {files[0]: str(e)}
+
+        middle = len(files) // 2
+        failed = self._ingest(table_service, files[:middle])
+        failed.update(self._ingest(table_service, files[middle:]))
+        return failed
+
+    def run(self) -> None:
+        """
+        Consume notifications until stop() is called
+        """
+        while not self._stop_event.is_set():
+            if not self.process_batch():
+                self._stop_event.wait(self.wait_seconds)
+
+    def stop(self) -> None:
+        """
+        Request run() to return after the current batch
+        """
+        self._stop_event.set()
@@ -0,0 +1,240 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    TypeVar,
+)
+
+from firebolt.common.exception import FireboltError
+from firebolt.db.connection import Connection
+
+from firebolt_ingest.table_model import Table
+from firebolt_ingest.table_service import TableService
+from firebolt_ingest.table_utils import is_engine_unavailable_error
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# sync modes, which ingest jobs can be rerun on another engine
+FAILOVER_SYNC_MODES = {"append", "merge"}
+
+
+class Engine:
+    def __init__(self, name: str, connection: Connection, weight: float = 1.0):
+        """
+        An ingestion engine of the router.
+
+        Args:
+            name: name of the engine
+            connection: connection to the engine
+            weight: relative capacity of the engine,
+                an engine with weight 2 gets twice the load of one with weight 1
+        """
+        if weight <= 0:
+            raise ValueError(f"Weight of engine {name} must be positive, got {weight}")
+        self.name = name
+        self.connection = connection
+        self.weight = weight
+        self.in_flight = 0
+        self.unavailable_until = 0.0
+
+    def load(self) -> float:
+        return (self.in_flight + 1) / self.weight
+
+
+class RoutingResult(NamedTuple):
+    # job name -> job result
+    results: Dict[str, Any]
+    # job name -> name of the engine, that completed it
+    engines: Dict[str, str]
+    # job name -> error
+    failed: Dict[str, str]
+
+
+class EngineRouter:
+    def __init__(
+        self,
+        engines: List[Engine],
+        affinity: Optional[Dict[str, str]] = None,
+        cooldown_seconds: float = 60.0,
+    ):
+        """
+        Distributes ingestion jobs across engines.
+
+        A job goes to its affine engine, if it is available. Otherwise, it goes
+        to the available engine with the lowest in-flight jobs per weight,
+        preferring the engine, that last ran a job of the same table.
+        If an engine fails with a connection or engine error, it is skipped
+        for cooldown_seconds and the job is retried on another engine.
+        Query errors are raised unchanged.
+
+        Args:
+            engines: engines to route to
+            affinity: (Optional) table name -> name of the preferred engine
+            cooldown_seconds: time an unavailable engine is skipped
+        """
+        if not engines:
+            raise ValueError("At least one engine is required")
+        names = [e.name for e in engines]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Engine names must be unique, got {names}")
+        unknown = set((affinity or {}).values()) - set(names)
+        if unknown:
+            raise ValueError(f"Affinity refers to unknown engines {sorted(unknown)}")
+
+        self.engines = engines
+        self.affinity = affinity or {}
+        self.cooldown_seconds = cooldown_seconds
+        self._last_engine: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def choose(self, table_name: str, exclude: Collection[str] = ()) -> Engine:
+        """
+        Returns: the engine for the next job of the table
+
+        Raises:
+            FireboltError: if no engine outside exclude is available
+        """
+        now = time.monotonic()
+        candidates = [
+            e
+            for e in self.engines
+            if e.name not in exclude and e.unavailable_until <= now
+        ]
+        if not candidates:
+            raise FireboltError(f"No engine is available for {table_name}")
+
+        for engine in candidates:
+            if engine.name == self.affinity.get(table_name):
+                return engine
+
+        last_engine = self._last_engine.get(table_name)
+        return min(candidates, key=lambda e: (e.load(), e.name != last_engine))
+
+    def mark_unavailable(self, engine: Engine) -> None:
+        engine.unavailable_until = time.monotonic() + self.cooldown_seconds
+
+    def run(
+        self, table_name: str, job: Callable[[Connection], T], failover: bool = True
+    ) -> T:
+        """
+        Run a job of the table on an engine, failing over
+        to the next engine, if the engine is unavailable.
+
+        Args:
+            table_name: name of the table the job ingests into
+            job: function running the job on the connection of an engine
+            failover: whether the job is rerun on the next engine, if the engine
+                is unavailable. Only jobs safe to rerun, e.g. an incremental append,
+                should fail over, otherwise the error is raised after the engine
+                is marked unavailable.
+
+        Returns: result of the job
+        """
+        tried: List[str] = []
+        while True:
+            with self._lock:
+                engine = self.choose(table_name, tried)
+                engine.in_flight += 1
+            try:
+                result = job(engine.connection)
+            except Exception as e:
+                if not is_engine_unavailable_error(e):
+                    raise
+                logger.exception(
+                    f"Engine {engine.name} failed {table_name}, "
+                    f"skip it for {self.cooldown_seconds}s"
+                )
+                tried.append(engine.name)
+                with self._lock:
+                    self.mark_unavailable(engine)
+                if not failover:
+                    raise
+                continue
+            finally:
+                with self._lock:
+                    engine.in_flight -= 1
+
+            with self._lock:
+                self._last_engine[table_name] = engine.name
+            return result
+
+    def drain(
+        self,
+        jobs: Dict[str, Callable[[Connection], Any]],
+        max_workers: Optional[int] = None,
+        no_failover: Collection[str] = (),
+    ) -> RoutingResult:
+        """
+        Run a backlog of jobs across the engines.
+
+        Args:
+            jobs: table name -> job
+            max_workers: (Optional) maximum number of jobs running at the same
+                time, by default one per engine
+            no_failover: (Optional) names of the jobs, that are not safe
+                to rerun on another engine
+
+        Returns: results, engines and errors of the jobs
+        """
+        result = RoutingResult({}, {}, {})
+        with ThreadPoolExecutor(max_workers or len(self.engines)) as executor:
+            futures = {
+                executor.submit(self.run, name, job, name not in no_failover): name
+                for name, job in jobs.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result.results[name] = future.result()
+                except Exception as e:
+                    logger.exception(f"Job {name} failed")
+                    result.failed[name] = str(e)
+                    continue
+                result.engines[name] = self._last_engine[name]
+        return result
+
+    def ingest_tables(
+        self,
+        tables: List[Table],
+        max_workers: Optional[int] = None,
+        table_service_kwargs: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> RoutingResult:
+        """
+        Ingest a backlog of tables across the engines. Append and merge
+        tables fail over to another engine, overwrite tables are not rerun,
+        as the failed run may have dropped the internal table.
+
+        Args:
+            tables: tables to ingest
+            max_workers: (Optional) maximum number of tables ingested
+                at the same time, by default one per engine
+            table_service_kwargs: (Optional) keyword arguments of the TableService
+            **kwargs: Additional keyword arguments which are passed
+                to TableService.ingest.
+
+        Returns: IngestionResult, engine and error by table name
+        """
+
+        def job(table: Table) -> Callable[[Connection], Any]:
+            return lambda connection: TableService(
+                table, connection, **(table_service_kwargs or {})
+            ).ingest(**kwargs)
+
+        return self.drain(
+            {t.table_name: job(t) for t in tables},
+            max_workers,
+            no_failover=[
+                t.table_name for t in tables if t.sync_mode not in FAILOVER_SYNC_MODES
+            ],
+        )
@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+RUN_COLUMNS = [
+    "run_id",
+    "table_name",
+    "sync_mode",
+    "started_at",
+    "finished_at",
+    "step_durations",
+    "files_ingested",
+    "rows_ingested",
+    "retries",
+    "outcome",
+    "error",
+]
+
+
+class RunOutcome(str, Enum):
+    # inserted, and verified if the run verifies, i.e. an ingest
+    SUCCESS = "success"
+    # inserted, but the verification failed
+    UNVERIFIED = "unverified"
+    # an exception was raised
+    FAILED = "failed"
+
+
+class IngestionRun(BaseModel):
+    """
+    A single TableService run: an ingest, or an insert or backfill
+    called directly.
+    """
+
+    run_id: str
+    table_name: str
+    sync_mode: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    # step name -> duration in seconds
+    step_durations: Dict[str, float] = {}
+    files_ingested: Optional[int] = None
+    rows_ingested: Optional[int] = None
+    retries: int = 0
+    outcome: Optional[RunOutcome] = None
+    error: Optional[str] = None
+
+    def as_row(self) -> List[Any]:
+        values = self.dict()
+        values["step_durations"] = json.dumps(self.step_durations)
+        return [values[c] for c in RUN_COLUMNS]
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "IngestionRun":
+        values = dict(zip(RUN_COLUMNS, row))
+        values["step_durations"] = json.loads(values["step_durations"] or "{}")
+        return cls.parse_obj(values)
+
+
+@contextmanager
+def timed_step(run: IngestionRun, step_name: str) -> Iterator[None]:
+    """
+    Add the duration of the block to the step durations of the run
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        run.step_durations[step_name] = run.step_durations.get(step_name, 0.0) + (
+            time.monotonic() - started
+        )
+
+
+class RunLog(ABC):
+    """
+    Persistent history of ingestion runs
+    """
+
+    @abstractmethod
+    def record(self, run: IngestionRun) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(
+        self,
+        table_name: Optional[str] = None,
+        outcome: Optional[RunOutcome] = None,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[IngestionRun]:
+        """
+        Find runs, newest first.
+
+        Args:
+            table_name: (Optional) only runs of this table
+            outcome: (Optional) only runs with this outcome
+            since: (Optional) only runs started at or after this time
+            limit: (Optional) maximum number of runs to return
+        """
+        raise NotImplementedError
+
+
+class JsonlRunLog(RunLog):
+    def __init__(self, path: str):
+        """
+        Run log kept in a local file, one json document per run
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, run: IngestionRun) -> None:
+        with self._lock, open(self.path, "a") as f:
+            f.write(run.json() + "\n")
+
+    def query(
+        self,
+        table_name: Optional[str] = None,
+        outcome: Optional[RunOutcome] = None,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[IngestionRun]:
+        if not os.path.exists(self.path):
+            return []
+
+        with open(self.path) as f:
+            runs = [IngestionRun.parse_raw(line) for line in f if line.strip()]
+
+        runs = [
+            run
+            for run in runs
+            if (table_name is None or run.table_name == table_name)
+            and (outcome is None or run.outcome == outcome)
+            and (since is None or run.started_at >= since)
+        ]
+        runs.sort(key=lambda run: run.started_at, reverse=True)
+        return runs[:limit] if limit is not None else runs
+
+
+class _SqlRunLog(RunLog):
+    """
+    Run log kept in a table of a DB-API database
+    """
+
+    table_name: str
+
+    @abstractmethod
+    def _cursor(self) -> Any:
+        raise NotImplementedError
+
+    def _commit(self) -> None:
+        pass
+
+    def record(self, run: IngestionRun) -> None:
+        cursor = self._cursor()
+        cursor.execute(
+            f"INSERT INTO {self.table_name} ({', '.join(RUN_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(RUN_COLUMNS))})",
+            run.as_row(),
+        )
+        self._commit()
+
+    def query(
+        self,
+        table_name: Optional[str] = None,
+        outcome: Optional[RunOutcome] = None,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[IngestionRun]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        for condition, value in [
+            ("table_name = ?", table_name),
+            ("outcome = ?", outcome),
+            ("started_at >= ?", since),
+        ]:
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        query = f"SELECT {', '.join(RUN_COLUMNS)} FROM {self.table_name}"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        query += " ORDER BY started_at DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+
+        cursor = self._cursor()
+        cursor.execute(query, params)
+        return [IngestionRun.from_row(row) for row in cursor.fetchall()]
+
+
+class SqliteRunLog(_SqlRunLog):
+    def __init__(self, path: str, table_name: str = "ingestion_runs"):
+        """
+        Run log kept in a local sqlite database
+        """
+        self.table_name = table_name
+        self._connection = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+        )
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} ("
+            "run_id TEXT PRIMARY KEY, table_name TEXT, sync_mode TEXT, "
+            "started_at TIMESTAMP, finished_at TIMESTAMP, step_durations TEXT, "
+            "files_ingested INTEGER, rows_ingested INTEGER, retries INTEGER, "
+            "outcome TEXT, error TEXT)"
+        )
+        self._connection.commit()
+
+    def _cursor(self) -> Any:
+        return self._connection.cursor()
+
+    def _commit(self) -> None:
+        self._connection.commit()
+
+
+class FireboltRunLog(_SqlRunLog):
+    def __init__(self, connection: Any, table_name: str = "ingestion_runs"):
+        """
+        Run log kept in a Firebolt fact table, created if it doesn't exist
+        """
+        self.connection = connection
+        self.table_name = table_name
+        self._cursor().execute(
+            f"CREATE FACT TABLE IF NOT EXISTS {table_name} ("
+            "run_id TEXT, table_name TEXT, sync_mode TEXT NULL, "
+            "started_at TIMESTAMP, finished_at TIMESTAMP NULL, "
+            "step_durations TEXT, files_ingested BIGINT NULL, "
+            "rows_ingested BIGINT NULL, retries INTEGER, "
+            "outcome TEXT NULL, error TEXT NULL) "
+            "PRIMARY INDEX table_name, started_at"
+        )
+
+    def _cursor(self) -> Any:
+        return self.connection.cursor()
@@ -0,0 +1,50 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field, root_validator
+
+# resolution of the sampled fraction
+HASH_BUCKETS = 1_000_000
+
+
+class SamplingSettings(BaseModel):
+    """
+    Which source files to ingest in sampling mode: either a fraction
+    or a number of files. Files are chosen by the hash of source_file_name,
+    so the same files are sampled in every run with the same seed.
+    A fraction keeps sampled files sampled, as files are added, a number
+    of files doesn't, so it is only supported in overwrite sync mode.
+    """
+
+    fraction: Optional[float] = Field(gt=0, le=1)
+    file_count: Optional[int] = Field(gt=0)
+    seed: int = Field(default=0, ge=0)
+    # prefix of the sampled internal table, before the internal prefix
+    internal_prefix: str = Field(default="sample_", regex=r"^[0-9a-zA-Z_]+$")
+
+    @root_validator(skip_on_failure=True)
+    def size_validator(cls, values):
+        if (values.get("fraction") is None) == (values.get("file_count") is None):
+            raise ValueError("Expected exactly one of fraction and file_count")
+        return values
+
+
+def file_hash_expression(seed: int) -> str:
+    return f"CITY_HASH(source_file_name, {seed})"
+
+
+def sample_condition(settings: SamplingSettings, external_table_name: str) -> str:
+    """
+    Returns: a condition on the external table rows, selecting the rows
+        of the sampled files
+    """
+    file_hash = file_hash_expression(settings.seed)
+    if settings.fraction is not None:
+        threshold = round(settings.fraction * HASH_BUCKETS)
+        return f"ABS({file_hash} % {HASH_BUCKETS}) < {threshold}"
+    return (
+        f"source_file_name IN ("
+        f"SELECT source_file_name FROM ("
+        f"SELECT DISTINCT source_file_name FROM {external_table_name}) "
+        f"ORDER BY {file_hash}, source_file_name "
+        f"LIMIT {settings.file_count})"
+    )
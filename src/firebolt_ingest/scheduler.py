@@ -0,0 +1,223 @@
+import logging
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+from firebolt.common.exception import FireboltError
+from firebolt.db.connection import Connection
+
+from firebolt_ingest.run_log import RunLog, RunOutcome
+from firebolt_ingest.table_model import Table
+from firebolt_ingest.table_service import TableService
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleResult(NamedTuple):
+    # table names in order of completion
+    completed: List[str]
+    # table name -> error
+    failed: Dict[str, str]
+    # table name -> name of the failed or skipped upstream table
+    skipped: Dict[str, str]
+
+
+def dependency_graph(tables: List[Table]) -> Dict[str, Set[str]]:
+    """
+    Build and validate the dependency graph of the tables.
+
+    Returns: table name -> names of the tables it depends on
+
+    Raises:
+        ValueError: on duplicate tables, unknown dependencies or cycles
+    """
+    graph: Dict[str, Set[str]] = {}
+    for table in tables:
+        if table.table_name in graph:
+            raise ValueError(f"Duplicate table {table.table_name}")
+        graph[table.table_name] = set(table.depends_on or [])
+
+    for name, dependencies in graph.items():
+        unknown = dependencies - set(graph)
+        if unknown:
+            raise ValueError(
+                f"Table {name} depends on unknown tables {sorted(unknown)}"
+            )
+
+    # Kahn's algorithm, tables left over are on a cycle
+    remaining = {name: set(dependencies) for name, dependencies in graph.items()}
+    ready = [name for name, dependencies in remaining.items() if not dependencies]
+    while ready:
+        done = ready.pop()
+        del remaining[done]
+        for name, dependencies in remaining.items():
+            if done in dependencies:
+                dependencies.discard(done)
+                if not dependencies:
+                    ready.append(name)
+    if remaining:
+        raise ValueError(f"Dependency cycle between tables {sorted(remaining)}")
+
+    return graph
+
+
+def critical_path_lengths(
+    graph: Dict[str, Set[str]], durations: Optional[Dict[str, float]] = None
+) -> Dict[str, float]:
+    """
+    Compute the duration of the longest chain of tables starting at every table,
+    i.e. the table and all tables waiting for it, directly or indirectly.
+
+    Args:
+        graph: table name -> names of the tables it depends on
+        durations: (Optional) estimated durations by table name, 1 by default
+    """
+    durations = durations or {}
+    dependents: Dict[str, List[str]] = {name: [] for name in graph}
+    for name, dependencies in graph.items():
+        for dependency in dependencies:
+            dependents[dependency].append(name)
+
+    lengths: Dict[str, float] = {}
+
+    def length(name: str) -> float:
+        if name not in lengths:
+            lengths[name] = durations.get(name, 1.0) + max(  # type: ignore
+                (length(d) for d in dependents[name]), default=0.0
+            )
+        return lengths[name]
+
+    for name in graph:
+        length(name)
+    return lengths
+
+
+def durations_from_run_log(
+    run_log: RunLog, tables: List[Table], internal_prefix: str = "", runs: int = 5
+) -> Dict[str, float]:
+    """
+    Estimate table durations as the average of their last successful runs
+
+    Returns: table name -> duration in seconds, for tables with a recorded run
+    """
+    durations = {}
+    for table in tables:
+        finished = [
+            run
+            for run in run_log.query(
+                f"{internal_prefix}{table.table_name}",
+                outcome=RunOutcome.SUCCESS,
+                limit=runs,
+            )
+            if run.finished_at
+        ]
+        if finished:
+            durations[table.table_name] = sum(
+                (run.finished_at - run.started_at).total_seconds()  # type: ignore
+                for run in finished
+            ) / len(finished)
+    return durations
+
+
+def ingest_job(
+    connection: Connection,
+    table_service_kwargs: Optional[Dict[str, Any]] = None,
+    **kwargs,
+) -> Callable[[Table], Any]:
+    """
+    Returns: a job ingesting a table with TableService.ingest, failing if the
+        ingestion is not verified.
+
+    Args:
+        connection: connection to the engine
+        table_service_kwargs: (Optional) keyword arguments of the TableService
+        **kwargs: Additional keyword arguments which are passed
+            to TableService.ingest.
+    """
+
+    def job(table: Table) -> Any:
+        result = TableService(table, connection, **(table_service_kwargs or {})).ingest(
+            **kwargs
+        )
+        if not result.verified:
+            raise FireboltError(f"Ingestion of {table.table_name} is not verified")
+        return result
+
+    return job
+
+
+class DagScheduler:
+    def __init__(
+        self,
+        tables: List[Table],
+        job: Callable[[Table], Any],
+        max_workers: int = 4,
+        durations: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Runs a job for every table after the jobs of the tables it depends on.
+
+        Independent tables run in parallel, at most max_workers at a time.
+        Ready tables are started by descending priority, then by descending
+        critical path length, so the longest chains start first. If a job fails,
+        all tables depending on it, directly or indirectly, are skipped.
+
+        Args:
+            tables: tables to schedule, dependencies are declared in depends_on
+            job: function running the job of a table, e.g. ingest_job(connection)
+            max_workers: maximum number of jobs running at the same time
+            durations: (Optional) estimated durations by table name,
+                used for the critical path
+        """
+        self.tables = {t.table_name: t for t in tables}
+        self.graph = dependency_graph(tables)
+        self.critical_path = critical_path_lengths(self.graph, durations)
+        self.job = job
+        self.max_workers = max_workers
+
+    def _order(self, name: str) -> tuple:
+        return (-(self.tables[name].priority or 0), -self.critical_path[name], name)
+
+    def run(self) -> ScheduleResult:
+        result = ScheduleResult([], {}, {})
+        waiting = {name: set(deps) for name, deps in self.graph.items()}
+        running: Dict[Future, str] = {}
+
+        def skip_dependents(name: str) -> None:
+            for other, dependencies in list(waiting.items()):
+                if other in waiting and name in dependencies:
+                    logger.warning(f"Skip {other}, upstream {name} did not complete")
+                    result.skipped[other] = name
+                    del waiting[other]
+                    skip_dependents(other)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while waiting or running:
+                ready = sorted(
+                    (name for name, deps in waiting.items() if not deps),
+                    key=self._order,
+                )
+                for name in ready[: self.max_workers - len(running)]:
+                    del waiting[name]
+                    logger.info(f"Start {name}")
+                    running[executor.submit(self.job, self.tables[name])] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.exception(f"Job of {name} failed")
+                        result.failed[name] = str(e)
+                        skip_dependents(name)
+                        continue
+                    result.completed.append(name)
+                    for dependencies in waiting.values():
+                        dependencies.discard(name)
+
+        return result
@@ -1,10 +1,26 @@
+import re
+import sys
 from enum import Enum
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import yaml
-from pydantic import BaseModel, Field, conlist, root_validator
+from pydantic import BaseModel, Field, ValidationError, conlist, root_validator
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError
 from pydantic.main import ModelMetaclass
-from yaml import Loader
+
+from firebolt_ingest.column_types import (
+    TYPE_ALIASES,
+    ColumnType,
+    parse_column_type,
+    zero_value_sql,
+)
+
+try:
+    # the libyaml based loader is an order of magnitude faster
+    from yaml import CLoader as Loader
+except ImportError:  # pragma: no cover
+    from yaml import Loader  # type: ignore
 
 
 class YamlModelMixin(metaclass=ModelMetaclass):
@@ -18,42 +34,16 @@ class YamlModelMixin(metaclass=ModelMetaclass):
         return cls.parse_obj(obj)  # type: ignore
 
 
-# see: https://docs.firebolt.io/general-reference/data-types.html
-ATOMIC_TYPES = {
-    "INT",
-    "INTEGER",
-    "BIGINT",
-    "LONG",
-    "REAL",
-    "DECIMAL",
-    "NUMERIC",
-    "FLOAT",
-    "DOUBLE",
-    "DOUBLE PRECISION",
-    "TEXT",
-    "VARCHAR",
-    "STRING",
-    "DATE",
-    "PGDATE",
-    "DATETIME",
-    "TIMESTAMP",
-    "TIMESTAMPNTZ",
-    "TIMESTAMPTZ",
-    "BOOLEAN",
-}
-
-DATE_TIME_TYPES = {"DATE", "TIMESTAMP", "DATETIME", "TIMESTAMPNTZ", "PGDATE"}
-
-
-def match_array(s: str) -> bool:
+def is_valid_column_type(type_: str) -> bool:
     """
-    Check whether a string is a valid array and return true
+    Check whether a string is a valid column type. Parsing is cached
+    per distinct type string, wide tables repeat a handful of types.
     """
-    if s.startswith("ARRAY(") and s.endswith(")"):
-        return match_array(s[6:-1])
-    if s in ATOMIC_TYPES:
-        return True
-    return False
+    try:
+        parse_column_type(type_)
+    except ValueError:
+        return False
+    return True
 
 
 class DatetimePart(str, Enum):
@@ -69,6 +59,14 @@ class DatetimePart(str, Enum):
     SECOND = "SECOND"
     EPOCH = "EPOCH"
 
+    @property
+    def is_cyclic(self) -> bool:
+        """
+        Returns: true if the values of the part repeat, e.g. EXTRACT(DAY)
+            is the day of the month, the same in every month
+        """
+        return self not in {DatetimePart.YEAR, DatetimePart.EPOCH}
+
 
 class Column(BaseModel):
     name: str = Field(min_length=1, max_length=255, regex=r"^[0-9a-zA-Z_\-.]+$")
@@ -77,16 +75,48 @@ class Column(BaseModel):
     extract_partition: Optional[str] = Field(min_length=1, max_length=255)
     nullable: Optional[bool] = None
     unique: Optional[bool] = None
+    # sql expression filling the column, when it's added to an existing table
+    default: Optional[str] = Field(min_length=1)
+    # sql expression over the external columns computing the column,
+    # which then isn't a column of the external table
+    transform: Optional[str] = Field(min_length=1)
+    # if false, the column is only in the external table,
+    # e.g. to be used by the filter or transforms
+    ingest: Optional[bool] = None
+
+    @property
+    def column_type(self) -> ColumnType:
+        return parse_column_type(self.type)
+
+    def generate_default_string(self) -> str:
+        """
+        Returns: the sql expression filling the column, when it's added
+            to an existing table: the default, NULL for nullable columns,
+            or the zero value of the type
+        """
+        if self.default is not None:
+            return self.default
+        if self.nullable:
+            return f"CAST(NULL AS {self.column_type})"
+        return zero_value_sql(self.column_type)
 
     @root_validator
     def type_validator(cls, values: dict) -> dict:
-        if values["type"] in ATOMIC_TYPES or match_array(values["type"]):
+        if is_valid_column_type(values["type"]):
             return values
 
         raise ValueError(
             f"Unknown column type {values['type']} for column {values['name']}"
         )
 
+    @root_validator
+    def transform_validator(cls, values: dict) -> dict:
+        if values.get("transform") and values.get("ingest") is False:
+            raise ValueError(
+                f"Column {values.get('name')} with a transform must be ingested"
+            )
+        return values
+
     @root_validator
     def alias_validator(cls, values: dict):
         if ("." in values["name"] or "-" in values["name"]) and not values["alias"]:
@@ -98,6 +128,70 @@ class Column(BaseModel):
         return values
 
 
+COLUMN_NAME_REGEX = re.compile(r"^[0-9a-zA-Z_\-.]+$")
+COLUMN_ALIAS_REGEX = re.compile(r"^[0-9a-zA-Z_]+$")
+
+
+def _is_short_str(value: Any, regex: Optional["re.Pattern"] = None) -> bool:
+    return (
+        isinstance(value, str)
+        and 0 < len(value) <= 255
+        and (regex is None or regex.match(value) is not None)
+    )
+
+
+def build_column(obj: Any) -> Column:
+    """
+    Build a column without pydantic validation, if the dict is plain and valid
+    by the same rules as Column, otherwise fall back to Column.parse_obj.
+    Type strings are interned, so the columns of a wide table share them.
+    """
+    if isinstance(obj, Column):
+        return obj
+    if not isinstance(obj, dict) or not obj.keys() <= Column.__fields__.keys():
+        return Column.parse_obj(obj)
+
+    name: Any = obj.get("name")
+    alias: Any = obj.get("alias")
+    type_ = obj.get("type", "TEXT")
+    extract_partition = obj.get("extract_partition")
+    nullable, unique = obj.get("nullable"), obj.get("unique")
+    default = obj.get("default")
+    if obj.get("transform") is not None or obj.get("ingest") is not None:
+        return Column.parse_obj(obj)
+    if not (
+        _is_short_str(name, COLUMN_NAME_REGEX)
+        and (alias is None or _is_short_str(alias, COLUMN_ALIAS_REGEX))
+        and _is_short_str(type_)
+        and is_valid_column_type(type_)
+        and (extract_partition is None or _is_short_str(extract_partition))
+        and (nullable is None or isinstance(nullable, bool))
+        and (unique is None or isinstance(unique, bool))
+        and (default is None or (isinstance(default, str) and default))
+        and (alias or ("." not in name and "-" not in name))
+    ):
+        return Column.parse_obj(obj)
+
+    column = Column.__new__(Column)
+    object.__setattr__(
+        column,
+        "__dict__",
+        {
+            "name": name,
+            "alias": alias,
+            "type": sys.intern(type_),
+            "extract_partition": extract_partition,
+            "nullable": nullable,
+            "unique": unique,
+            "default": default,
+            "transform": None,
+            "ingest": None,
+        },
+    )
+    object.__setattr__(column, "__fields_set__", set(obj))
+    return column
+
+
 FILE_METADATA_COLUMNS: List[Column] = [
     Column(name="source_file_name", type="TEXT"),
     Column(name="source_file_timestamp", type="TIMESTAMPNTZ"),
@@ -117,10 +211,279 @@ class Partition(BaseModel):
     column_name: str
     datetime_part: Optional[DatetimePart]
 
-    def as_sql_string(self) -> str:
+    def as_sql_string(self, column_expression: Optional[str] = None) -> str:
+        """
+        Args:
+            column_expression: (Optional) expression to use instead of
+                the column name, e.g. the matching column of the external table
+        """
+        column = column_expression or self.column_name
         if self.datetime_part is not None:
-            return f"EXTRACT({self.datetime_part.value} FROM {self.column_name})"
-        return self.column_name
+            return f"EXTRACT({self.datetime_part.value} FROM {column})"
+        return column
+
+
+AGGREGATION_REGEX = re.compile(
+    r"^\s*([a-zA-Z_]+)\s*\(\s*(DISTINCT\s+)?([0-9a-zA-Z_]+|\*)\s*\)\s*$",
+    re.IGNORECASE,
+)
+
+
+class AggregatingIndex(BaseModel):
+    """
+    An aggregating index of the internal table. Aggregations are
+    single-column aggregate function calls, e.g. SUM(amount), COUNT(DISTINCT id)
+    or COUNT(*).
+
+    see: https://docs.firebolt.io/using-indexes/using-aggregating-indexes.html
+    """
+
+    index_name: str = Field(min_length=1, max_length=255, regex=r"^[0-9a-zA-Z_]+$")
+    key_columns: List[str] = []
+    aggregations: conlist(str, min_items=1)  # type: ignore
+
+    @root_validator
+    def aggregations_validator(cls, values: dict) -> dict:
+        for aggregation in values.get("aggregations", []):
+            if not AGGREGATION_REGEX.match(aggregation):
+                raise ValueError(
+                    f"Unsupported aggregation {aggregation} "
+                    f"in aggregating index {values.get('index_name')}"
+                )
+        return values
+
+    def aggregation_columns(self) -> List[str]:
+        """
+        Returns: the columns referenced by the aggregations, except for *
+        """
+        columns = []
+        for aggregation in self.aggregations:
+            match = AGGREGATION_REGEX.match(aggregation)
+            if match and match.group(3) != "*":
+                columns.append(match.group(3))
+        return columns
+
+    def as_sql_string(self) -> str:
+        return ", ".join(self.key_columns + [a.strip() for a in self.aggregations])
+
+
+class JoinIndex(BaseModel):
+    """
+    A join index of a dimension table, keyed by the join column and holding
+    the dimension columns used by the joins.
+
+    see: https://docs.firebolt.io/using-indexes/using-join-indexes.html
+    """
+
+    index_name: str = Field(min_length=1, max_length=255, regex=r"^[0-9a-zA-Z_]+$")
+    join_column: str
+    dimension_columns: conlist(str, min_items=1)  # type: ignore
+
+    def as_sql_string(self) -> str:
+        return ", ".join([self.join_column] + self.dimension_columns)
+
+
+def check_primary_index(column_name_to_type: Dict[str, str], primary_index: List[str]):
+    """
+    Ensure the primary index column names exist in the list of columns.
+    """
+    for index_column in primary_index:
+        if index_column not in column_name_to_type:
+            raise ValueError(
+                f"Could not find primary index {index_column}"
+                f" in the list of table columns."
+            )
+
+
+EXPRESSION_KEYWORDS = {
+    "AND", "OR", "NOT", "IN", "IS", "NULL", "TRUE", "FALSE", "LIKE", "ILIKE",
+    "BETWEEN", "CASE", "WHEN", "THEN", "ELSE", "END", "AS", "DISTINCT",
+    "INTERVAL", "FROM", "ARRAY", "YEAR", "QUARTER", "MONTH", "WEEK", "DAY",
+    "DOW", "DOY", "HOUR", "MINUTE", "SECOND", "MILLISECOND", "MICROSECOND",
+    "EPOCH", "PRECISION",
+}  # fmt: skip
+
+_EXPRESSION_TOKEN_REGEX = re.compile(
+    r"(?P<string>'(?:[^']|'')*')"
+    r'|(?P<quoted>"(?:[^"]|"")+")'
+    r"|(?P<word>[A-Za-z_][A-Za-z0-9_]*)(?P<call>\s*\()?"
+    r"|(?P<number>\d+(?:\.\d+)?)"
+    r"|(?P<forbidden>;|--|/\*|\?)"
+    r"|(?P<cast>::\s*[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<other>[\s\S])"
+)
+
+
+def expression_column_references(expression: str) -> List[str]:
+    """
+    Find the column references of a sql expression: quoted identifiers
+    and bare words, that are neither keywords, type names nor function names.
+
+    Raises:
+        ValueError: if the expression contains a statement separator,
+            a comment or a query parameter
+    """
+    references = []
+    for match in _EXPRESSION_TOKEN_REGEX.finditer(expression):
+        if match.group("forbidden"):
+            raise ValueError(
+                f"Unexpected {match.group('forbidden')} in expression {expression}"
+            )
+        if match.group("quoted"):
+            references.append(match.group("quoted")[1:-1].replace('""', '"'))
+        elif match.group("word") and not match.group("call"):
+            word = match.group("word")
+            if word.upper() not in EXPRESSION_KEYWORDS | TYPE_ALIASES.keys():
+                references.append(word)
+    return references
+
+
+def check_expression(expression: str, column_names: Set[str], description: str) -> None:
+    """
+    Ensure the columns referenced by the expression exist.
+    """
+    for reference in expression_column_references(expression):
+        if reference not in column_names:
+            raise ValueError(
+                f"Could not find column {reference} of the {description}"
+                f" in the list of external table columns."
+            )
+
+
+def check_unique_key(column_name_to_type: Dict[str, str], unique_key: List[str]):
+    """
+    Ensure the unique key column names exist in the list of columns.
+    """
+    for key_column in unique_key:
+        if key_column not in column_name_to_type:
+            raise ValueError(
+                f"Could not find unique key column {key_column}"
+                f" in the list of table columns."
+            )
+
+
+def check_partitions(
+    column_name_to_type: Dict[str, str], partitions: List[Partition]
+) -> None:
+    """
+    Ensure the partition column_name exists in the list of columns.
+    Ensure partition columns that use EXTRACT refer to date/time columns.
+    """
+    for partition in partitions:
+        if partition.column_name not in column_name_to_type:
+            raise ValueError(
+                f"Could not find partition column name {partition.column_name} "
+                f"in the list of table columns"
+            )
+
+        if partition.datetime_part is not None:
+            partition_column_type = column_name_to_type[partition.column_name]
+            if not parse_column_type(partition_column_type).is_date_time:
+                raise ValueError(
+                    f"Partition column {partition.column_name} must be a "
+                    f"compatible datetime type, not a {partition_column_type}"
+                )
+
+
+# parts, that can follow a part in a partition key, so the key
+# compared lexicographically follows the time, e.g. YEAR, MONTH, DAY
+FINER_DATETIME_PARTS = {
+    DatetimePart.YEAR: {DatetimePart.QUARTER, DatetimePart.MONTH},
+    DatetimePart.QUARTER: {DatetimePart.MONTH},
+    DatetimePart.MONTH: {DatetimePart.DAY},
+    DatetimePart.DAY: {DatetimePart.HOUR},
+    DatetimePart.HOUR: {DatetimePart.MINUTE},
+    DatetimePart.MINUTE: {DatetimePart.SECOND},
+}
+
+
+def lookback_condition(
+    column_name_to_type: Dict[str, str], partitions: List[Partition], days: int
+) -> Optional[str]:
+    """
+    Generate a condition on the partition expressions, selecting the partitions
+    that may hold rows of the last days by the first date/time partition column,
+    so that a query restricted by it reads only those partitions.
+    Cyclic parts, e.g. DAY, are only compared after the coarser parts,
+    e.g. YEAR and MONTH.
+
+    Returns: the condition, None if no date/time partition column allows one
+    """
+    for column_name in dict.fromkeys(p.column_name for p in partitions):
+        column_type = column_name_to_type.get(column_name)
+        if column_type is None or not parse_column_type(column_type).is_date_time:
+            continue
+        column_partitions = [p for p in partitions if p.column_name == column_name]
+        chain = [p for p in column_partitions if p.datetime_part is None][:1] or [
+            p
+            for p in column_partitions
+            if p.datetime_part is not None and not p.datetime_part.is_cyclic
+        ][:1]
+        while chain and chain[-1].datetime_part is not None:
+            finer_parts = FINER_DATETIME_PARTS.get(chain[-1].datetime_part, set())
+            finer = [p for p in column_partitions if p.datetime_part in finer_parts]
+            if not finer:
+                break
+            chain.append(finer[0])
+        if not chain:
+            continue
+
+        cutoff = f"CAST(NOW() - INTERVAL '{days} DAY' AS {column_type})"
+        condition = ""
+        for partition in reversed(chain):
+            expression = partition.as_sql_string()
+            value = partition.as_sql_string(cutoff)
+            if not condition:
+                condition = f"{expression} >= {value}"
+            else:
+                condition = (
+                    f"({expression} > {value} "
+                    f"OR {expression} = {value} AND {condition})"
+                )
+        return condition
+    return None
+
+
+def check_aggregating_indexes(
+    column_name_to_type: Dict[str, str], indexes: List[AggregatingIndex]
+) -> None:
+    """
+    Ensure the key and aggregated columns of aggregating indexes exist
+    in the list of columns, and index names are unique.
+    """
+    index_names = set()
+    for index in indexes:
+        if index.index_name in index_names:
+            raise ValueError(f"Duplicate aggregating index {index.index_name}")
+        index_names.add(index.index_name)
+
+        for column in index.key_columns + index.aggregation_columns():
+            if column not in column_name_to_type:
+                raise ValueError(
+                    f"Could not find column {column} of aggregating index "
+                    f"{index.index_name} in the list of table columns."
+                )
+
+
+def check_join_indexes(
+    column_name_to_type: Dict[str, str], indexes: List[JoinIndex]
+) -> None:
+    """
+    Ensure the columns of join indexes exist in the list of columns,
+    and index names are unique.
+    """
+    index_names = set()
+    for index in indexes:
+        if index.index_name in index_names:
+            raise ValueError(f"Duplicate join index {index.index_name}")
+        index_names.add(index.index_name)
+
+        for column in [index.join_column] + index.dimension_columns:
+            if column not in column_name_to_type:
+                raise ValueError(
+                    f"Could not find column {column} of join index "
+                    f"{index.index_name} in the list of table columns."
+                )
 
 
 class Table(BaseModel, YamlModelMixin):
@@ -135,6 +498,28 @@ class Table(BaseModel, YamlModelMixin):
     json_parse_as_text: Optional[bool] = None
     sync_mode: Optional[str] = None
     s3_url: Optional[str] = Field(regex=r"^s3:\/\/[a-z0-9-]{1,64}\/[a-zA-Z0-9-_.\/]*")
+    aggregating_indexes: Optional[List[AggregatingIndex]] = None
+    table_type: Optional[str] = None
+    join_indexes: Optional[List[JoinIndex]] = None
+    # names of the tables, that must be ingested before this one
+    depends_on: Optional[List[str]] = None
+    # tables with higher priority are scheduled first
+    priority: Optional[int] = None
+    # columns identifying a row in merge sync mode and for append_dedup,
+    # the primary index by default
+    unique_key: Optional[conlist(str, min_items=1)] = None  # type: ignore
+    # in merge sync mode keep only the latest version of a key
+    # by source_file_timestamp, true by default
+    merge_dedup: Optional[bool] = None
+    # on append skip rows with a key, that is already ingested
+    # or repeated in the appended files
+    append_dedup: Optional[bool] = None
+    # compare with the rows in the partitions of that many last days only,
+    # by the first date/time partition column, all rows by default
+    dedup_lookback_days: Optional[int] = Field(gt=0)
+    # sql predicate over the external columns, only matching rows are ingested.
+    # The predicate is applied to the rows read, the files are read in full.
+    filter: Optional[str] = Field(min_length=1)
 
     @root_validator
     def object_pattern_validator(cls, values: dict) -> dict:
@@ -189,62 +574,173 @@ class Table(BaseModel, YamlModelMixin):
         return values
 
     @root_validator
-    def primary_index_columns(cls, values: dict) -> dict:
+    def column_references(cls, values: dict) -> dict:
         """
-        Ensure the primary index column names exist in the list of columns.
+        Ensure the columns referenced by the primary index, unique key,
+        partitions, aggregating and join indexes exist in the list of columns.
+        The column lookup is built once for all checks.
         """
-        column_names = {
-            c.alias if c.alias else c.name for c in values.get("columns", [])
+        column_name_to_type = {
+            (c.alias if c.alias else c.name): c.type
+            for c in values.get("columns", [])
+            if c.ingest is not False
         }
-        for index_column in values.get("primary_index", []):
-            if index_column not in column_names:
+        check_primary_index(column_name_to_type, values.get("primary_index", []))
+        check_unique_key(column_name_to_type, values.get("unique_key") or [])
+        check_partitions(column_name_to_type, values.get("partitions", []))
+        check_aggregating_indexes(
+            column_name_to_type, values.get("aggregating_indexes") or []
+        )
+        check_join_indexes(column_name_to_type, values.get("join_indexes") or [])
+        return values
+
+    @root_validator
+    def dedup_lookback_validator(cls, values: dict) -> dict:
+        """
+        Ensure the dedup lookback can be expressed on the partitions,
+        so that it reads only the partitions of the lookback
+        """
+        if values.get("dedup_lookback_days"):
+            column_name_to_type = {
+                (c.alias if c.alias else c.name): c.type
+                for c in values.get("columns", [])
+                if c.ingest is not False
+            }
+            if not lookback_condition(
+                column_name_to_type, values.get("partitions", []), 1
+            ):
                 raise ValueError(
-                    f"Could not find primary index {index_column}"
-                    f" in the list of table columns."
+                    "dedup_lookback_days requires a partition by a date/time "
+                    "column, by the column itself or by its YEAR or EPOCH"
                 )
         return values
 
     @root_validator
-    def partition_columns(cls, values: dict) -> dict:
+    def expression_references(cls, values: dict) -> dict:
         """
-        Ensure the partition column_name exists in the list of columns.
-        Ensure partition columns that use EXTRACT refer to date/time columns.
+        Ensure the filter and the column transforms only reference
+        columns of the external table and file-metadata columns.
         """
-        column_name_to_type = {
-            (c.alias if c.alias else c.name): c.type for c in values.get("columns", [])
-        }
+        column_names = {
+            c.name for c in values.get("columns", []) if c.transform is None
+        } | {c.name for c in FILE_METADATA_COLUMNS}
+        if values.get("filter"):
+            check_expression(values["filter"], column_names, "filter")
+        for column in values.get("columns", []):
+            if column.transform:
+                check_expression(
+                    column.transform,
+                    column_names,
+                    f"transform of column {column.name}",
+                )
+        return values
 
-        for partition in values.get("partitions", []):
+    @root_validator
+    def table_type_validator(cls, values: dict) -> dict:
+        """
+        Check whether table_type has one of allowed values: {"fact", "dimension"},
+        and that only dimension tables have join indexes and only fact tables
+        have partitions and aggregating indexes.
+        """
+        if values.get("table_type"):
+            values["table_type"] = values["table_type"].lower()
 
-            if partition.column_name not in column_name_to_type.keys():
-                raise ValueError(
-                    f"Could not find partition column name {partition.column_name} "
-                    f"in the list of table columns"
-                )
+            if values.get("table_type") not in {"fact", "dimension"}:
+                raise ValueError(f"Unknown table type {values.get('table_type')}")
+
+        if values.get("table_type") == "dimension":
+            if values.get("partitions"):
+                raise ValueError("Dimension tables cannot be partitioned")
+            if values.get("aggregating_indexes"):
+                raise ValueError("Dimension tables cannot have aggregating indexes")
+        elif values.get("join_indexes"):
+            raise ValueError("Only dimension tables can have join indexes")
 
-            if partition.datetime_part is not None:
-                partition_column_type = column_name_to_type.get(partition.column_name)
-                if partition_column_type not in DATE_TIME_TYPES:
-                    raise ValueError(
-                        f"Partition column {partition.column_name} must be a "
-                        f"compatible datetime type, not a {partition_column_type}"
-                    )
+        return values
+
+    @root_validator
+    def depends_on_validator(cls, values: dict) -> dict:
+        """
+        Ensure a table doesn't depend on itself
+        """
+        if values.get("table_name") in (values.get("depends_on") or []):
+            raise ValueError(f"Table {values.get('table_name')} depends on itself")
         return values
 
     @root_validator
     def sync_mode_validator(cls, values: dict) -> dict:
         """
         Check whether sync_mode has one of allowed values:
-            {"overwrite", "append"}
+            {"overwrite", "append", "merge"}
         """
         if values.get("sync_mode"):
             values["sync_mode"] = values["sync_mode"].lower()
 
-            if values.get("sync_mode") not in {"overwrite", "append"}:
+            if values.get("sync_mode") not in {"overwrite", "append", "merge"}:
                 raise ValueError(f"Unknown sync mode {values.get('sync_mode')}")
 
         return values
 
+    @classmethod
+    def parse_obj_bulk(cls, obj: dict) -> "Table":
+        """
+        Equivalent of parse_obj for very wide tables, linear in the number
+        of columns with a small constant.
+
+        Columns are built in a single pass by build_column, without
+        per-column pydantic validation and copies. The other fields are
+        validated by pydantic and the root validators run once, as usual.
+        """
+        values: Dict[str, Any] = {}
+        errors: List[ErrorWrapper] = []
+        for name, field in cls.__fields__.items():
+            if name == "columns":
+                continue
+            if name not in obj:
+                if field.required:
+                    errors.append(ErrorWrapper(MissingError(), loc=name))
+                else:
+                    values[name] = field.get_default()
+                continue
+            value, error = field.validate(obj[name], values, loc=name, cls=cls)
+            if error:
+                errors.append(error)  # type: ignore
+            else:
+                values[name] = value
+
+        columns = []
+        for i, column in enumerate(obj.get("columns") or []):
+            try:
+                columns.append(build_column(column))
+            except ValidationError as e:
+                errors.append(ErrorWrapper(e, loc=("columns", i)))
+        if not columns:
+            errors.append(
+                ErrorWrapper(ValueError("at least 1 column is required"), "columns")
+            )
+        values["columns"] = columns
+
+        for skip_on_failure, validator in cls.__post_root_validators__:
+            if skip_on_failure and errors:
+                continue
+            try:
+                values = validator(cls, values)
+            except (ValueError, TypeError, AssertionError) as e:
+                errors.append(ErrorWrapper(e, loc="__root__"))
+        if errors:
+            raise ValidationError(errors, cls)
+
+        table = cls.__new__(cls)
+        object.__setattr__(table, "__dict__", values)
+        object.__setattr__(table, "__fields_set__", obj.keys() & cls.__fields__.keys())
+        return table
+
+    def generate_table_type(self) -> str:
+        """
+        Returns: the table type keyword of CREATE ... TABLE
+        """
+        return "DIMENSION" if self.table_type == "dimension" else "FACT"
+
     def generate_file_type(self) -> str:
         """
         Returns: a string with file_type and relevant argument
@@ -280,7 +776,7 @@ class Table(BaseModel, YamlModelMixin):
         additional_partitions = FILE_METADATA_COLUMNS if add_file_metadata else []
 
         columns_str = []
-        for column in self.columns + additional_partitions:
+        for column in self.internal_columns + additional_partitions:
             column_str = (
                 f"{column.alias if column.alias else column.name} {column.type}"
             )
@@ -305,7 +801,7 @@ class Table(BaseModel, YamlModelMixin):
         """
 
         column_strings = []
-        for column in self.columns:
+        for column in self.external_columns:
             column_str = f'"{column.name}" {column.type}'
 
             if column.nullable is not None:
@@ -318,10 +814,73 @@ class Table(BaseModel, YamlModelMixin):
 
         return ", ".join(column_strings), [
             column.extract_partition
-            for column in self.columns
+            for column in self.external_columns
             if column.extract_partition
         ]
 
+    @property
+    def external_columns(self) -> List[Column]:
+        """
+        Returns: the columns of the external table, all but the transformed
+        """
+        return [c for c in self.columns if c.transform is None]
+
+    @property
+    def internal_columns(self) -> List[Column]:
+        """
+        Returns: the columns of the internal table, all but the not ingested
+        """
+        return [c for c in self.columns if c.ingest is not False]
+
+    def get_external_expressions(self) -> Dict[str, str]:
+        """
+        Returns: internal column name -> expression computing it
+            from the external table columns
+        """
+        return {
+            (c.alias or c.name): (c.transform or f'"{c.name}"')
+            for c in self.internal_columns
+        }
+
+    def generate_select_list(self) -> List[str]:
+        """
+        Returns: the expressions selecting the internal columns
+            from the external table, aliased to the internal column names
+            where needed
+        """
+        return [
+            f"{c.transform} AS {c.alias or c.name}"
+            if c.transform
+            else f'"{c.name}"' + (f" AS {c.alias}" if c.alias else "")
+            for c in self.internal_columns
+        ]
+
+    def generate_lookback_condition(self) -> Optional[str]:
+        """
+        Returns: the condition on the partition expressions of the internal table,
+            selecting the partitions of the last dedup_lookback_days days,
+            None if there is no lookback
+        """
+        if not self.dedup_lookback_days:
+            return None
+        condition = lookback_condition(
+            {(c.alias or c.name): c.type for c in self.internal_columns},
+            self.partitions,
+            self.dedup_lookback_days,
+        )
+        if condition is None:
+            raise ValueError(
+                "dedup_lookback_days requires a partition by a date/time column"
+            )
+        return condition
+
+    def get_unique_key(self) -> List[str]:
+        """
+        Returns: the columns identifying a row in merge sync mode
+            and for append_dedup
+        """
+        return self.unique_key or self.primary_index
+
     def generate_primary_index_string(self) -> str:
         """
         Generate a prepared sql string from list of primary index columns to
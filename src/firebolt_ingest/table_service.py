@@ -1,23 +1,83 @@
+import functools
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import ContextVar, copy_context
+from datetime import datetime
+from difflib import unified_diff
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    cast,
+)
+from uuid import uuid4
 
 from firebolt.common.exception import FireboltError
+from firebolt.db import Cursor
 from firebolt.db.connection import Connection
 
 from firebolt_ingest.aws_settings import (
     AWSSettings,
     generate_aws_credentials_string,
 )
+from firebolt_ingest.backfill import (
+    BackfillProgress,
+    BackfillResult,
+    PartitionValue,
+    partition_values,
+)
+from firebolt_ingest.column_types import normalize_column_type
+from firebolt_ingest.concurrency import AdaptiveConcurrency
+from firebolt_ingest.ddl_state import (
+    DdlFingerprintStore,
+    EnsureResult,
+    Statement,
+    ddl_fingerprint,
+    render_ddl,
+)
+from firebolt_ingest.file_source import FileSource
+from firebolt_ingest.file_state import (
+    FileChanges,
+    FileStateStore,
+    detect_file_changes,
+)
+from firebolt_ingest.metrics import IngestionMetrics, MeteredCursor
+from firebolt_ingest.run_log import (
+    IngestionRun,
+    RunLog,
+    RunOutcome,
+    timed_step,
+)
+from firebolt_ingest.sampling import SamplingSettings, sample_condition
 from firebolt_ingest.table_model import FILE_METADATA_COLUMNS, Table
 from firebolt_ingest.table_utils import (
+    compare_columns,
     does_table_exist,
     drop_table,
     execute_set_statements,
+    format_column_errors,
+    get_ingestion_rowcounts,
     get_table_columns,
     get_table_schema,
+    is_engine_unavailable_error,
+    raise_on_tables_non_compatibility,
     verify_ingestion_file_names,
+    verify_ingestion_key_count,
     verify_ingestion_rowcount,
+    verify_ingestion_rowcount_for_files,
+    verify_unique_keys,
 )
-from firebolt_ingest.utils import format_query
+from firebolt_ingest.tracing import TracedCursor, Tracing
+from firebolt_ingest.utils import format_query, format_sql_literal
+from firebolt_ingest.warmup import WarmupSettings, WarmupStep, run_warmup
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,6 +87,103 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def traced(method: F) -> F:
+    """
+    Run a TableService method in a span, if tracing is configured
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "TableService", *args, **kwargs):
+        if self.tracing is None:
+            return method(self, *args, **kwargs)
+        with self.tracing.span(
+            f"TableService.{method.__name__}", self._span_attributes()
+        ):
+            return method(self, *args, **kwargs)
+
+    return cast(F, wrapper)
+
+
+# the run recorded by the outermost recorded method of the current call stack
+_current_run: ContextVar[Optional[IngestionRun]] = ContextVar(
+    "firebolt_ingest_run", default=None
+)
+# guards run counters, backfill units update them from worker threads
+_run_lock = threading.Lock()
+
+
+def recorded(method: F) -> F:
+    """
+    Record a TableService method call as a run in the run log and metrics,
+    if configured. Calls within a recorded run, e.g. insert_files
+    within insert_files_isolating_failures, are part of that run.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "TableService", *args, **kwargs):
+        if not (self.run_log or self.metrics) or _current_run.get() is not None:
+            return method(self, *args, **kwargs)
+
+        run = self._new_run()
+        token = _current_run.set(run)
+        try:
+            with timed_step(run, method.__name__):
+                result = method(self, *args, **kwargs)
+            run.outcome = RunOutcome.SUCCESS
+            return result
+        except Exception as e:
+            run.outcome, run.error = RunOutcome.FAILED, str(e)
+            raise
+        finally:
+            _current_run.reset(token)
+            self._record_run(run)
+
+    return cast(F, wrapper)
+
+
+def count_ingested(rows: Optional[int] = None, files: Optional[int] = None) -> None:
+    """
+    Add ingested rows and files to the current run, if any
+    """
+    run = _current_run.get()
+    if run is None:
+        return
+    with _run_lock:
+        if rows is not None:
+            run.rows_ingested = (run.rows_ingested or 0) + rows
+        if files is not None:
+            run.files_ingested = (run.files_ingested or 0) + files
+
+
+class IsolatedInsertResult(NamedTuple):
+    ingested_files: List[str]
+    # quarantined file name -> error of its insert
+    quarantined_files: Dict[str, str]
+    # number of files of every executed insert
+    inserts: List[int]
+
+
+def file_metadata_column_names(table_columns: List[Tuple]) -> List[str]:
+    """
+    Returns: names of the file-metadata columns present in the table columns
+    """
+    # compare normalized types, e.g. TIMESTAMPNTZ is reported as TIMESTAMP
+    column_types = {name: normalize_column_type(type_) for name, type_ in table_columns}
+    return [
+        c.name
+        for c in FILE_METADATA_COLUMNS
+        if column_types.get(c.name) == str(c.column_type)
+    ]
+
+
+class IngestionResult(NamedTuple):
+    verified: bool
+    warmup_steps: List[WarmupStep]
+    run: IngestionRun
+
 
 class TableService:
     def __init__(
@@ -35,6 +192,9 @@ class TableService:
         connection: Connection,
         external_prefix: str = "ex_",
         internal_prefix: str = "",
+        run_log: Optional[RunLog] = None,
+        metrics: Optional[IngestionMetrics] = None,
+        tracing: Optional[Tracing] = None,
     ):
         """
         Table service class used for creation of external/internal tables and
@@ -49,19 +209,79 @@ class TableService:
                 create the name of the external table. Defaults to 'ex_'.
             internal_prefix (str, optional): A prefix string added to the table name to
                 create the name of the internal table. Defaults to an empty string.
+            run_log (RunLog, optional): If provided, every ingest, insert
+                and backfill run is recorded in it.
+            metrics (IngestionMetrics, optional): If provided, executed statements
+                and runs are recorded in it.
+            tracing (Tracing, optional): If provided, every public method runs
+                in a span and every statement in a labeled child span.
         """
         self.connection = connection
         self.table = table
+        self.external_prefix = external_prefix
+        self.internal_prefix = internal_prefix
+        self.run_log = run_log
+        self.metrics = metrics
+        self.tracing = tracing
         self.internal_table_name = f"{internal_prefix}{self.table.table_name}"
         self.external_table_name = f"{external_prefix}{self.table.table_name}"
 
-    def create_external_table(self, aws_settings: AWSSettings) -> None:
+    def _cursor(self) -> Cursor:
         """
-        Constructs a query for creating an external table and executes it.
+        Returns: a new cursor, counting statements if metrics are configured
+        """
+        cursor = self.connection.cursor()
+        if self.tracing:
+            cursor = TracedCursor(cursor, self.tracing)  # type: ignore
+        if self.metrics:
+            return MeteredCursor(  # type: ignore
+                cursor, self.metrics, self.internal_table_name
+            )
+        return cursor
+
+    @traced
+    def check_compatibility(self, ignore_meta_columns: bool = False) -> None:
+        """
+        Raise, if the internal or external table doesn't match the table
+        definition. Run it once before inserting many batches with
+        insert_files(check_compatibility=False), e.g. when bisecting failures,
+        so that a schema mismatch fails the whole ingestion,
+        instead of every batch.
 
         Args:
-            table: table definition
+            ignore_meta_columns: whether the internal table may lack
+                the file-metadata columns
+        """
+        self._check_compatibility(self._cursor(), ignore_meta_columns)
+
+    def _check_compatibility(self, cursor: Cursor, ignore_meta_columns: bool) -> None:
+        """
+        Raise before an insert, if the internal or external table
+        doesn't match the table definition
+        """
+        raise_on_tables_non_compatibility(
+            cursor,
+            self.table,
+            ignore_meta_columns=ignore_meta_columns,
+            internal_table_name=self.internal_table_name,
+            external_table_name=self.external_table_name,
+        )
+
+    def _span_attributes(self) -> Dict[str, Any]:
+        return {
+            "firebolt.internal_table": self.internal_table_name,
+            "firebolt.external_table": self.external_table_name,
+            "firebolt.sync_mode": self.table.sync_mode or "",
+        }
+
+    def generate_external_table_query(
+        self, aws_settings: AWSSettings
+    ) -> Tuple[str, List]:
+        """
+        Args:
             aws_settings: aws settings
+
+        Returns: the query creating the external table and its parameters
         """
         # Prepare aws credentials
         if aws_settings.aws_credentials:
@@ -97,23 +317,39 @@ class TableService:
             + [self.table.object_pattern]
         )
 
-        logger.info(f"Create external table with query:\n{query}")
-        # Execute parametrized query
-        self.connection.cursor().execute(format_query(query), params)
+        return format_query(query), params
 
-    def create_internal_table(self, add_file_metadata=True) -> None:
+    @traced
+    def create_external_table(self, aws_settings: AWSSettings) -> None:
         """
-        Constructs a query for creating an internal table and executes it
+        Constructs a query for creating an external table and executes it.
 
         Args:
             table: table definition
+            aws_settings: aws settings
         """
+        query, params = self.generate_external_table_query(aws_settings)
+        logger.info(f"Create external table with query:\n{query}")
+        # Execute parametrized query
+        self._cursor().execute(query, params)
 
+    def generate_internal_table_query(
+        self, add_file_metadata: bool = True, table_name: Optional[str] = None
+    ) -> Tuple[str, List]:
+        """
+        Args:
+            add_file_metadata: whether to add the file-metadata columns
+            table_name: (Optional) name of the created table,
+                the internal table name by default
+
+        Returns: the query creating the internal table and its parameters
+        """
         columns_stmt, columns_params = self.table.generate_internal_columns_string(
             add_file_metadata
         )
         query = (
-            f"CREATE FACT TABLE {self.internal_table_name}\n"
+            f"CREATE {self.table.generate_table_type()} TABLE "
+            f"{table_name or self.internal_table_name}\n"
             f"({columns_stmt})\n"
             f"PRIMARY INDEX {self.table.generate_primary_index_string()}\n"
         )
@@ -121,9 +357,325 @@ class TableService:
         if self.table.partitions:
             query += f"PARTITION BY {self.table.generate_partitions_string()}\n"  # noqa: E501
 
+        return format_query(query), columns_params
+
+    @traced
+    def create_internal_table(self, add_file_metadata=True) -> None:
+        """
+        Constructs a query for creating an internal table and executes it
+
+        Args:
+            table: table definition
+        """
+        query, params = self.generate_internal_table_query(add_file_metadata)
         logger.info(f"Create internal table with query:\n{query}")
-        self.connection.cursor().execute(format_query(query), columns_params)
+        cursor = self._cursor()
+        cursor.execute(query, params)
+        self._create_indexes(cursor)
+        self._drop_ingested_files_table(cursor)
+
+    @traced
+    def ensure_external_table(
+        self,
+        aws_settings: AWSSettings,
+        store: Optional[DdlFingerprintStore] = None,
+    ) -> EnsureResult:
+        """
+        Create the external table, or recreate it if its definition changed.
+
+        With a store the whole generated DDL is compared by fingerprint,
+        so a changed URL, object pattern, file type or credentials is detected,
+        and a table without a stored fingerprint is recreated once.
+        Without a store only the live columns are compared.
+        Recreating is cheap, the external table holds no data.
+
+        Args:
+            aws_settings: aws settings
+            store: (Optional) fingerprints of the created tables
+
+        Returns: the action taken and why
+        """
+        query, params = self.generate_external_table_query(aws_settings)
+        fingerprint = ddl_fingerprint([(query, params)])
+        cursor = self._cursor()
+
+        if not does_table_exist(cursor, self.external_table_name):
+            action, reason = "created", "table does not exist"
+        elif store is not None:
+            stored = store.get(self.external_table_name)
+            if stored and stored["fingerprint"] == fingerprint:
+                return EnsureResult("unchanged", "fingerprint matches")
+            action = "recreated"
+            reason = "definition changed" if stored else "no stored fingerprint"
+        else:
+            errors = compare_columns(
+                self.external_table_name,
+                get_table_columns(cursor, self.external_table_name),
+                [(c.name, c.type) for c in self.table.external_columns],
+                [(c.name, c.type) for c in FILE_METADATA_COLUMNS],
+            )
+            if not errors:
+                return EnsureResult("unchanged", "columns match the live schema")
+            action, reason = "recreated", format_column_errors(errors)
+
+        logger.info(f"External table {self.external_table_name} {action}: {reason}")
+        if action == "recreated":
+            drop_table(cursor, self.external_table_name)
+        cursor.execute(query, params)
+        if store is not None:
+            # parameters contain the credentials, keep only the query in the store
+            store.set(self.external_table_name, fingerprint, query)
+        return EnsureResult(action, reason)
+
+    @traced
+    def ensure_internal_table(
+        self,
+        add_file_metadata: bool = True,
+        store: Optional[DdlFingerprintStore] = None,
+    ) -> EnsureResult:
+        """
+        Create the internal table with its indexes, if it doesn't exist.
+
+        An existing internal table is never dropped: if its definition changed,
+        "rebuild_required" is returned with the difference. With a stored
+        fingerprint the whole DDL is compared, including the primary index,
+        partitions and indexes. Otherwise only the live columns are compared,
+        and on a match the fingerprint is stored.
+
+        Args:
+            add_file_metadata: whether to add the file-metadata columns
+            store: (Optional) fingerprints of the created tables
+
+        Returns: the action taken and why
+        """
+        statements = self._internal_table_statements(add_file_metadata)
+        query, params = statements[0]
+        fingerprint = ddl_fingerprint(statements)
+        ddl = render_ddl(statements)
+        cursor = self._cursor()
+
+        if not does_table_exist(cursor, self.internal_table_name):
+            logger.info(f"Create internal table with query:\n{query}")
+            cursor.execute(query, params)
+            self._create_indexes(cursor)
+            self._drop_ingested_files_table(cursor)
+            if store is not None:
+                store.set(self.internal_table_name, fingerprint, ddl)
+            return EnsureResult("created", "table does not exist")
+
+        stored = store.get(self.internal_table_name) if store is not None else None
+        if stored:
+            if stored["fingerprint"] == fingerprint:
+                return EnsureResult("unchanged", "fingerprint matches")
+            reason = "definition changed:\n" + "\n".join(
+                unified_diff(
+                    stored["ddl"].splitlines(),
+                    ddl.splitlines(),
+                    "stored",
+                    "expected",
+                    lineterm="",
+                )
+            )
+        else:
+            expected_columns = [
+                (c.alias or c.name, c.type)
+                for c in self.table.internal_columns
+                + (FILE_METADATA_COLUMNS if add_file_metadata else [])
+            ]
+            errors = compare_columns(
+                self.internal_table_name,
+                get_table_columns(cursor, self.internal_table_name),
+                expected_columns,
+                [],
+            )
+            if not errors:
+                if store is not None:
+                    store.set(self.internal_table_name, fingerprint, ddl)
+                return EnsureResult("unchanged", "columns match the live schema")
+            reason = format_column_errors(errors)
+
+        logger.warning(
+            f"Internal table {self.internal_table_name} has to be rebuilt: {reason}"
+        )
+        return EnsureResult("rebuild_required", reason)
+
+    def _internal_table_statements(self, add_file_metadata: bool) -> List[Statement]:
+        """
+        Returns: the statements creating the internal table and its indexes
+        """
+        statements: List[Statement] = [
+            self.generate_internal_table_query(add_file_metadata)
+        ]
+        return statements + [
+            (index_query, []) for index_query in self.generate_index_statements()
+        ]
+
+    def generate_index_statements(self) -> List[str]:
+        """
+        Returns: the queries creating the indexes of the internal table.
+            Index names are prefixed with the internal prefix,
+            the same way the table name is.
+        """
+        return [
+            f"CREATE AGGREGATING INDEX {self.internal_prefix}{index.index_name} "
+            f"ON {self.internal_table_name} ({index.as_sql_string()})"
+            for index in self.table.aggregating_indexes or []
+        ] + [
+            f"CREATE JOIN INDEX {self.internal_prefix}{index.index_name} "
+            f"ON {self.internal_table_name} ({index.as_sql_string()})"
+            for index in self.table.join_indexes or []
+        ]
+
+    def _create_indexes(self, cursor: Cursor) -> None:
+        for query in self.generate_index_statements():
+            logger.info(f"Create index with query:\n{query}")
+            cursor.execute(query=query)
+
+    @traced
+    def evolve_schema(
+        self, store: Optional[DdlFingerprintStore] = None, **kwargs
+    ) -> List[str]:
+        """
+        Add the columns of the table definition, that the internal table lacks,
+        without reading the external table again.
+
+        The internal table is copied into a staging table with the new schema,
+        filling the new columns with their default, and the staging table
+        replaces the internal table. A column default is Column.default,
+        NULL for nullable columns, or the zero value of the column type.
+        Only additive changes are supported, removed or retyped columns
+        require a full reload.
+
+        The replacement takes two renames, between them the internal table
+        doesn't exist and queries of it fail, so it should not be queried
+        or ingested into while the schema evolves. If the second rename fails,
+        the previous table is renamed back.
+
+        Args:
+            store: (Optional) fingerprints of the created tables,
+                updated with the new definition of the internal table
+
+        Kwargs:
+            advanced_mode: (Optional)
+            use_short_column_path_parquet: (Optional) Use short parquet column path
+             and skipping repeated nodes and their child node
+
+        Returns: the names of the added columns, empty if the schema is unchanged
+        """
+        cursor = self._cursor()
+        internal_table_columns = get_table_columns(cursor, self.internal_table_name)
+        metadata_column_names = file_metadata_column_names(internal_table_columns)
+        # the file metadata is kept, if the internal table has it
+        add_file_metadata = len(metadata_column_names) == len(FILE_METADATA_COLUMNS)
+
+        columns = self.table.internal_columns + (
+            FILE_METADATA_COLUMNS if add_file_metadata else []
+        )
+        errors = compare_columns(
+            self.internal_table_name,
+            internal_table_columns,
+            [(c.alias or c.name, c.type) for c in columns],
+            [],
+        )
+        removed = [err for err in errors if err[3] == "found but not expected"]
+        if removed:
+            raise FireboltError(
+                "Schema change is not additive, a full reload is required:\n"
+                + format_column_errors(errors)
+            )
+
+        added_column_names = [err[0] for err in errors]
+        if not added_column_names:
+            logger.info(f"Schema of {self.internal_table_name} is up to date")
+            return []
+
+        staging_table_name = f"{self.internal_table_name}_staging"
+        previous_table_name = f"{self.internal_table_name}_previous"
+        drop_table(cursor, staging_table_name)
+        drop_table(cursor, previous_table_name)
+
+        query, params = self.generate_internal_table_query(
+            add_file_metadata, staging_table_name
+        )
+        logger.info(f"Create staging table with query:\n{query}")
+        cursor.execute(query, params)
 
+        select_list = []
+        for column in columns:
+            name = column.alias or column.name
+            if name in added_column_names:
+                select_list.append(f"{column.generate_default_string()} AS {name}")
+            else:
+                select_list.append(name)
+        insert_query = (
+            f"INSERT INTO {staging_table_name}\n"
+            f"SELECT {', '.join(select_list)}\n"
+            f"FROM {self.internal_table_name}\n"
+        )
+        logger.info(f"Copy into staging table with query:\n{insert_query}")
+        execute_set_statements(cursor, **kwargs)
+        cursor.execute(query=format_query(insert_query))
+
+        if not verify_ingestion_rowcount(
+            cursor, staging_table_name, self.internal_table_name
+        ):
+            drop_table(cursor, staging_table_name)
+            raise FireboltError(
+                f"Row count of {staging_table_name} doesn't match "
+                f"{self.internal_table_name}, schema evolution aborted"
+            )
+
+        logger.info(
+            f"Replace {self.internal_table_name} by {staging_table_name}, "
+            f"added columns: {added_column_names}"
+        )
+        cursor.execute(
+            f"ALTER TABLE {self.internal_table_name} RENAME TO {previous_table_name}"
+        )
+        try:
+            cursor.execute(
+                f"ALTER TABLE {staging_table_name} RENAME TO {self.internal_table_name}"
+            )
+        except Exception:
+            logger.exception(
+                f"Rename of {staging_table_name} failed, "
+                f"restore {self.internal_table_name}"
+            )
+            cursor.execute(
+                f"ALTER TABLE {previous_table_name} "
+                f"RENAME TO {self.internal_table_name}"
+            )
+            raise
+        # indexes are dropped together with the previous table
+        drop_table(cursor, previous_table_name)
+        self._create_indexes(cursor)
+        self._refresh_join_indexes(cursor)
+
+        if store is not None:
+            statements = self._internal_table_statements(add_file_metadata)
+            store.set(
+                self.internal_table_name,
+                ddl_fingerprint(statements),
+                render_ddl(statements),
+            )
+        return added_column_names
+
+    @traced
+    def refresh_join_indexes(self) -> None:
+        """
+        Rebuild the join indexes of a dimension table, so joins use the
+        freshly loaded data. Called after every insert.
+        """
+        self._refresh_join_indexes(self._cursor())
+
+    def _refresh_join_indexes(self, cursor: Cursor) -> None:
+        for index in self.table.join_indexes or []:
+            query = f"REFRESH JOIN INDEX {self.internal_prefix}{index.index_name}"
+            logger.info(f"Refresh join index with query:\n{query}")
+            cursor.execute(query=query)
+
+    @traced
+    @recorded
     def insert_full_overwrite(
         self,
         **kwargs,
@@ -141,13 +693,8 @@ class TableService:
             use_short_column_path_parquet: (Optional) Use short parquet column path
              and skipping repeated nodes and their child node
         """
-        cursor = self.connection.cursor()
-
-        # TODO: uncomment it back after the fix applied,
-        # commented because of https://packboard.atlassian.net/browse/FIR-26886
-        # raise_on_tables_non_compatibility(cursor,
-        #                                   self.table,
-        #                                   ignore_meta_columns=True)
+        cursor = self._cursor()
+        self._check_compatibility(cursor, ignore_meta_columns=True)
 
         # get table schema
         internal_table_schema = get_table_schema(cursor, self.internal_table_name)
@@ -160,27 +707,20 @@ class TableService:
         # recreate the table
         logger.info(f"Create internal table:\n{internal_table_schema}")
         cursor.execute(query=internal_table_schema)
+        # indexes are dropped together with the table
+        self._create_indexes(cursor)
+        self._drop_ingested_files_table(cursor)
 
         # insert the data from external to internal
-        column_names = [
-            (f'"{c.name}"' + (f" AS {c.alias}" if c.alias else ""))
-            for c in self.table.columns
-        ]
-
-        for c in FILE_METADATA_COLUMNS:
-            name, type_ = c.name, c.type
-            # Check if FILE_METADATA_COLUMNS is present in internal_table_columns
-            # TIMESTAMPNTZ is sometimes represented as TIMESTAMP, need to check both
-            if (name, type_) in internal_table_columns or (
-                type_ == "TIMESTAMPNTZ"
-                and (name, "TIMESTAMP") in internal_table_columns
-            ):
-                column_names.append(name)
+        column_names = self._external_column_list() + file_metadata_column_names(
+            internal_table_columns
+        )
 
         insert_query = (
             f"INSERT INTO {self.internal_table_name}\n"
             f"SELECT {', '.join(column_names)}\n"
             f"FROM {self.external_table_name}\n"
+            f"{self._filter_condition('WHERE')}"
         )
 
         logger.info(f"Insert with query:\n{insert_query}")
@@ -189,12 +729,20 @@ class TableService:
             **kwargs,
         )
         cursor.execute(query=format_query(insert_query))
+        self._refresh_join_indexes(cursor)
 
+    @traced
+    @recorded
     def insert_incremental_append(self, use_materialized_query=False, **kwargs) -> None:
         """
         Insert from the external table only new files,
         that aren't in the internal table.
 
+        New files are detected by name and timestamp only. A new file
+        byte-identical to an ingested one is ingested again, only the watch
+        mode (IngestionWatcher with a FileStateStore) skips identical files
+        by their etag. With append_dedup their rows are dropped as duplicate keys.
+
         Requires internal table to have file-metadata columns
         (source_file_name and source_file_timestamp)
 
@@ -208,12 +756,7 @@ class TableService:
         Returns:
 
         """
-        cursor = self.connection.cursor()
-        # TODO: uncomment it back after the fix applied,
-        # commented because of https://packboard.atlassian.net/browse/FIR-26886
-        # raise_on_tables_non_compatibility(cursor,
-        #                                   self.table,
-        #                                   ignore_meta_columns=False)
+        cursor = self._cursor()
 
         if not does_table_exist(cursor, self.internal_table_name):
             raise FireboltError(f"Fact table {self.internal_table_name} doesn't exist")
@@ -221,13 +764,38 @@ class TableService:
             raise FireboltError(
                 f"External table {self.external_table_name} doesn't exist"
             )
+        self._check_compatibility(cursor, ignore_meta_columns=False)
 
-        column_names = [
-            (f'"{c.name}"' + (f" AS {c.alias}" if c.alias else ""))
-            for c in self.table.columns
-        ]
+        column_names = self._external_column_list()
 
-        if use_materialized_query:
+        if self.table.append_dedup:
+            ctes = []
+            if use_materialized_query:
+                ctes.append(
+                    f"a AS materialized (SELECT DISTINCT source_file_name "
+                    f"FROM {self.internal_table_name})"
+                )
+                new_files_filter = (
+                    "source_file_name NOT IN (SELECT source_file_name FROM a)"
+                )
+            else:
+                new_files_filter = f"""
+                    (source_file_name, source_file_timestamp::timestampntz)
+                    NOT IN (
+                        SELECT DISTINCT source_file_name,
+                                        source_file_timestamp
+                        FROM {self.internal_table_name})
+                """
+            insert_query = self._deduplicated_insert_query(
+                f"""
+                SELECT {', '.join(column_names)},
+                    source_file_name, source_file_timestamp
+                FROM {self.external_table_name}
+                WHERE {new_files_filter}
+                {self._filter_condition()}""",
+                ctes,
+            )
+        elif use_materialized_query:
             # Optimized query
             insert_query = f"""
                 INSERT INTO {self.internal_table_name}
@@ -242,7 +810,7 @@ class TableService:
                     SELECT source_file_name
                     FROM a
                 )
-            """
+                {self._filter_condition()}"""
         else:
             insert_query = f"""
                 INSERT INTO {self.internal_table_name}
@@ -254,7 +822,7 @@ class TableService:
                     SELECT DISTINCT source_file_name,
                                     source_file_timestamp
                     FROM {self.internal_table_name})
-                """
+                {self._filter_condition()}"""
 
         logger.info(f"Insert with query:\n{insert_query}")
         execute_set_statements(
@@ -262,18 +830,613 @@ class TableService:
             **kwargs,
         )
         cursor.execute(query=format_query(insert_query))
+        self._refresh_join_indexes(cursor)
+
+    @traced
+    @recorded
+    def insert_merge(self, **kwargs) -> None:
+        """
+        Insert from the external table the rows of new files,
+        replacing the rows of the internal table with the same unique key.
+
+        The rows of the new files are read once into a staging table.
+        The rows of the internal table with a key in the staging table
+        and an older or equal source_file_timestamp are deleted, and the
+        staging rows, deduplicated by latest source_file_timestamp unless
+        merge_dedup is false, are inserted for the keys, that have no newer
+        row left. So a late file never replaces a newer row, and the work
+        is proportional to the new files and the keys they change.
+
+        The ingested files are tracked in a file-state table
+        (see ingested_files_table_name), since a file, whose rows were all
+        replaced, is no longer in the internal table. The new files are listed
+        first and all of them are recorded, also files without rows or whose
+        rows the filter removed, so no file is staged again by the next run.
+        The staged rows and the new files are counted, on the small staging
+        tables, and logged.
+        The files are recorded last, so after a failure the next run
+        stages them again.
+
+        Requires internal table to have file-metadata columns
+        (source_file_name and source_file_timestamp)
+
+        Args:
+            **kwargs: Additional keyword arguments which are passed
+                to execute_set_statements.
+        """
+        cursor = self._cursor()
+
+        if not does_table_exist(cursor, self.internal_table_name):
+            raise FireboltError(f"Fact table {self.internal_table_name} doesn't exist")
+        if not does_table_exist(cursor, self.external_table_name):
+            raise FireboltError(
+                f"External table {self.external_table_name} doesn't exist"
+            )
+        self._check_compatibility(cursor, ignore_meta_columns=False)
+        self._ensure_ingested_files_table(cursor)
+
+        key_columns = ", ".join(self.table.get_unique_key())
+        column_names = ", ".join(self._internal_column_list())
+        staging_table_name = f"{self.internal_table_name}_merge"
+        new_files_table_name = f"{self.internal_table_name}_merge_files"
+        drop_table(cursor, staging_table_name)
+        drop_table(cursor, new_files_table_name)
+        query, params = self.generate_internal_table_query(
+            table_name=staging_table_name
+        )
+        logger.info(f"Create staging table with query:\n{query}")
+        cursor.execute(query, params)
+        self._create_file_list_table(cursor, new_files_table_name)
+
+        execute_set_statements(
+            cursor,
+            **kwargs,
+        )
+        new_files_query = f"""
+            INSERT INTO {new_files_table_name}
+            SELECT DISTINCT source_file_name, source_file_timestamp
+            FROM {self.external_table_name}
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {self.ingested_files_table_name} f
+                WHERE f.source_file_name = {self.external_table_name}.source_file_name
+                AND f.source_file_timestamp =
+                    {self.external_table_name}.source_file_timestamp::timestampntz)"""
+        logger.info(f"List new files with query:\n{new_files_query}")
+        cursor.execute(query=format_query(new_files_query))
+
+        staging_query = f"""
+            INSERT INTO {staging_table_name}
+            SELECT {', '.join(self._external_column_list())},
+                    source_file_name, source_file_timestamp
+            FROM {self.external_table_name}
+            WHERE EXISTS (
+                SELECT 1 FROM {new_files_table_name} f
+                WHERE f.source_file_name = {self.external_table_name}.source_file_name
+                AND f.source_file_timestamp =
+                    {self.external_table_name}.source_file_timestamp::timestampntz)
+            {self._filter_condition()}"""
+        logger.info(f"Stage new rows with query:\n{staging_query}")
+        cursor.execute(query=format_query(staging_query))
+        cursor.execute(
+            f"SELECT (SELECT COUNT(*) FROM {staging_table_name}), "
+            f"(SELECT COUNT(*) FROM {new_files_table_name})"
+        )
+        staged_rows, new_files = cursor.fetchone()  # type: ignore
+        logger.info(f"Merge {staged_rows} rows of {new_files} new files")
+        count_ingested(rows=staged_rows, files=new_files)
+
+        delete_query = f"""
+            DELETE FROM {self.internal_table_name}
+            WHERE EXISTS (
+                SELECT 1 FROM {staging_table_name}
+                WHERE {self._same_key(staging_table_name, self.internal_table_name)}
+                AND {staging_table_name}.source_file_timestamp >=
+                    {self.internal_table_name}.source_file_timestamp)
+        """
+        logger.info(f"Delete changed keys with query:\n{delete_query}")
+        cursor.execute(query=format_query(delete_query))
+
+        if self.table.merge_dedup is False:
+            merged_rows_query = f"SELECT {column_names} FROM {staging_table_name}"
+        else:
+            merged_rows_query = f"""
+                SELECT {column_names}
+                FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY {key_columns}
+                        ORDER BY source_file_timestamp DESC, source_file_name DESC
+                    ) AS merge_row_number
+                    FROM {staging_table_name})
+                WHERE merge_row_number = 1"""
+        insert_query = f"""
+            INSERT INTO {self.internal_table_name}
+            SELECT {column_names}
+            FROM ({merged_rows_query}) AS merged
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {self.internal_table_name}
+                WHERE {self._same_key(self.internal_table_name, "merged")})
+        """
+        logger.info(f"Insert with query:\n{insert_query}")
+        cursor.execute(query=format_query(insert_query))
+
+        files_query = f"""
+            INSERT INTO {self.ingested_files_table_name}
+            SELECT source_file_name, source_file_timestamp
+            FROM {new_files_table_name}
+        """
+        logger.info(f"Record ingested files with query:\n{files_query}")
+        cursor.execute(query=format_query(files_query))
 
+        drop_table(cursor, staging_table_name)
+        drop_table(cursor, new_files_table_name)
+        self._refresh_join_indexes(cursor)
+
+    @property
+    def ingested_files_table_name(self) -> str:
+        """
+        Returns: the name of the table tracking the files ingested
+            in merge sync mode
+        """
+        return f"{self.internal_table_name}_ingested_files"
+
+    def _ensure_ingested_files_table(self, cursor: Cursor) -> None:
+        """
+        Create the file-state table of merge sync mode, if it doesn't exist,
+        with the files present in the internal table
+        """
+        if does_table_exist(cursor, self.ingested_files_table_name):
+            return
+
+        self._create_file_list_table(cursor, self.ingested_files_table_name)
+        cursor.execute(
+            format_query(
+                f"""
+                INSERT INTO {self.ingested_files_table_name}
+                SELECT DISTINCT source_file_name, source_file_timestamp
+                FROM {self.internal_table_name}"""
+            )
+        )
+
+    def _drop_ingested_files_table(self, cursor: Cursor) -> None:
+        """
+        Drop the file-state table of merge sync mode with the internal table,
+        the next merge recreates it from the files of the new internal table
+        """
+        drop_table(cursor, self.ingested_files_table_name)
+
+    @staticmethod
+    def _create_file_list_table(cursor: Cursor, table_name: str) -> None:
+        query = (
+            f"CREATE FACT TABLE IF NOT EXISTS {table_name}\n"
+            f"(source_file_name TEXT, source_file_timestamp TIMESTAMPNTZ)\n"
+            f"PRIMARY INDEX source_file_name\n"
+        )
+        logger.info(f"Create file list table with query:\n{query}")
+        cursor.execute(format_query(query))
+
+    @traced
+    @recorded
+    def insert_files(
+        self, file_names: Sequence[str], check_compatibility: bool = True, **kwargs
+    ) -> None:
+        """
+        Insert from the external table only the rows of the given source files.
+
+        Unlike insert_incremental_append, no anti-join against the internal
+        table is performed, the caller is responsible for passing files,
+        that were not ingested yet.
+
+        Requires internal table to have file-metadata columns
+        (source_file_name and source_file_timestamp)
+
+        Args:
+            file_names: source_file_name values of the files to ingest
+            check_compatibility: whether to check the table schemas first,
+                false if the caller ran check_compatibility already
+            **kwargs: Additional keyword arguments which are passed
+                to execute_set_statements.
+        """
+        if not file_names:
+            logger.info("No files to insert, skipping")
+            return
+
+        cursor = self._cursor()
+        if check_compatibility:
+            self._check_compatibility(cursor, ignore_meta_columns=False)
+        new_rows_query = f"""
+            SELECT {', '.join(self._external_column_list())},
+                    source_file_name, source_file_timestamp
+            FROM {self.external_table_name}
+            WHERE source_file_name IN ({', '.join('?' * len(file_names))})
+            {self._filter_condition()}"""
+        if self.table.append_dedup:
+            insert_query = self._deduplicated_insert_query(new_rows_query)
+        else:
+            insert_query = f"""
+            INSERT INTO {self.internal_table_name}{new_rows_query}"""
+
+        logger.info(f"Insert {len(file_names)} files with query:\n{insert_query}")
+        execute_set_statements(
+            cursor,
+            **kwargs,
+        )
+        cursor.execute(format_query(insert_query), list(file_names))
+        count_ingested(files=len(file_names))
+        self._refresh_join_indexes(cursor)
+
+    @traced
+    @recorded
+    def insert_files_isolating_failures(
+        self,
+        file_names: Optional[Sequence[str]] = None,
+        quarantine_table_name: Optional[str] = None,
+        **kwargs,
+    ) -> IsolatedInsertResult:
+        """
+        Insert the files, isolating the files that make the insert fail.
+
+        The batch is inserted at once. If the insert fails, the batch is split
+        in halves and each half is inserted separately, until the failing files
+        are found. A single failing file costs about 2*log2(batch size) extra
+        inserts. Failing files are quarantined, the rest is ingested.
+
+        Only errors of the query are bisected. If the engine is unavailable,
+        the error is raised right away, after recording the files
+        quarantined so far, so an outage doesn't quarantine healthy files.
+        The table schemas are checked once before the first insert,
+        a mismatch is raised, without inserting or quarantining any file.
+
+        Requires internal table to have file-metadata columns
+        (source_file_name and source_file_timestamp)
+
+        Args:
+            file_names: (Optional) files to insert, defaults to all new files
+                of the external table, that aren't quarantined
+            quarantine_table_name: (Optional) table to record quarantined files
+                in, created if it doesn't exist
+            **kwargs: Additional keyword arguments which are passed
+                to execute_set_statements.
+
+        Returns:
+            ingested and quarantined files, and the number of inserts executed
+        """
+        self.check_compatibility()
+        if quarantine_table_name:
+            self._create_quarantine_table(quarantine_table_name)
+        if file_names is None:
+            file_names = self.get_new_file_names(quarantine_table_name)
+
+        result = IsolatedInsertResult([], {}, [])
+
+        def insert_or_bisect(batch: Sequence[str]) -> None:
+            result.inserts.append(len(batch))
+            try:
+                self.insert_files(batch, check_compatibility=False, **kwargs)
+                result.ingested_files.extend(batch)
+                return
+            except Exception as e:
+                if is_engine_unavailable_error(e):
+                    raise
+                if len(batch) == 1:
+                    logger.warning(f"Quarantine file {batch[0]}: {e}")
+                    result.quarantined_files[batch[0]] = str(e)
+                    return
+                logger.info(f"Insert of {len(batch)} files failed, bisect the batch")
+
+            middle = len(batch) // 2
+            insert_or_bisect(batch[:middle])
+            insert_or_bisect(batch[middle:])
+
+        try:
+            if file_names:
+                insert_or_bisect(list(file_names))
+        finally:
+            if quarantine_table_name and result.quarantined_files:
+                self._quarantine_files(quarantine_table_name, result.quarantined_files)
+
+        return result
+
+    @traced
+    def get_new_file_names(
+        self, quarantine_table_name: Optional[str] = None
+    ) -> List[str]:
+        """
+        Find the files of the external table, that aren't in the internal table.
+
+        Args:
+            quarantine_table_name: (Optional) exclude files quarantined
+                for this table
+
+        Returns: a sorted list of source_file_name values
+        """
+        query = f"""
+            SELECT DISTINCT source_file_name
+            FROM {self.external_table_name}
+            WHERE (source_file_name, source_file_timestamp::timestampntz)
+            NOT IN (
+                SELECT DISTINCT source_file_name,
+                                source_file_timestamp
+                FROM {self.internal_table_name})
+            """
+        params = []
+        if quarantine_table_name:
+            query += f"""
+            AND source_file_name NOT IN (
+                SELECT source_file_name
+                FROM {quarantine_table_name}
+                WHERE table_name = ?)
+            """
+            params.append(self.internal_table_name)
+
+        cursor = self._cursor()
+        cursor.execute(format_query(query), params)
+        return sorted(row[0] for row in cursor.fetchall())  # type: ignore
+
+    @traced
+    def get_quarantined_file_names(self, quarantine_table_name: str) -> Set[str]:
+        """
+        Args:
+            quarantine_table_name: table of the quarantined files,
+                created if it doesn't exist
+
+        Returns: the set of source_file_name values quarantined for this table
+        """
+        self._create_quarantine_table(quarantine_table_name)
+        cursor = self._cursor()
+        cursor.execute(
+            f"SELECT DISTINCT source_file_name FROM {quarantine_table_name} "
+            f"WHERE table_name = ?",
+            [self.internal_table_name],
+        )
+        return {row[0] for row in cursor.fetchall()}  # type: ignore
+
+    def _create_quarantine_table(self, quarantine_table_name: str) -> None:
+        query = (
+            f"CREATE FACT TABLE IF NOT EXISTS {quarantine_table_name}\n"
+            f"(table_name TEXT, source_file_name TEXT, error TEXT, "
+            f"quarantined_at TIMESTAMP)\n"
+            f"PRIMARY INDEX table_name, source_file_name\n"
+        )
+        self._cursor().execute(format_query(query))
+
+    def _quarantine_files(
+        self, quarantine_table_name: str, quarantined_files: Dict[str, str]
+    ) -> None:
+        now = datetime.utcnow().replace(microsecond=0)
+        query = f"INSERT INTO {quarantine_table_name} VALUES " + ", ".join(
+            ["(?, ?, ?, ?)"] * len(quarantined_files)
+        )
+        params: List = []
+        for file_name, error in quarantined_files.items():
+            params += [self.internal_table_name, file_name, error, now]
+
+        logger.info(f"Quarantine {len(quarantined_files)} files")
+        self._cursor().execute(query, params)
+
+    @traced
+    def get_ingested_file_names(
+        self, file_names: Optional[Sequence[str]] = None
+    ) -> Set[str]:
+        """
+        Args:
+            file_names: (Optional) only check, which of these files are ingested
+
+        Returns: the set of source_file_name values present in the internal table,
+            in merge sync mode in the ingested files table, as the rows
+            of a file may all be replaced
+        """
+        cursor = self._cursor()
+        table_name = self.internal_table_name
+        if self.table.sync_mode == "merge":
+            self._ensure_ingested_files_table(cursor)
+            table_name = self.ingested_files_table_name
+        query = f"SELECT DISTINCT source_file_name FROM {table_name}"
+        if file_names is None:
+            cursor.execute(query=query)
+        elif not file_names:
+            return set()
+        else:
+            placeholders = ", ".join("?" * len(file_names))
+            cursor.execute(
+                f"{query} WHERE source_file_name IN ({placeholders})", list(file_names)
+            )
+        return {row[0] for row in cursor.fetchall()}  # type: ignore
+
+    @traced
+    def verify_files_ingestion(self, file_names: Sequence[str]) -> bool:
+        """
+        Verify ingestion of the given files, by comparing their rowcount
+        in the internal and external tables
+        """
+        return verify_ingestion_rowcount_for_files(
+            self._cursor(),
+            self.internal_table_name,
+            self.external_table_name,
+            file_names,
+            external_filter=self.table.filter,
+        )
+
+    @traced
+    @recorded
+    def backfill(
+        self,
+        start: PartitionValue,
+        end: PartitionValue,
+        max_workers: int = 4,
+        progress_path: Optional[str] = None,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        **kwargs,
+    ) -> BackfillResult:
+        """
+        Reload a range of partitions from the external table.
+
+        The range is split into one unit per partition value. Every unit drops
+        its partition and inserts the rows of the external table, whose partition
+        expression equals the value, then counts the rows of the partition.
+        Units run in parallel, each on its own
+        cursor, at most max_workers at a time. If an adaptive concurrency
+        controller is provided, it limits the concurrent inserts further.
+
+        Only tables with a single partition column or expression are supported.
+        Partition values are integers, e.g. for EXTRACT(YEAR FROM ...),
+        or dates for DATE columns. Cyclic parts, e.g. EXTRACT(DAY FROM ...),
+        are refused, their values repeat every month, so a unit would
+        rewrite the same day of every month instead of a single date.
+
+        Args:
+            start: first partition value of the range
+            end: last partition value of the range, inclusive
+            max_workers: maximum number of units running at the same time
+            progress_path: (Optional) json file recording completed units,
+                units completed by a previous run over the same range are skipped
+            concurrency: (Optional) adaptive limit of the concurrent inserts,
+                max_workers should be at least its max_limit
+            **kwargs: Additional keyword arguments which are passed
+                to execute_set_statements.
+
+        Returns:
+            completed, skipped and failed partition values
+        """
+        if len(self.table.partitions) != 1:
+            raise FireboltError(
+                f"Backfill requires table {self.internal_table_name} "
+                f"to have exactly one partition, "
+                f"found {len(self.table.partitions)}"
+            )
+        partition = self.table.partitions[0]
+        if partition.datetime_part is not None and partition.datetime_part.is_cyclic:
+            raise FireboltError(
+                f"Backfill of table {self.internal_table_name} is not supported "
+                f"for the cyclic partition {partition.as_sql_string()}, "
+                f"partition by a date column or EXTRACT(YEAR ...) instead"
+            )
+
+        cursor = self._cursor()
+        self._check_compatibility(cursor, ignore_meta_columns=True)
+        metadata_columns = file_metadata_column_names(
+            get_table_columns(cursor, self.internal_table_name)
+        )
+        # the partition expression, evaluated on the external table columns
+        partition_expression = partition.as_sql_string(
+            self.table.get_external_expressions().get(partition.column_name)
+        )
+        insert_query = format_query(
+            f"""
+            INSERT INTO {self.internal_table_name}
+            SELECT {', '.join(self._external_column_list() + metadata_columns)}
+            FROM {self.external_table_name}
+            WHERE {partition_expression} = ?
+            {self._filter_condition()}"""
+        )
+        # counts the rows of a single partition, no scan of other partitions
+        count_query = (
+            f"SELECT COUNT(*) FROM {self.internal_table_name} "
+            f"WHERE {partition.as_sql_string()} = ?"
+        )
+
+        progress = (
+            BackfillProgress(progress_path, self.internal_table_name, start, end)
+            if progress_path
+            else None
+        )
+        values = partition_values(start, end)
+        pending = [v for v in values if not (progress and progress.is_completed(v))]
+        result = BackfillResult([], [v for v in values if v not in pending], {})
+
+        def run_unit(value: PartitionValue) -> None:
+            unit_cursor = self._cursor()
+            drop_partition_query = (
+                f"ALTER TABLE {self.internal_table_name} "
+                f"DROP PARTITION {format_sql_literal(value)}"
+            )
+            logger.info(f"Backfill partition {value}")
+            unit_cursor.execute(query=drop_partition_query)
+            execute_set_statements(unit_cursor, **kwargs)
+            if concurrency:
+                with concurrency.acquire():
+                    unit_cursor.execute(insert_query, [value])
+            else:
+                unit_cursor.execute(insert_query, [value])
+            unit_cursor.execute(count_query, [value])
+            rows = unit_cursor.fetchone()[0]  # type: ignore
+            logger.info(f"Backfilled {rows} rows into partition {value}")
+            count_ingested(rows=rows)
+
+        logger.info(
+            f"Backfill {len(pending)} partitions of {self.internal_table_name}, "
+            f"{len(result.skipped)} already completed"
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(copy_context().run, run_unit, value): value
+                for value in pending
+            }
+            for future in as_completed(futures):
+                value = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.exception(f"Backfill of partition {value} failed")
+                    result.failed[value] = str(e)
+                    continue
+                result.completed.append(value)
+                if progress:
+                    progress.mark_completed(value)
+
+        result.completed.sort()
+        return result
+
+    @traced
     def verify_ingestion(self) -> bool:
         """
         verify ingestion by running a sequence of verification, currently implemented:
-        - verification by rowcount
+        - verification by rowcount, in merge sync mode and with append_dedup
+          by the number of distinct keys, skipped if merge_dedup is false.
+          With dedup_lookback_days keys older than the lookback may repeat,
+          the keys are verified to be unique in the partitions of the lookback
+        - verification by file names
         """
 
-        cursor = self.connection.cursor()
-        return verify_ingestion_rowcount(
-            cursor, self.internal_table_name, self.external_table_name
-        ) and verify_ingestion_file_names(cursor, self.internal_table_name)
+        cursor = self._cursor()
+        if self.table.sync_mode == "merge" or (
+            self.table.sync_mode == "append" and self.table.append_dedup
+        ):
+            if self.table.sync_mode == "merge" and self.table.merge_dedup is False:
+                verified = True
+            elif self.table.sync_mode == "append" and self.table.dedup_lookback_days:
+                verified = verify_unique_keys(
+                    cursor,
+                    self.internal_table_name,
+                    self.table.get_unique_key(),
+                    self.table.generate_lookback_condition(),
+                )
+            else:
+                external_expressions = self.table.get_external_expressions()
+                key = self.table.get_unique_key()
+                verified = verify_ingestion_key_count(
+                    cursor,
+                    self.internal_table_name,
+                    self.external_table_name,
+                    key,
+                    [external_expressions[column] for column in key],
+                    external_filter=self.table.filter,
+                )
+        else:
+            counts = get_ingestion_rowcounts(
+                cursor,
+                self.internal_table_name,
+                self.external_table_name,
+                external_filter=self.table.filter,
+            )
+            verified = counts is not None and counts[0] == counts[1]
+            if counts is not None and self.table.sync_mode == "overwrite":
+                # an overwrite ingests every row of the table
+                count_ingested(rows=counts[0])
+        return verified and verify_ingestion_file_names(
+            cursor, self.internal_table_name
+        )
 
+    @traced
     def insert(self, use_materialized_query=False, **kwargs) -> None:
         """
         Inserts data into a table based on the synchronization mode specified
@@ -284,6 +1447,7 @@ class TableService:
         If the `sync_mode` is set to "overwrite", it performs
         a full overwrite of the data in the table.
         If it's set to "append", it appends the new data incrementally.
+        If it's set to "merge", it replaces the rows of changed keys.
         For any other `sync_mode` values, a ValueError is raised, indicating
         an uncertain sync mode configuration.
 
@@ -301,28 +1465,229 @@ class TableService:
             self.insert_incremental_append(
                 use_materialized_query=use_materialized_query, **kwargs
             )
+        elif self.table.sync_mode == "merge":
+            self.insert_merge(**kwargs)
         else:
             raise ValueError(
                 "Uncertain sync mode in config \
                 use insert_full_overwrite/insert_incremental_append instead"
             )
 
+    def sampled(
+        self,
+        settings: SamplingSettings,
+        run_log: Optional[RunLog] = None,
+        metrics: Optional[IngestionMetrics] = None,
+    ) -> "TableService":
+        """
+        Args:
+            settings: which files to sample
+            run_log: (Optional) run log of the sample runs. The run log of this
+                service is not used, so sample runs don't mix with the others.
+            metrics: (Optional) metrics of the sample runs, the metrics
+                of this service are not used either
+
+        Returns: a service ingesting only a sample of the source files from
+            the same external table into a separate internal table, named with
+            the sampling prefix. The sample condition is added to the table
+            filter, so inserts and verifications only consider sampled files.
+
+        Raises:
+            ValueError: if a file_count sample is taken in another sync mode
+                than overwrite. The first files by hash change, as files
+                are added, so appended or merged samples would mix samples.
+        """
+        if settings.file_count is not None and self.table.sync_mode != "overwrite":
+            raise ValueError(
+                f"Sampling by file_count requires overwrite sync mode, "
+                f"table {self.table.table_name} is in {self.table.sync_mode} "
+                f"sync mode, sample by fraction instead"
+            )
+        condition = sample_condition(settings, self.external_table_name)
+        table = self.table.copy(
+            update={
+                "filter": f"({self.table.filter}) AND ({condition})"
+                if self.table.filter
+                else condition
+            }
+        )
+        return TableService(
+            table,
+            self.connection,
+            external_prefix=self.external_prefix,
+            internal_prefix=f"{settings.internal_prefix}{self.internal_prefix}",
+            run_log=run_log,
+            metrics=metrics,
+            tracing=self.tracing,
+        )
+
+    @traced
+    def ingest_sample(
+        self,
+        settings: SamplingSettings,
+        run_log: Optional[RunLog] = None,
+        metrics: Optional[IngestionMetrics] = None,
+        **kwargs,
+    ) -> IngestionResult:
+        """
+        Ingest a sample of the source files into the sampled internal table,
+        which is created if it doesn't exist yet.
+
+        Args:
+            settings: which files to sample
+            run_log: (Optional) run log of the sample runs, see sampled
+            metrics: (Optional) metrics of the sample runs, see sampled
+            **kwargs: Additional keyword arguments which are passed to ingest.
+
+        Returns: the result of the sampled ingest
+        """
+        sample = self.sampled(settings, run_log, metrics)
+        if not sample.does_internal_table_exist():
+            sample.create_internal_table()
+        logger.info(
+            f"Ingest a sample of {self.external_table_name} "
+            f"into {sample.internal_table_name}"
+        )
+        return sample.ingest(**kwargs)
+
+    @traced
+    def warmup(self, settings: Optional[WarmupSettings] = None) -> List[WarmupStep]:
+        """
+        Scan the primary index columns, hot columns and recent partitions
+        of the internal table, so the first queries after a load hit
+        a warm cache.
+
+        Args:
+            settings: what to scan and the time budget,
+                defaults to scanning the primary index columns
+
+        Returns: the timings of every warmup step
+        """
+        return run_warmup(
+            self._cursor(),
+            self.table,
+            self.internal_table_name,
+            settings or WarmupSettings(),
+        )
+
+    @traced
+    def ingest(
+        self,
+        warmup: Optional[WarmupSettings] = None,
+        use_materialized_query=False,
+        max_retries: int = 0,
+        **kwargs,
+    ) -> IngestionResult:
+        """
+        Insert according to the table sync mode, verify the ingestion
+        and, if it is verified and warmup settings are provided,
+        warm up the engine cache.
+
+        If a run log or metrics are configured, the run is recorded with
+        per-step durations, retries and outcome. The ingested rows and files
+        are taken from the executed statements, no extra query scans
+        the internal table for them: the rows of an overwrite from
+        the verification, the rows and files of a merge from its staging
+        tables, the rows of a backfill from the count of every partition,
+        the files of inserts of given files from their file list.
+        An append leaves them empty.
+
+        Args:
+            warmup: (Optional) warmup settings, no warmup if not provided
+            use_materialized_query (bool): passed to insert
+            max_retries: number of times a failed insert is retried
+            **kwargs: Additional keyword arguments which are passed to insert.
+
+        Returns: verification result, warmup timings and the run record
+        """
+        run = self._new_run()
+        token = _current_run.set(run)
+        verified, warmup_steps = False, []
+        if self.metrics:
+            self.metrics.in_flight.inc(table=self.internal_table_name)
+        try:
+            for attempt in range(max_retries + 1):
+                try:
+                    with timed_step(run, "insert"):
+                        self.insert(
+                            use_materialized_query=use_materialized_query, **kwargs
+                        )
+                    break
+                except FireboltError:
+                    if attempt == max_retries:
+                        raise
+                    run.retries += 1
+                    logger.exception(
+                        f"Insert into {self.internal_table_name} failed, "
+                        f"retry {run.retries} of {max_retries}"
+                    )
+
+            with timed_step(run, "verify"):
+                verified = self.verify_ingestion()
+
+            if not verified:
+                logger.error(
+                    f"Ingestion into {self.internal_table_name} is not verified"
+                )
+            elif warmup:
+                with timed_step(run, "warmup"):
+                    warmup_steps = self.warmup(warmup)
+
+            run.outcome = RunOutcome.SUCCESS if verified else RunOutcome.UNVERIFIED
+        except Exception as e:
+            run.outcome, run.error = RunOutcome.FAILED, str(e)
+            raise
+        finally:
+            _current_run.reset(token)
+            if self.metrics:
+                self.metrics.in_flight.dec(table=self.internal_table_name)
+            self._record_run(run)
+
+        return IngestionResult(verified, warmup_steps, run)
+
+    def _new_run(self) -> IngestionRun:
+        return IngestionRun(
+            run_id=uuid4().hex,
+            table_name=self.internal_table_name,
+            sync_mode=self.table.sync_mode,
+            started_at=datetime.utcnow(),
+        )
+
+    def _record_run(self, run: IngestionRun) -> None:
+        """
+        Record the finished run. Called in a finally block, so a failure
+        is logged and not raised, it would replace the error of the run.
+        """
+        run.finished_at = datetime.utcnow()
+        try:
+            if self.metrics:
+                self.metrics.observe_run(run)
+            if self.run_log:
+                self.run_log.record(run)
+        except Exception:
+            logger.exception(f"Recording run {run.run_id} failed")
+
+    @traced
     def drop_internal_table(self) -> None:
         """
-        Drops the internal table associated with the current object.
+        Drops the internal table associated with the current object,
+        together with its file-state table of merge sync mode.
         """
         logger.info(f"Drop internal table: {self.internal_table_name}")
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         drop_table(cursor, self.internal_table_name)
+        self._drop_ingested_files_table(cursor)
 
+    @traced
     def drop_external_table(self) -> None:
         """
         Drops the external table associated with the current object.
         """
         logger.info(f"Drop external table: {self.external_table_name}")
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         drop_table(cursor, self.external_table_name)
 
+    @traced
     def drop_tables(self) -> None:
         """
         Drops both internal and external tables associated with the current object.
@@ -330,24 +1695,203 @@ class TableService:
         self.drop_internal_table()
         self.drop_external_table()
 
+    @traced
     def does_external_table_exist(self) -> bool:
         """
         Checks if the external table exists in the database.
         """
-        return does_table_exist(self.connection.cursor(), self.external_table_name)
+        return does_table_exist(self._cursor(), self.external_table_name)
 
+    @traced
     def does_internal_table_exist(self) -> bool:
         """
         Checks if the internal table exists in the database.
         """
-        return does_table_exist(self.connection.cursor(), self.internal_table_name)
+        return does_table_exist(self._cursor(), self.internal_table_name)
+
+    def _internal_column_list(self) -> List[str]:
+        """
+        Returns: the internal column names, including the file-metadata columns
+        """
+        return [c.alias or c.name for c in self.table.internal_columns] + [
+            c.name for c in FILE_METADATA_COLUMNS
+        ]
+
+    def _deduplicated_insert_query(
+        self, new_rows_query: str, ctes: Sequence[str] = ()
+    ) -> str:
+        """
+        Returns: an insert of the new rows, skipping rows with a key already
+            in the internal table, and all but the first row of a key
+            by source_file_timestamp in the new rows
+        """
+        key_columns = ", ".join(self.table.get_unique_key())
+        existing_key_condition = self._same_key(self.internal_table_name, "new_keys")
+        lookback_condition = self.table.generate_lookback_condition()
+        if lookback_condition:
+            # only the partitions of the lookback are read
+            existing_key_condition += f" AND {lookback_condition}"
+        return f"""
+            INSERT INTO {self.internal_table_name}
+            WITH {', '.join(list(ctes) + [f'new_rows AS ({new_rows_query})'])}
+            SELECT {', '.join(self._internal_column_list())}
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY {key_columns}
+                    ORDER BY source_file_timestamp, source_file_name
+                ) AS dedup_row_number
+                FROM new_rows) AS new_keys
+            WHERE dedup_row_number = 1
+            AND NOT EXISTS (
+                SELECT 1 FROM {self.internal_table_name}
+                WHERE {existing_key_condition})
+        """
+
+    def _same_key(self, table_name: str, other_table_name: str) -> str:
+        """
+        Returns: a condition, that the rows of both tables have the same unique key
+        """
+        return " AND ".join(
+            f"{table_name}.{column} = {other_table_name}.{column}"
+            for column in self.table.get_unique_key()
+        )
+
+    def _filter_condition(self, keyword: str = "AND") -> str:
+        """
+        Returns: the table filter as a condition of a query
+            on the external table, empty if there is no filter
+        """
+        return f"{keyword} ({self.table.filter})" if self.table.filter else ""
+
+    def _external_column_list(self) -> List[str]:
+        """
+        Returns: the list of external columns to select,
+            aliased to the internal column names where needed
+        """
+        return self.table.generate_select_list()
+
+    @traced
+    @recorded
+    def reload_changed_files(
+        self, file_source: FileSource, file_state: FileStateStore, **kwargs
+    ) -> FileChanges:
+        """
+        Ingest new files and reload the files, whose content changed,
+        detected by the etags of the file source instead of the timestamps.
 
+        The files are ingested by the sync mode of the table. In overwrite
+        sync mode the table is overwritten. In merge sync mode the changed
+        files are removed from the ingested files table and merged again
+        with the new files, replacing the rows of their keys.
+        Otherwise, in a partitioned table, the partitions holding rows
+        of changed files are dropped, and all files with rows in them
+        reloaded, in a table without partitions only the rows
+        of the changed files are deleted and reloaded.
+
+        The etags are stored only after the insert. If the insert fails after
+        the rows or the ingested files were deleted, the deleted files are
+        no longer ingested, so the next run finds them new and ingests them.
+
+        Args:
+            file_source: lists the files of the external table with etags
+            file_state: etags of the ingested files
+            **kwargs: Additional keyword arguments which are passed
+                to the insert.
+
+        Returns: the new, changed and unchanged files
+        """
+        files = file_source.list_files()
+        changes = detect_file_changes(
+            files, file_state, self.get_ingested_file_names([f.name for f in files])
+        )
+        logger.info(
+            f"{len(changes.new)} new, {len(changes.changed)} changed and "
+            f"{len(changes.unchanged)} unchanged files"
+        )
+
+        reload_file_names = sorted(f.name for f in changes.changed)
+        if self.table.sync_mode in ("overwrite", "merge"):
+            if reload_file_names or changes.new:
+                self._reload_by_sync_mode(reload_file_names, **kwargs)
+            file_state.mark_ingested(files)
+            return changes
+
+        if reload_file_names:
+            cursor = self._cursor()
+            placeholders = ", ".join("?" * len(reload_file_names))
+            if self.table.partitions:
+                partition_columns = ", ".join(
+                    p.as_sql_string() for p in self.table.partitions
+                )
+                cursor.execute(
+                    f"SELECT DISTINCT {partition_columns} "
+                    f"FROM {self.internal_table_name} "
+                    f"WHERE source_file_name IN ({placeholders})",
+                    reload_file_names,
+                )
+                partitions = cursor.fetchall() or []
+                # rows of other files in the dropped partitions are reloaded too
+                cursor.execute(
+                    f"SELECT DISTINCT source_file_name "
+                    f"FROM {self.internal_table_name} "
+                    f"WHERE ({partition_columns}) IN ("
+                    f"SELECT {partition_columns} FROM {self.internal_table_name} "
+                    f"WHERE source_file_name IN ({placeholders}))",
+                    reload_file_names,
+                )
+                reload_file_names = sorted(
+                    {row[0] for row in cursor.fetchall() or []}  # type: ignore
+                    | set(reload_file_names)
+                )
+                for partition in partitions:  # type: ignore
+                    query = (
+                        f"ALTER TABLE {self.internal_table_name} DROP PARTITION "
+                        f"{','.join(format_sql_literal(v) for v in partition)}"
+                    )
+                    logger.info(f"Drop partition of changed files:\n{query}")
+                    cursor.execute(query=query)
+            else:
+                query = (
+                    f"DELETE FROM {self.internal_table_name} "
+                    f"WHERE source_file_name IN ({placeholders})"
+                )
+                logger.info(f"Delete rows of changed files:\n{query}")
+                cursor.execute(query, reload_file_names)
+
+        self.insert_files(
+            sorted(set(reload_file_names) | {f.name for f in changes.new}), **kwargs
+        )
+        file_state.mark_ingested(files)
+        return changes
+
+    def _reload_by_sync_mode(self, reload_file_names: List[str], **kwargs) -> None:
+        """
+        Ingest the new files and reload the given files in overwrite
+        or merge sync mode
+        """
+        if self.table.sync_mode == "overwrite":
+            self.insert_full_overwrite(**kwargs)
+            return
+
+        if reload_file_names:
+            cursor = self._cursor()
+            self._ensure_ingested_files_table(cursor)
+            query = (
+                f"DELETE FROM {self.ingested_files_table_name} "
+                f"WHERE source_file_name IN ({', '.join('?' * len(reload_file_names))})"
+            )
+            logger.info(f"Forget changed files:\n{query}")
+            cursor.execute(query, reload_file_names)
+        self.insert_merge(**kwargs)
+
+    @traced
     def drop_outdated_partitions(self):
         """
         Drops partitions in the fact table that are outdated, meaning the corresponding
             file in the external table has a more recent timestamp (was updated).
+        See reload_changed_files for change detection by etag.
         """
-        cursor = self.connection.cursor()
+        cursor = self._cursor()
         if not does_table_exist(cursor, self.internal_table_name):
             raise FireboltError(f"Fact table {self.internal_table_name} doesn't exist")
         if not does_table_exist(cursor, self.external_table_name):
@@ -1,9 +1,14 @@
 from functools import wraps
-from typing import List, Sequence, Set, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
-from firebolt.common.exception import FireboltError
+import httpx
+from firebolt.common.exception import (
+    ConnectionError as FireboltConnectionError,
+)
+from firebolt.common.exception import FireboltEngineError, FireboltError
 from firebolt.db import Cursor
 
+from firebolt_ingest.column_types import normalize_column_type
 from firebolt_ingest.table_model import FILE_METADATA_COLUMNS, Table
 from firebolt_ingest.utils import format_query
 
@@ -100,8 +105,48 @@ def get_table_columns(cursor: Cursor, table_name: str) -> List[Tuple]:
     return [(column_name, data_type) for column_name, data_type in cursor.fetchall()]
 
 
+def get_ingestion_rowcounts(
+    cursor: Cursor,
+    internal_table_name: str,
+    external_table_name: str,
+    external_filter: Optional[str] = None,
+) -> Optional[Tuple[int, int]]:
+    """
+    Count the rows of the fact table and the ingested rows of the external table
+
+    Note: doesn't check for existence of the fact and external tables,
+    hence not safe for external usage. Could lead to sql-injection
+
+    Args:
+        cursor: Firebolt database cursor
+        internal_table_name: name of the fact table
+        external_table_name: name of the external table
+        external_filter: (Optional) condition on the external table rows,
+            that are ingested
+
+    Returns: the number of rows of the fact and the external table,
+        None if the query returned no data
+    """
+    where = f" WHERE {external_filter}" if external_filter else ""
+    query = f"""
+    SELECT
+        (SELECT count(*) FROM {internal_table_name}) AS rc_fact,
+        (SELECT count(*) FROM {external_table_name}{where}) AS rc_external
+    """
+    cursor.execute(query=format_query(query))
+
+    data = cursor.fetchall()
+    if data is None:
+        return None
+
+    return data[0][0], data[0][1]  # type: ignore
+
+
 def verify_ingestion_rowcount(
-    cursor: Cursor, internal_table_name: str, external_table_name: str
+    cursor: Cursor,
+    internal_table_name: str,
+    external_table_name: str,
+    external_filter: Optional[str] = None,
 ) -> bool:
     """
     Verify, that the fact and external table have the same number of rows
@@ -113,13 +158,95 @@ def verify_ingestion_rowcount(
         cursor: Firebolt database cursor
         internal_table_name: name of the fact table
         external_table_name: name of the external table
+        external_filter: (Optional) condition on the external table rows,
+            that are ingested
 
     Returns: true if the number of rows the same
     """
+    counts = get_ingestion_rowcounts(
+        cursor, internal_table_name, external_table_name, external_filter
+    )
+    return counts is not None and counts[0] == counts[1]
+
+
+def verify_ingestion_rowcount_for_files(
+    cursor: Cursor,
+    internal_table_name: str,
+    external_table_name: str,
+    file_names: Sequence[str],
+    external_filter: Optional[str] = None,
+) -> bool:
+    """
+    Verify, that the given source files have the same number of rows
+    in the fact and external table
+
+    Note: doesn't check for existence of the fact and external tables,
+    hence not safe for external usage. Could lead to sql-injection
+
+    Args:
+        cursor: Firebolt database cursor
+        internal_table_name: name of the fact table
+        external_table_name: name of the external table
+        file_names: source_file_name values of the files to verify
+        external_filter: (Optional) condition on the external table rows,
+            that are ingested
+
+    Returns: true if the number of rows the same
+    """
+    placeholders = ", ".join("?" * len(file_names))
+    condition = f" AND ({external_filter})" if external_filter else ""
+    query = f"""
+    SELECT
+        (SELECT count(*) FROM {internal_table_name}
+         WHERE source_file_name IN ({placeholders})) AS rc_fact,
+        (SELECT count(*) FROM {external_table_name}
+         WHERE source_file_name IN ({placeholders}){condition}) AS rc_external
+    """
+    cursor.execute(format_query(query), list(file_names) * 2)
+
+    data = cursor.fetchall()
+    if data is None:
+        return False
+
+    return data[0][0] == data[0][1]  # type: ignore
+
+
+def verify_ingestion_key_count(
+    cursor: Cursor,
+    internal_table_name: str,
+    external_table_name: str,
+    internal_key_columns: Sequence[str],
+    external_key_columns: Sequence[str],
+    external_filter: Optional[str] = None,
+) -> bool:
+    """
+    Verify, that the fact table has one row per distinct key of the external table
+
+    Note: doesn't check for existence of the fact and external tables,
+    hence not safe for external usage. Could lead to sql-injection
+
+    Args:
+        cursor: Firebolt database cursor
+        internal_table_name: name of the fact table
+        external_table_name: name of the external table
+        internal_key_columns: key columns of the fact table
+        external_key_columns: the same key columns in the external table
+        external_filter: (Optional) condition on the external table rows,
+            that are ingested
+
+    Returns: true if the fact table has as many rows, as there are distinct
+        keys in the external table, and no duplicate keys
+    """
+    where = f" WHERE {external_filter}" if external_filter else ""
     query = f"""
     SELECT
         (SELECT count(*) FROM {internal_table_name}) AS rc_fact,
-        (SELECT count(*) FROM {external_table_name}) AS rc_external
+        (SELECT count(*) FROM (
+            SELECT DISTINCT {', '.join(internal_key_columns)}
+            FROM {internal_table_name})) AS kc_fact,
+        (SELECT count(*) FROM (
+            SELECT DISTINCT {', '.join(external_key_columns)}
+            FROM {external_table_name}{where})) AS kc_external
     """
     cursor.execute(query=format_query(query))
 
@@ -127,7 +254,36 @@ def verify_ingestion_rowcount(
     if data is None:
         return False
 
-    return data[0][0] == data[0][1]  # type: ignore
+    return data[0][0] == data[0][1] == data[0][2]  # type: ignore
+
+
+def verify_unique_keys(
+    cursor: Cursor,
+    table_name: str,
+    key_columns: Sequence[str],
+    condition: Optional[str] = None,
+) -> bool:
+    """
+    Verify, that no key repeats in the rows of the table
+
+    Args:
+        cursor: Firebolt database cursor
+        table_name: name of the table
+        key_columns: key columns of the table
+        condition: (Optional) condition on the rows to verify
+
+    Returns: true if the rows have no duplicate keys
+    """
+    where = f"WHERE {condition}" if condition else ""
+    query = f"""
+    SELECT {', '.join(key_columns)} FROM {table_name}
+    {where}
+    GROUP BY {', '.join(key_columns)}
+    HAVING count(*) > 1
+    LIMIT 1
+    """
+    cursor.execute(query=format_query(query))
+    return len(cursor.fetchall()) == 0  # type: ignore
 
 
 def verify_ingestion_file_names(cursor: Cursor, internal_table_name: str) -> bool:
@@ -139,10 +295,11 @@ def verify_ingestion_file_names(cursor: Cursor, internal_table_name: str) -> boo
     table_columns = get_table_columns(cursor, internal_table_name)
 
     # if the metadata is missing return True,
-    # since it is not possible to do the validation
-    if not {(column.name, column.type) for column in FILE_METADATA_COLUMNS}.issubset(
-        table_columns
-    ):
+    # since it is not possible to do the validation.
+    # compare normalized types, e.g. TIMESTAMPNTZ is reported as TIMESTAMP
+    if not normalize_columns(
+        (column.name, column.type) for column in FILE_METADATA_COLUMNS
+    ).issubset(normalize_columns(table_columns)):
         return True
 
     query = f"""
@@ -166,6 +323,48 @@ def does_table_exist(cursor: Cursor, table_name: str) -> bool:
     return cursor.execute(find_query, [table_name]) != 0
 
 
+def normalize_columns(columns: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+    """
+    Returns: the (column name, column type) pairs with normalized types
+    """
+    return {(name, normalize_column_type(type_)) for name, type_ in columns}
+
+
+def compare_columns(
+    table_name: str,
+    actual_table_columns: Iterable[Tuple[str, str]],
+    expected_table_columns: Iterable[Tuple[str, str]],
+    skip_columns: Iterable[Tuple[str, str]],
+) -> List[Tuple[str, str, str, str]]:
+    """
+    Compare actual and expected table columns, with normalized types
+
+    Returns: a list of all incompatibilities as a list of tuple
+             (column_name, column_type, table_name, message)
+    """
+    actual = normalize_columns(actual_table_columns)
+    expected = normalize_columns(expected_table_columns)
+    skip = normalize_columns(skip_columns)
+
+    error_list = []
+    for column in sorted(actual - expected - skip):
+        error_list.append((column[0], column[1], table_name, "found but not expected"))
+    for column in sorted(expected - actual - skip):
+        error_list.append((column[0], column[1], table_name, "expected but not found"))
+
+    return error_list
+
+
+def format_column_errors(error_list: List[Tuple[str, str, str, str]]) -> str:
+    """
+    Returns: the incompatibilities returned by compare_columns, one per line
+    """
+    return "\n".join(
+        f"Column ({err[0]}, {err[1]}) in table ({err[2]}) {err[3]}"
+        for err in error_list
+    )
+
+
 def check_table_compatibility(
     cursor: Cursor,
     table_name: str,
@@ -186,52 +385,115 @@ def check_table_compatibility(
              (column_name, column_type, table_name, message)
 
     """
-    actual_table_columns = set(get_table_columns(cursor, table_name))
+    return compare_columns(
+        table_name,
+        get_table_columns(cursor, table_name),
+        expected_table_columns,
+        skip_columns,
+    )
 
-    error_list = []
-    for column in actual_table_columns - expected_table_columns - skip_columns:
-        error_list.append((column[0], column[1], table_name, "expected but not found"))
-    for column in expected_table_columns - actual_table_columns - skip_columns:
-        error_list.append((column[0], column[1], table_name, "found but not expected"))
 
-    return error_list
+def get_tables_columns(
+    cursor: Cursor, table_names: Sequence[str]
+) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Get the columns of several tables with a single catalog query.
+
+    Returns: table name -> list of (column name, data type),
+        empty for tables, that don't exist
+    """
+    cursor.execute(
+        "SELECT table_name, column_name, data_type "
+        "FROM information_schema.columns "
+        f"WHERE table_name IN ({', '.join('?' * len(table_names))})",
+        list(table_names),
+    )
+    columns: Dict[str, List[Tuple[str, str]]] = {name: [] for name in table_names}
+    for table_name, column_name, data_type in cursor.fetchall():  # type: ignore
+        columns[table_name].append((column_name, data_type))
+    return columns
 
 
 def raise_on_tables_non_compatibility(
     cursor: Cursor,
     table: Table,
     ignore_meta_columns: bool,
+    internal_table_name: Optional[str] = None,
+    external_table_name: Optional[str] = None,
 ):
     """
     Check whether internal and external tables are compatible,
-    and if not raise an exception with an appropriate error message
+    and if not raise an exception with an appropriate error message.
+
+    The columns of both tables are fetched with a single catalog query.
+
+    Args:
+        cursor: cursor for query execution
+        table: the table definition
+        ignore_meta_columns: whether the internal table may lack
+            the file-metadata columns
+        internal_table_name: (Optional) name of the internal table,
+            table.table_name by default
+        external_table_name: (Optional) name of the external table,
+            ex_<table.table_name> by default
     """
+    internal_table_name = internal_table_name or table.table_name
+    external_table_name = external_table_name or f"ex_{table.table_name}"
+
     expected_internal_columns = set(
-        ((c.alias if c.alias else c.name), c.type) for c in table.columns
+        ((c.alias if c.alias else c.name), c.type) for c in table.internal_columns
     )
-    expected_external_columns = set((c.name, c.type) for c in table.columns)
+    expected_external_columns = set((c.name, c.type) for c in table.external_columns)
+    metadata_columns = set((c.name, c.type) for c in FILE_METADATA_COLUMNS)
 
-    skip_columns = (
-        [(c.name, c.type) for c in FILE_METADATA_COLUMNS] if ignore_meta_columns else []
-    )
+    skip_columns = metadata_columns if ignore_meta_columns else set()
     if not ignore_meta_columns:
-        expected_internal_columns.update(
-            (c.name, c.type) for c in FILE_METADATA_COLUMNS
-        )
-
-    error_list = check_table_compatibility(
-        cursor, table.table_name, expected_internal_columns, set(skip_columns)
-    ) + check_table_compatibility(
-        cursor, f"ex_{table.table_name}", expected_external_columns, set()
+        expected_internal_columns.update(metadata_columns)
+
+    actual = get_tables_columns(cursor, [internal_table_name, external_table_name])
+    for table_name, columns in actual.items():
+        if not columns:
+            raise FireboltError(f"Table {table_name} does not exist")
+
+    # file-metadata columns are virtual columns of the external table
+    error_list = compare_columns(
+        internal_table_name,
+        actual[internal_table_name],
+        expected_internal_columns,
+        skip_columns,
+    ) + compare_columns(
+        external_table_name,
+        actual[external_table_name],
+        expected_external_columns,
+        metadata_columns,
     )
 
     if error_list:
-        raise FireboltError(
-            "\n".join(
-                f"Column ({err[0]}, {err[1]}) in table ({err[2]}) {err[3]}"
-                for err in error_list
-            )
-        )
+        raise FireboltError(format_column_errors(error_list))
+
+
+# http statuses of a gateway, that can't reach a running engine
+ENGINE_UNAVAILABLE_STATUSES = {502, 503, 504}
+
+
+def is_engine_unavailable_error(error: BaseException) -> bool:
+    """
+    Returns: true if the error means the engine couldn't be reached
+        or isn't running, e.g. a closed connection or a stopped engine,
+        false for errors of the query itself, e.g. a malformed file.
+        Statements failing with an unavailable engine may succeed when retried.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in ENGINE_UNAVAILABLE_STATUSES
+    return isinstance(
+        error,
+        (
+            FireboltConnectionError,
+            FireboltEngineError,
+            httpx.TransportError,
+            ConnectionError,
+        ),
+    )
 
 
 def execute_set_statements(cursor, **kwargs):
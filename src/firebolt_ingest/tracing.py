@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from firebolt_ingest.metrics import statement_argument, statement_kind
+
+
+class Tracing:
+    def __init__(self, tracer: Any = None, label_prefix: str = "firebolt_ingest"):
+        """
+        OpenTelemetry tracing of TableService operations and their statements.
+
+        Statements get a query label, derived from the trace id and the id of
+        the span they are executed in, so the engine query history can be
+        joined with the client traces.
+
+        Args:
+            tracer: (Optional) an OpenTelemetry tracer,
+                the tracer of the global tracer provider by default
+            label_prefix: prefix of the query labels
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError(
+                "opentelemetry-api is required for tracing, "
+                "install firebolt-ingest[tracing]"
+            ) from e
+
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("firebolt_ingest")
+        self.label_prefix = label_prefix
+
+    @contextmanager
+    def span(self, name: str, attributes: Dict[str, Any]) -> Iterator[Any]:
+        with self.tracer.start_as_current_span(name, attributes=attributes) as span:
+            yield span
+
+    def current_span(self) -> Any:
+        return self._trace.get_current_span()
+
+    def query_label(self, span: Any) -> str:
+        """
+        Returns: the query label of a span, e.g.
+            firebolt_ingest-<32 hex digits trace id>-<16 hex digits span id>
+        """
+        context = span.get_span_context()
+        return f"{self.label_prefix}-{context.trace_id:032x}-{context.span_id:016x}"
+
+
+def _parse_set_statement(query: str) -> Optional[Dict[str, str]]:
+    if statement_kind(query) != "SET" or "=" not in query:
+        return None
+    key, value = query.split(None, 1)[1].split("=", 1)
+    return {key.strip(): value.strip().strip("'")}
+
+
+class TracedCursor:
+    def __init__(self, cursor: Any, tracing: Tracing):
+        """
+        Cursor proxy executing every statement in a child span of the current
+        span. Statements are labeled with the query label of the current span,
+        the label is set once per span, as the SDK validates each set statement
+        with a query of its own. Set statements are added as attributes
+        of the current span.
+        """
+        self._cursor = cursor
+        self._tracing = tracing
+        self._label: Optional[str] = None
+
+    def execute(self, *args: Any, **kwargs: Any) -> Any:
+        query = statement_argument(args, kwargs)
+        parent = self._tracing.current_span()
+        settings = _parse_set_statement(query)
+        if settings:
+            for key, value in settings.items():
+                parent.set_attribute(f"firebolt.setting.{key}", value)
+        else:
+            label = self._tracing.query_label(parent)
+            if label != self._label:
+                self._cursor.execute(f"SET query_label='{label}'")
+                self._label = label
+
+        attributes = {"db.system": "firebolt", "db.statement": query}
+        with self._tracing.span(statement_kind(query), attributes) as span:
+            if not settings:
+                span.set_attribute("firebolt.query_label", self._label)
+            return self._cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
@@ -1,3 +1,6 @@
+from datetime import date
+from typing import Any
+
 from sqlparse import format  # type: ignore
 
 
@@ -6,3 +9,14 @@ def format_query(query: str) -> str:
     function, that reformats the query using sqlparse.s
     """
     return format(query, reindent=True, indent_width=4)
+
+
+def format_sql_literal(value: Any) -> str:
+    """
+    Render a partition value as a sql literal, e.g. for DROP PARTITION
+    """
+    if isinstance(value, date):
+        return f"'{value.isoformat()}'"
+    if isinstance(value, str):
+        return "'{}'".format(value.replace("'", "''"))
+    return str(value)
@@ -0,0 +1,203 @@
+import logging
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from firebolt.common.exception import QueryTimeoutError
+from firebolt.db import Cursor
+from pydantic import BaseModel, Field
+
+from firebolt_ingest.table_model import Table
+from firebolt_ingest.utils import format_query, format_sql_literal
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupSettings(BaseModel):
+    """
+    What to scan after ingestion, to pull the new data into the engine cache.
+    Scans run in the order: primary index, hot columns, recent partitions.
+    Every statement runs with the rest of the time budget as its timeout,
+    and scans, that would start after the budget is spent, are skipped.
+    """
+
+    primary_index: bool = True
+    hot_columns: List[str] = []
+    # number of partitions with the latest values of the first date/time
+    # partition column to scan
+    recent_partitions: int = Field(default=0, ge=0)
+    time_budget_seconds: float = Field(default=60.0, gt=0)
+
+
+class WarmupStep(NamedTuple):
+    name: str
+    query: str
+    duration_seconds: float
+    skipped: bool
+    # the scan was aborted, when the time budget was spent
+    timed_out: bool = False
+
+
+def column_scan_expressions(table: Table, column_names: List[str]) -> List[str]:
+    """
+    Cheap aggregations, that read every value of the columns
+    """
+    column_types = {(c.alias or c.name): c.column_type for c in table.internal_columns}
+    expressions = []
+    for name in column_names:
+        if column_types[name].is_array:
+            expressions.append(f"MAX(LENGTH({name}))")
+        else:
+            expressions += [f"MIN({name})", f"MAX({name})"]
+    return expressions
+
+
+def generate_warmup_queries(
+    table: Table, table_name: str, settings: WarmupSettings
+) -> List[Tuple[str, str]]:
+    """
+    Generate the column scans of the warmup.
+
+    Returns:
+        a list of (step name, query)
+    """
+    column_names = {c.alias or c.name for c in table.internal_columns}
+    unknown = [c for c in settings.hot_columns if c not in column_names]
+    if unknown:
+        raise ValueError(f"Unknown hot columns {unknown} of table {table_name}")
+
+    queries = []
+    if settings.primary_index:
+        expressions = column_scan_expressions(table, table.primary_index)
+        queries.append(
+            ("primary_index", f"SELECT {', '.join(expressions)} FROM {table_name}")
+        )
+    if settings.hot_columns:
+        expressions = column_scan_expressions(table, settings.hot_columns)
+        queries.append(
+            ("hot_columns", f"SELECT {', '.join(expressions)} FROM {table_name}")
+        )
+    return queries
+
+
+def recent_partitions_query(
+    cursor: Cursor,
+    table: Table,
+    table_name: str,
+    settings: WarmupSettings,
+    timeout_seconds: Optional[float] = None,
+) -> Optional[str]:
+    """
+    Find the partitions with the latest values of the first date/time
+    partition column and generate a scan of the primary index and hot columns
+    restricted to them. Partitions are ordered by the column value,
+    not the partition value, so cyclic parts, e.g. EXTRACT(DAY FROM ...),
+    are ordered by recency too.
+
+    Returns: the scan, None if the table has no date/time partition column
+    """
+    if not settings.recent_partitions or not table.partitions:
+        return None
+
+    column_types = {(c.alias or c.name): c.column_type for c in table.internal_columns}
+    recency_columns = [
+        p.column_name
+        for p in table.partitions
+        if column_types[p.column_name].is_date_time
+    ]
+    if not recency_columns:
+        logger.warning(
+            f"Table {table_name} has no date/time partition column, "
+            f"skip the warmup of recent partitions"
+        )
+        return None
+
+    expressions = [p.as_sql_string() for p in table.partitions]
+    cursor.execute(
+        query=format_query(
+            f"SELECT {', '.join(expressions)} FROM {table_name} "
+            f"GROUP BY {', '.join(expressions)} "
+            f"ORDER BY MAX({recency_columns[0]}) DESC "
+            f"LIMIT {settings.recent_partitions}"
+        ),
+        timeout_seconds=timeout_seconds,
+    )
+    partitions = cursor.fetchall()
+    if not partitions:
+        return None
+
+    if len(expressions) == 1:
+        literals = ", ".join(format_sql_literal(p[0]) for p in partitions)
+        condition = f"{expressions[0]} IN ({literals})"
+    else:
+        condition = " OR ".join(
+            "("
+            + " AND ".join(
+                f"{e} = {format_sql_literal(v)}" for e, v in zip(expressions, p)
+            )
+            + ")"
+            for p in partitions  # type: ignore
+        )
+    columns = list(dict.fromkeys(table.primary_index + settings.hot_columns))
+    return (
+        f"SELECT COUNT(*), {', '.join(column_scan_expressions(table, columns))} "
+        f"FROM {table_name} WHERE {condition}"
+    )
+
+
+def run_warmup(
+    cursor: Cursor, table: Table, table_name: str, settings: WarmupSettings
+) -> List[WarmupStep]:
+    """
+    Run the warmup scans within the time budget and report their timings.
+    A statement running past the budget is aborted by its timeout,
+    and the remaining steps are skipped.
+    """
+    started = time.monotonic()
+    steps: List[WarmupStep] = []
+
+    def remaining_seconds() -> float:
+        if any(step.timed_out for step in steps):
+            return 0.0
+        return settings.time_budget_seconds - (time.monotonic() - started)
+
+    def run_step(name: str, query: str) -> None:
+        timeout_seconds = remaining_seconds()
+        if timeout_seconds <= 0:
+            logger.info(f"Warmup time budget is spent, skip {name}")
+            steps.append(WarmupStep(name, query, 0.0, True))
+            return
+
+        step_started = time.monotonic()
+        try:
+            cursor.execute(query=format_query(query), timeout_seconds=timeout_seconds)
+        except QueryTimeoutError:
+            duration = time.monotonic() - step_started
+            logger.warning(f"Warmup {name} of {table_name} exceeded the time budget")
+            steps.append(WarmupStep(name, query, duration, False, timed_out=True))
+            return
+        duration = time.monotonic() - step_started
+        logger.info(f"Warmup {name} of {table_name} took {duration:.3f}s")
+        steps.append(WarmupStep(name, query, duration, False))
+
+    for name, query in generate_warmup_queries(table, table_name, settings):
+        run_step(name, query)
+
+    if settings.recent_partitions:
+        timeout_seconds = remaining_seconds()
+        if timeout_seconds <= 0:
+            steps.append(WarmupStep("recent_partitions", "", 0.0, True))
+            return steps
+        try:
+            partitions_query = recent_partitions_query(
+                cursor, table, table_name, settings, timeout_seconds
+            )
+        except QueryTimeoutError:
+            logger.warning(f"Warmup of {table_name} exceeded the time budget")
+            steps.append(
+                WarmupStep("recent_partitions", "", timeout_seconds, False, True)
+            )
+            return steps
+        if partitions_query:
+            run_step("recent_partitions", partitions_query)
+
+    return steps
@@ -0,0 +1,291 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from pydantic import BaseModel, Field
+
+from firebolt_ingest.file_source import FileSource, SourceFile
+from firebolt_ingest.file_state import FileStateStore, split_identical_files
+from firebolt_ingest.table_service import TableService
+
+logger = logging.getLogger(__name__)
+
+
+class WatchSettings(BaseModel):
+    """
+    Thresholds of the watch mode. A batch is ingested as soon as one of
+    max_batch_files, max_batch_bytes or max_batch_age_seconds is reached.
+    """
+
+    poll_interval_seconds: float = Field(default=30.0, gt=0)
+    max_batch_files: int = Field(default=100, gt=0)
+    max_batch_bytes: int = Field(default=1024**3, gt=0)
+    max_batch_age_seconds: float = Field(default=300.0, ge=0)
+    # stop listing the source, while that many files wait for ingestion
+    max_buffered_files: int = Field(default=10_000, gt=0)
+    flush_on_stop: bool = True
+    # wait before retrying a failed insert, doubled on every consecutive failure
+    retry_backoff_seconds: float = Field(default=30.0, ge=0)
+    max_retry_backoff_seconds: float = Field(default=900.0, ge=0)
+
+
+class IngestionWatcher:
+    def __init__(
+        self,
+        table_service: TableService,
+        file_source: FileSource,
+        settings: Optional[WatchSettings] = None,
+        file_state: Optional[FileStateStore] = None,
+        quarantine_table_name: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        Long-running micro-batch ingestion. Polls the file source for new
+        objects, buffers them until a threshold is reached and then appends
+        exactly the buffered files with
+        TableService.insert_files_isolating_failures.
+
+        Files failing the insert are quarantined and not polled again,
+        the other files of their batch are ingested. If the whole insert
+        fails, e.g. the engine is unavailable, the batch returns to the buffer
+        and is retried after a backoff, doubled on every consecutive failure.
+
+        At most one insert runs at a time. While it runs the source is still
+        polled, until max_buffered_files are waiting; then polling pauses
+        until the insert finishes.
+
+        Args:
+            table_service: service of the table to ingest into
+            file_source: lists the objects of the external table location
+            settings: thresholds, defaults are used if not provided
+            file_state: (Optional) etags of the ingested files. If provided,
+                files byte-identical to an ingested or buffered file
+                are skipped, and the etags of ingested files are stored.
+            quarantine_table_name: (Optional) table to record quarantined files
+                in, files quarantined by a previous run are not polled again.
+                Without it, they are retried once after a restart.
+            **kwargs: Additional keyword arguments which are passed
+                to TableService.insert_files_isolating_failures.
+        """
+        self.table_service = table_service
+        self.file_source = file_source
+        self.settings = settings or WatchSettings()
+        self.file_state = file_state
+        self.quarantine_table_name = quarantine_table_name
+        self._insert_kwargs = kwargs
+
+        self._known_files: Optional[Set[str]] = None
+        self._buffer: Dict[str, SourceFile] = OrderedDict()
+        self._buffered_since: Optional[float] = None
+
+        self._stop_event = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Optional[Future] = None
+        self._in_flight_files: List[SourceFile] = []
+        self._failed_inserts = 0
+        self._retry_at: Optional[float] = None
+
+    @property
+    def buffered_files(self) -> List[SourceFile]:
+        return list(self._buffer.values())
+
+    @property
+    def is_inserting(self) -> bool:
+        return self._in_flight is not None
+
+    def poll(self) -> int:
+        """
+        List the file source and buffer files that are neither ingested
+        nor buffered yet.
+
+        Returns: the number of newly buffered files
+        """
+        if self._known_files is None:
+            self._known_files = self.table_service.get_ingested_file_names()
+            if self.quarantine_table_name:
+                self._known_files |= self.table_service.get_quarantined_file_names(
+                    self.quarantine_table_name
+                )
+
+        room = self.settings.max_buffered_files - len(self._buffer)
+        if room <= 0:
+            logger.info(
+                f"{len(self._buffer)} files are waiting for ingestion, skip polling"
+            )
+            return 0
+
+        in_flight_names = {f.name for f in self._in_flight_files}
+        new_files = [
+            f
+            for f in self.file_source.list_files()
+            if f.name not in self._known_files
+            and f.name not in self._buffer
+            and f.name not in in_flight_names
+        ][:room]
+
+        if self.file_state is not None:
+            new_files, duplicates = split_identical_files(
+                new_files,
+                self.file_state,
+                pending=self.buffered_files + self._in_flight_files,
+            )
+            for name, identical in duplicates.items():
+                logger.info(f"Skip {name}, it is identical to {identical}")
+            self._known_files.update(duplicates)
+
+        for f in new_files:
+            self._buffer[f.name] = f
+        if new_files and self._buffered_since is None:
+            self._buffered_since = time.monotonic()
+
+        logger.debug(f"Found {len(new_files)} new files")
+        return len(new_files)
+
+    def is_batch_ready(self) -> bool:
+        """
+        Check whether one of the batch thresholds is reached
+        """
+        if not self._buffer:
+            return False
+
+        buffered_bytes = sum(f.size for f in self._buffer.values())
+        age = time.monotonic() - (self._buffered_since or time.monotonic())
+        return (
+            len(self._buffer) >= self.settings.max_batch_files
+            or buffered_bytes >= self.settings.max_batch_bytes
+            or age >= self.settings.max_batch_age_seconds
+        )
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        Start ingesting the next batch of buffered files in the background,
+        if no other insert is running, a threshold is reached and
+        the backoff after a failed insert has passed.
+
+        Args:
+            force: ingest the buffered files even if no threshold is reached
+                or during the backoff
+
+        Returns: True if an insert was started
+        """
+        self._collect()
+        if self._in_flight is not None or not self._buffer:
+            return False
+        if not force and (
+            not self.is_batch_ready()
+            or (self._retry_at is not None and time.monotonic() < self._retry_at)
+        ):
+            return False
+
+        batch: List[SourceFile] = []
+        batch_bytes = 0
+        for f in self._buffer.values():
+            if batch and (
+                len(batch) >= self.settings.max_batch_files
+                or batch_bytes + f.size > self.settings.max_batch_bytes
+            ):
+                break
+            batch.append(f)
+            batch_bytes += f.size
+
+        for f in batch:
+            del self._buffer[f.name]
+        if not self._buffer:
+            self._buffered_since = None
+
+        logger.info(f"Ingest batch of {len(batch)} files, {batch_bytes} bytes")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._in_flight_files = batch
+        self._in_flight = self._executor.submit(
+            self.table_service.insert_files_isolating_failures,
+            [f.name for f in batch],
+            quarantine_table_name=self.quarantine_table_name,
+            **self._insert_kwargs,
+        )
+        return True
+
+    def _collect(self, wait: bool = False) -> None:
+        """
+        Handle the result of the running insert, if it is finished.
+        Quarantined files are not polled again, files of a failed insert
+        are put back in front of the buffer.
+        """
+        if self._in_flight is None or (not wait and not self._in_flight.done()):
+            return
+
+        try:
+            result = self._in_flight.result()
+            for name, error in result.quarantined_files.items():
+                logger.error(f"Quarantined {name}, it is not retried: {error}")
+            if self._known_files is not None:
+                self._known_files.update(f.name for f in self._in_flight_files)
+            if self.file_state is not None:
+                ingested = set(result.ingested_files)
+                self.file_state.mark_ingested(
+                    f for f in self._in_flight_files if f.name in ingested
+                )
+            self._failed_inserts, self._retry_at = 0, None
+        except Exception:
+            self._failed_inserts += 1
+            backoff = min(
+                self.settings.retry_backoff_seconds * 2 ** (self._failed_inserts - 1),
+                self.settings.max_retry_backoff_seconds,
+            )
+            logger.exception(
+                f"Insert of {len(self._in_flight_files)} files failed, "
+                f"files are returned to the buffer, retry in {backoff:.0f}s"
+            )
+            self._retry_at = time.monotonic() + backoff
+            remaining = list(self._buffer.values())
+            self._buffer = OrderedDict(
+                (f.name, f) for f in self._in_flight_files + remaining
+            )
+            if self._buffered_since is None:
+                self._buffered_since = time.monotonic()
+        finally:
+            self._in_flight = None
+            self._in_flight_files = []
+
+    def run_once(self) -> None:
+        """
+        A single watch iteration: poll the source and flush if ready
+        """
+        self._collect()
+        self.poll()
+        self.flush()
+
+    def run(self) -> None:
+        """
+        Watch the source until stop() is called. On stop, the running insert
+        is awaited and, if flush_on_stop is set, the remaining buffer ingested.
+        """
+        try:
+            while not self._stop_event.is_set():
+                self.run_once()
+                self._stop_event.wait(self.settings.poll_interval_seconds)
+        finally:
+            self._shutdown()
+
+    def stop(self) -> None:
+        """
+        Request a clean shutdown of run(), safe to call from another thread
+        """
+        self._stop_event.set()
+
+    def _shutdown(self) -> None:
+        self._collect(wait=True)
+        if self.settings.flush_on_stop:
+            while self._buffer:
+                pending = len(self._buffer)
+                self.flush(force=True)
+                self._collect(wait=True)
+                if len(self._buffer) >= pending:
+                    logger.error(f"Stopped with {len(self._buffer)} files not ingested")
+                    break
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,178 @@
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+
+from firebolt_ingest.advisor import (
+    advise,
+    compute_column_statistics,
+    extract_datetime_part,
+    recommend,
+    sample_external_table,
+)
+from firebolt_ingest.sampling import SamplingSettings
+from firebolt_ingest.table_model import Column, DatetimePart, Partition, Table
+from firebolt_ingest.table_service import TableService
+
+
+@pytest.fixture
+def events_table() -> Table:
+    return Table(
+        table_name="events",
+        columns=[
+            Column(name="event_id", type="BIGINT"),
+            Column(name="country.member0", alias="country", type="TEXT"),
+            Column(name="event_time", type="TIMESTAMP"),
+            Column(name="comment", type="TEXT"),
+            Column(name="tags", type="ARRAY(TEXT)"),
+        ],
+        file_type="PARQUET",
+        object_pattern="*.parquet",
+        primary_index=["event_id"],
+    )
+
+
+@pytest.fixture
+def events_connection() -> sqlite3.Connection:
+    """
+    sqlite database standing in for the engine, with 90 days of events,
+    a file per day
+    """
+    connection = sqlite3.connect(":memory:")
+    connection.create_function("CITY_HASH", 2, city_hash)
+    connection.execute(
+        'CREATE TABLE ex_events (event_id, "country.member0", event_time, '
+        "comment, tags, source_file_name)"
+    )
+    start = datetime(2022, 1, 1)
+    connection.executemany(
+        "INSERT INTO ex_events VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (
+                i,
+                ["DE", "US", "FR"][i % 3],
+                (start + timedelta(hours=i)).isoformat(sep=" "),
+                "comment" if i % 10 == 0 else None,
+                "x",
+                f"events_{i // 24:02}.parquet",
+            )
+            for i in range(24 * 90)
+        ],
+    )
+    return connection
+
+
+def city_hash(value: str, seed: int) -> int:
+    return zlib.crc32(f"{seed}:{value}".encode())
+
+
+def test_extract_datetime_part():
+    value = datetime(2022, 5, 15, 13)  # a sunday
+    assert extract_datetime_part(value, DatetimePart.YEAR) == 2022
+    assert extract_datetime_part(value, DatetimePart.QUARTER) == 2
+    assert extract_datetime_part(value, DatetimePart.DOW) == 0
+    assert extract_datetime_part("2022-05-15 13:00:00", DatetimePart.HOUR) == 13
+    assert extract_datetime_part("not a date", DatetimePart.DAY) is None
+
+
+def test_compute_column_statistics(events_table: Table):
+    rows = [(1, "DE", None, None, ["a"]), (2, "DE", None, "c", ["a"])]
+    statistics = compute_column_statistics(events_table, rows)
+
+    assert statistics[1].column_name == "country"
+    assert statistics[1].distinct_count == 1
+    assert statistics[1].top_values == [("DE", 2)]
+    assert statistics[2].null_ratio == 1.0
+    assert statistics[3].null_ratio == 0.5
+    assert statistics[4].top_values == [(("a",), 2)]
+
+
+def test_advise_on_local_engine(events_table: Table, events_connection):
+    """
+    The advisor samples the external table and recommends low-cardinality
+    columns first and the least skewed partitioning
+    """
+    ts = TableService(events_table, events_connection)
+    recommendation = advise(ts, sample_size=10_000, max_partitions=100)
+
+    assert recommendation.column_statistics[0].row_count == 24 * 90
+    # event_id and event_time are unique
+    assert recommendation.primary_index == ["country"]
+    # 90 days, evenly filled
+    assert recommendation.partitions == [
+        Partition(column_name="event_time", datetime_part=DatetimePart.YEAR),
+        Partition(column_name="event_time", datetime_part=DatetimePart.MONTH),
+        Partition(column_name="event_time", datetime_part=DatetimePart.DAY),
+    ]
+    assert len(recommendation.reasons) == 2
+
+    table = recommendation.apply(events_table)
+    assert table.primary_index == ["country"]
+    assert events_table.primary_index == ["event_id"]
+
+
+def test_sample_reads_sampled_files(events_table: Table, events_connection):
+    """
+    The sample is read from the files with the lowest hash,
+    not from the first files
+    """
+    ts = TableService(events_table, events_connection)
+    rows = sample_external_table(
+        ts, sample_size=10_000, sampling=SamplingSettings(file_count=10)
+    )
+
+    files = sorted(
+        (f"events_{day:02}.parquet" for day in range(90)),
+        key=lambda name: (city_hash(name, 0), name),
+    )[:10]
+    assert len(rows) == 24 * 10
+    assert {f"events_{row[0] // 24:02}.parquet" for row in rows} == set(files)
+    assert max(row[0] for row in rows) >= 24 * 10
+
+
+def test_sample_size_bounds_rows(events_table: Table, events_connection):
+    ts = TableService(events_table, events_connection)
+    assert len(sample_external_table(ts, sample_size=500)) == 500
+
+
+def test_recommend_skips_cyclic_partitions(events_table: Table):
+    """
+    Hours repeat every day, an hour partition would hold rows of every day,
+    the cyclic parts are only recommended together with the year
+    """
+    start = datetime(2021, 1, 1)
+    rows = [
+        (i, "DE", start + timedelta(minutes=7 * i), None, None) for i in range(100_000)
+    ]
+    recommendation = recommend(events_table, rows)
+
+    for candidate in recommendation.partition_candidates:
+        parts = [p.datetime_part for p in candidate.partitions]
+        assert DatetimePart.HOUR not in parts
+        assert not parts[0] or parts[0] == DatetimePart.YEAR
+    assert recommendation.partitions == [
+        Partition(column_name="event_time", datetime_part=DatetimePart.YEAR),
+        Partition(column_name="event_time", datetime_part=DatetimePart.MONTH),
+        Partition(column_name="event_time", datetime_part=DatetimePart.DAY),
+    ]
+    assert recommendation.primary_index == []
+
+
+def test_recommend_without_partitioning(events_table: Table):
+    rows = [(i, "DE", None, None, None) for i in range(10)]
+    recommendation = recommend(events_table, rows)
+
+    # event_id is unique
+    assert recommendation.primary_index == []
+    assert recommendation.partitions == []
+    assert recommendation.reasons[-1].startswith("no partitioning")
+
+
+def test_sample_applies_filter(events_table: Table, events_connection):
+    events_table.filter = "event_id % 2 = 0"
+    ts = TableService(events_table, events_connection)
+    rows = sample_external_table(ts, sample_size=10_000)
+
+    assert len(rows) == 24 * 90 // 2
+    assert all(row[0] % 2 == 0 for row in rows)
@@ -0,0 +1,42 @@
+from datetime import date
+
+import pytest
+
+from firebolt_ingest.backfill import BackfillProgress, partition_values
+
+
+def test_partition_values():
+    assert partition_values(2020, 2022) == [2020, 2021, 2022]
+    assert partition_values(date(2022, 2, 27), date(2022, 3, 1)) == [
+        date(2022, 2, 27),
+        date(2022, 2, 28),
+        date(2022, 3, 1),
+    ]
+    assert partition_values(5, 4) == []
+
+    with pytest.raises(ValueError):
+        partition_values(2020, date(2022, 1, 1))
+
+
+def test_backfill_progress(tmp_path):
+    """
+    Completed units survive a restart, progress of other tables
+    and ranges is kept
+    """
+    path = str(tmp_path / "progress.json")
+    start, end = date(2022, 1, 1), date(2022, 1, 31)
+
+    progress = BackfillProgress(path, "table_a", start, end)
+    progress.mark_completed(date(2022, 1, 1))
+    BackfillProgress(path, "table_b", 1, 2).mark_completed(1)
+
+    progress = BackfillProgress(path, "table_a", start, end)
+    assert progress.is_completed(date(2022, 1, 1))
+    assert not progress.is_completed(date(2022, 1, 2))
+    # another range of the same table starts from scratch
+    other_range = BackfillProgress(path, "table_a", start, date(2022, 2, 28))
+    assert not other_range.is_completed(date(2022, 1, 1))
+
+    progress.reset()
+    assert not BackfillProgress(path, "table_a", start, end).is_completed(start)
+    assert BackfillProgress(path, "table_b", 1, 2).is_completed(1)
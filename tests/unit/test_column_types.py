@@ -0,0 +1,64 @@
+import pickle
+
+import pytest
+
+from firebolt_ingest.column_types import (
+    ColumnType,
+    normalize_column_type,
+    parse_column_type,
+)
+from firebolt_ingest.table_model import Column
+
+
+@pytest.mark.parametrize(
+    "type_,canonical",
+    [
+        ("INT", "INTEGER"),
+        ("long", "BIGINT"),
+        ("VARCHAR", "TEXT"),
+        ("STRING", "TEXT"),
+        ("TIMESTAMPNTZ", "TIMESTAMP"),
+        ("DATETIME", "TIMESTAMP"),
+        ("PGDATE", "DATE"),
+        ("DOUBLE PRECISION", "DOUBLE"),
+        ("NUMERIC", "DECIMAL(38,9)"),
+        ("decimal( 10 , 2 )", "DECIMAL(10,2)"),
+        ("DECIMAL(10)", "DECIMAL(10,0)"),
+        ("ARRAY(ARRAY(string))", "ARRAY(ARRAY(TEXT))"),
+    ],
+)
+def test_parse_column_type(type_: str, canonical: str):
+    assert str(parse_column_type(type_)) == canonical
+
+
+@pytest.mark.parametrize(
+    "type_",
+    ["TXT", "ARRAY(TEXT", "ARRAY()", "DECIMAL(a,b)", "TEXT(1)", "INT INT", "INT;"],
+)
+def test_parse_column_type_errors(type_: str):
+    with pytest.raises(ValueError):
+        parse_column_type(type_)
+
+
+def test_column_types_are_interned():
+    array = parse_column_type("ARRAY(VARCHAR)")
+
+    assert array is parse_column_type("array(text)")
+    assert array.element is parse_column_type("STRING")
+    assert array.is_array and not array.element.is_array
+    assert parse_column_type("TIMESTAMPNTZ").is_date_time
+    assert pickle.loads(pickle.dumps(array)) is array
+    assert {array, parse_column_type("ARRAY(TEXT)")} == {array}
+    with pytest.raises(AttributeError):
+        array.name = "TEXT"
+    assert ColumnType("DECIMAL", (10, 2)) == parse_column_type("NUMERIC(10,2)")
+
+
+def test_normalize_column_type():
+    assert normalize_column_type("timestampntz") == "TIMESTAMP"
+    assert normalize_column_type(" geography ") == "GEOGRAPHY"
+
+
+def test_column_type_property():
+    column = Column(name="amount", type="NUMERIC(12,2)")
+    assert column.column_type == ColumnType("DECIMAL", (12, 2))
@@ -0,0 +1,106 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from pydantic import ValidationError
+from pytest_mock import MockerFixture
+
+from firebolt_ingest.concurrency import (
+    AdaptiveConcurrency,
+    ConcurrencySettings,
+)
+from firebolt_ingest.metrics import IngestionMetrics
+from firebolt_ingest.table_model import Partition, Table
+from firebolt_ingest.table_service import TableService
+
+
+def test_settings_validation():
+    with pytest.raises(ValidationError):
+        ConcurrencySettings(min_limit=4, initial_limit=2)
+
+
+def test_additive_increase():
+    controller = AdaptiveConcurrency(ConcurrencySettings(initial_limit=2, max_limit=3))
+    for limit in [2, 2, 3, 3, 3, 3, 3]:
+        assert controller.limit == limit
+        controller.record(time.monotonic(), 0.1, failed=False)
+
+
+def test_multiplicative_decrease():
+    controller = AdaptiveConcurrency(
+        ConcurrencySettings(initial_limit=8, latency_target_seconds=10)
+    )
+    started = time.monotonic()
+
+    controller.record(started, 1.0, failed=True)
+    assert controller.limit == 4
+    # started before the decrease, saw the same overload
+    controller.record(started, 20.0, failed=False)
+    assert controller.limit == 4
+
+    controller.record(time.monotonic(), 20.0, failed=False)
+    assert controller.limit == 2
+    controller.record(time.monotonic(), 1.0, failed=True)
+    controller.record(time.monotonic(), 1.0, failed=True)
+    assert controller.limit == 1
+
+
+def test_converges_on_fake_engine():
+    """
+    A fake engine runs capacity statements at base latency,
+    beyond that all of them slow down proportionally
+    """
+    capacity, base_latency = 6, 1.0
+    metrics = IngestionMetrics()
+    controller = AdaptiveConcurrency(
+        ConcurrencySettings(
+            initial_limit=1, max_limit=32, latency_target_seconds=1.5 * base_latency
+        ),
+        engine_name="engine",
+        metrics=metrics,
+    )
+
+    limits = []
+    for _ in range(200):
+        round_started = time.monotonic()
+        in_flight = controller.limit
+        latency = base_latency * max(1.0, in_flight / capacity)
+        for _ in range(in_flight):
+            controller.record(round_started, latency, failed=False)
+        limits.append(controller.limit)
+
+    steady = limits[50:]
+    assert max(steady) <= 1.5 * capacity + 1
+    assert min(steady) >= capacity // 2
+    assert metrics.concurrency_limit.value(engine="engine") == controller.limit
+
+
+def test_backfill_respects_limit(mocker: MockerFixture, mock_table: Table):
+    mocker.patch("firebolt_ingest.table_service.get_table_columns", return_value=[])
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    mock_table.partitions = [Partition(column_name="id")]
+    lock = threading.Lock()
+    running, max_running = [0], [0]
+
+    def execute(query, params=None):
+        if not query.lstrip().startswith("INSERT"):
+            return
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    connection = MagicMock()
+    connection.cursor.return_value.execute.side_effect = execute
+    controller = AdaptiveConcurrency(ConcurrencySettings(initial_limit=2, max_limit=2))
+
+    result = TableService(mock_table, connection).backfill(
+        1, 8, max_workers=8, concurrency=controller
+    )
+
+    assert result.completed == list(range(1, 9))
+    assert max_running[0] == 2
+    assert controller.in_flight == 0
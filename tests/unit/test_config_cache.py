@@ -0,0 +1,49 @@
+from pytest_mock import MockerFixture
+
+from firebolt_ingest.config_cache import TableConfigCache
+from firebolt_ingest.table_model import Table
+
+
+def test_load_caches_validated_table(
+    mocker: MockerFixture, tmp_path, table_yaml_string: str
+):
+    config = tmp_path / "table.yaml"
+    config.write_text(table_yaml_string)
+    cache = TableConfigCache(str(tmp_path / "cache"))
+
+    table = cache.load(str(config))
+    assert table == Table.parse_yaml(table_yaml_string)
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+    parse_yaml = mocker.patch.object(Table, "parse_yaml")
+    assert cache.load(str(config)) == table
+    parse_yaml.assert_not_called()
+
+
+def test_changed_config_is_parsed_again(tmp_path, table_yaml_string: str):
+    config = tmp_path / "table.yaml"
+    config.write_text(table_yaml_string)
+    cache = TableConfigCache(str(tmp_path / "cache"))
+    cache.load(str(config))
+
+    config.write_text(table_yaml_string.replace("test_table", "other_table"))
+    table = cache.load(str(config))
+
+    assert table == Table.parse_yaml(config.read_text())
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+
+    cache.clear()
+    assert list((tmp_path / "cache").iterdir()) == []
+
+
+def test_unreadable_entry_is_replaced(tmp_path, table_yaml_string: str):
+    config = tmp_path / "table.yaml"
+    config.write_text(table_yaml_string)
+    cache = TableConfigCache(str(tmp_path / "cache"))
+    cache.load(str(config))
+    (entry,) = (tmp_path / "cache").iterdir()
+    entry.write_bytes(b"garbage")
+
+    assert cache.load_many([str(config)]) == {
+        str(config): Table.parse_yaml(table_yaml_string)
+    }
@@ -0,0 +1,29 @@
+from firebolt_ingest.ddl_state import DdlFingerprintStore, ddl_fingerprint
+
+
+def test_ddl_fingerprint():
+    statement = ("CREATE TABLE t\n(id INT)", [])
+
+    assert ddl_fingerprint([statement]) == ddl_fingerprint(
+        [("CREATE TABLE t (id INT)", [])]
+    )
+    assert ddl_fingerprint([statement]) != ddl_fingerprint(
+        [("CREATE TABLE t (id INT)", [1])]
+    )
+    assert ddl_fingerprint([statement]) != ddl_fingerprint(
+        [statement, ("CREATE INDEX", [])]
+    )
+
+
+def test_ddl_fingerprint_store(tmp_path):
+    path = str(tmp_path / "ddl.json")
+    store = DdlFingerprintStore(path)
+    store.set("table_name", "abc", "CREATE TABLE table_name (id INT);")
+
+    store = DdlFingerprintStore(path)
+    assert store.get("table_name") == {
+        "fingerprint": "abc",
+        "ddl": "CREATE TABLE table_name (id INT);",
+    }
+    store.remove("table_name")
+    assert DdlFingerprintStore(path).get("table_name") is None
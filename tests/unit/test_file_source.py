@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from firebolt_ingest.file_source import (
+    LocalFileSource,
+    S3FileSource,
+    SourceFile,
+    parse_s3_url,
+)
+
+
+def test_local_file_source(tmp_path):
+    """
+    Local file source lists files recursively and applies the object pattern
+    """
+    (tmp_path / "2022").mkdir()
+    (tmp_path / "2022" / "a.parquet").write_bytes(b"1234")
+    (tmp_path / "b.parquet").write_bytes(b"12")
+    (tmp_path / "c.csv").write_bytes(b"1")
+
+    files = LocalFileSource(str(tmp_path), "*.parquet").list_files()
+
+    assert [(f.name, f.size) for f in files] == [
+        ("2022/a.parquet", 4),
+        ("b.parquet", 2),
+    ]
+    assert all(f.etag is None for f in files)
+
+
+def test_local_file_source_content_hash(tmp_path):
+    (tmp_path / "a.parquet").write_bytes(b"1234")
+    (tmp_path / "b.parquet").write_bytes(b"1234")
+
+    files = LocalFileSource(str(tmp_path), content_hash=True).list_files()
+
+    assert [f.etag for f in files] == ["81dc9bdb52d04dc20036dbd8313ed055"] * 2
+
+
+def test_parse_s3_url():
+    assert parse_s3_url("s3://bucket-name/some/prefix/") == (
+        "bucket-name",
+        "some/prefix/",
+    )
+    assert parse_s3_url("s3://bucket-name/") == ("bucket-name", "")
+
+
+def test_s3_file_source():
+    """
+    S3 file source reports full keys, matches the pattern relative to the url
+    and strips quotes from the etag
+    """
+    modified = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    client = MagicMock()
+    client.get_paginator.return_value.paginate.return_value = [
+        {
+            "Contents": [
+                {
+                    "Key": "prefix/a.parquet",
+                    "Size": 10,
+                    "LastModified": modified,
+                    "ETag": '"abc"',
+                },
+                {"Key": "prefix/b.csv", "Size": 5, "LastModified": modified},
+            ]
+        },
+        {},
+    ]
+
+    files = S3FileSource(
+        "s3://bucket-name/prefix/", "a*.parquet", client=client
+    ).list_files()
+
+    assert files == [SourceFile("prefix/a.parquet", 10, modified, "abc")]
+    client.get_paginator.return_value.paginate.assert_called_once_with(
+        Bucket="bucket-name", Prefix="prefix/"
+    )
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from firebolt_ingest.file_source import SourceFile
+from firebolt_ingest.file_state import (
+    FileStateStore,
+    detect_file_changes,
+    split_identical_files,
+)
+
+
+def source_file(name: str, etag=None) -> SourceFile:
+    return SourceFile(name=name, size=10, timestamp=datetime(2024, 1, 1), etag=etag)
+
+
+def test_file_state_store(tmp_path):
+    path = str(tmp_path / "files.json")
+    store = FileStateStore(path, "table_name")
+    store.mark_ingested([source_file("a", "e1"), source_file("b", "e1")])
+    store.mark_ingested([source_file("c", "e2"), source_file("d")])
+    FileStateStore(path, "other_table").mark_ingested([source_file("x", "e3")])
+
+    store = FileStateStore(path, "table_name")
+    assert store.get_etag("a") == "e1"
+    assert store.get_etag("d") is None
+    assert store.get_file_name("e1") == "a"
+    assert store.get_file_name("e3") is None
+
+    store.remove(["a"])
+    assert store.get_file_name("e1") == "b"
+    assert FileStateStore(path, "other_table").get_file_name("e3") == "x"
+
+
+def test_split_identical_files(tmp_path):
+    store = FileStateStore(str(tmp_path / "files.json"), "table_name")
+    store.mark_ingested([source_file("a", "e1")])
+
+    files, duplicates = split_identical_files(
+        [
+            source_file("a", "e1"),
+            source_file("a_copy", "e1"),
+            source_file("b", "e2"),
+            source_file("b_copy", "e2"),
+            source_file("c", "e3"),
+            source_file("no_etag"),
+        ],
+        store,
+        pending=[source_file("pending", "e3")],
+    )
+
+    assert [f.name for f in files] == ["a", "b", "no_etag"]
+    assert duplicates == {"a_copy": "a", "b_copy": "b", "c": "pending"}
+
+
+def test_detect_file_changes(tmp_path):
+    store = FileStateStore(str(tmp_path / "files.json"), "table_name")
+    store.mark_ingested([source_file("touched", "e1"), source_file("rewritten", "e2")])
+
+    changes = detect_file_changes(
+        [
+            source_file("touched", "e1"),
+            source_file("rewritten", "e3"),
+            source_file("no_baseline", "e4"),
+            source_file("no_etag"),
+            source_file("new", "e5"),
+        ],
+        store,
+        {"touched", "rewritten", "no_baseline", "no_etag"},
+    )
+
+    assert [f.name for f in changes.new] == ["new"]
+    assert [f.name for f in changes.changed] == ["rewritten"]
+    assert [f.name for f in changes.unchanged] == ["touched", "no_baseline", "no_etag"]
@@ -0,0 +1,183 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+from urllib.request import urlopen
+
+import pytest
+from firebolt.common.exception import FireboltError
+from pytest_mock import MockerFixture
+
+from firebolt_ingest.metrics import (
+    IngestionMetrics,
+    MeteredCursor,
+    MetricsRegistry,
+    statement_kind,
+)
+from firebolt_ingest.run_log import IngestionRun
+from firebolt_ingest.table_model import Table
+from firebolt_ingest.table_service import TableService
+
+
+def test_render_counter_and_histogram():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ["table"])
+    histogram = registry.histogram("latency_seconds", "Latency", ["table"], [1, 5])
+
+    counter.inc(table='a"b')
+    counter.inc(2, table='a"b')
+    histogram.observe(0.5, table="t")
+    histogram.observe(3, table="t")
+
+    assert registry.render() == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{table="a\\"b"} 3\n'
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{table="t",le="1"} 1\n'
+        'latency_seconds_bucket{table="t",le="5"} 2\n'
+        'latency_seconds_bucket{table="t",le="+Inf"} 2\n'
+        'latency_seconds_sum{table="t"} 3.5\n'
+        'latency_seconds_count{table="t"} 2\n'
+    )
+
+
+def test_metric_validation():
+    registry = MetricsRegistry()
+    counter = registry.counter("c_total", "C", ["table"])
+
+    with pytest.raises(ValueError):
+        counter.inc(table="t", kind="SELECT")
+    with pytest.raises(ValueError):
+        counter.inc(-1, table="t")
+    with pytest.raises(ValueError):
+        registry.counter("c_total", "C", ["table"])
+
+
+def test_write_textfile(tmp_path):
+    registry = MetricsRegistry()
+    registry.gauge("in_flight", "In flight", ["table"]).set(2, table="t")
+    path = tmp_path / "ingest.prom"
+
+    registry.write_textfile(str(path))
+
+    assert path.read_text() == registry.render()
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_http_server():
+    registry = MetricsRegistry()
+    registry.counter("c_total", "C", ["table"]).inc(table="t")
+    server = registry.start_http_server(0, "127.0.0.1")
+    try:
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as r:
+            assert r.read().decode() == registry.render()
+            assert r.headers["Content-Type"].startswith("text/plain")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize(
+    "query,kind",
+    [("SELECT 1", "SELECT"), ("\n insert into t", "INSERT"), ("", "UNKNOWN")],
+)
+def test_statement_kind(query: str, kind: str):
+    assert statement_kind(query) == kind
+
+
+def test_metered_cursor():
+    metrics = IngestionMetrics()
+    cursor = MagicMock()
+    cursor.execute.side_effect = [None, FireboltError("failed")]
+    metered = MeteredCursor(cursor, metrics, "t")
+
+    metered.execute("SELECT 1")
+    with pytest.raises(FireboltError):
+        metered.execute(query="DROP TABLE t")
+    metered.fetchall()
+
+    assert metrics.statements.value(table="t", kind="SELECT") == 1
+    assert metrics.statement_errors.value(table="t", kind="DROP") == 1
+    cursor.fetchall.assert_called_once()
+
+
+def test_observe_run():
+    metrics = IngestionMetrics()
+    run = IngestionRun(
+        run_id="1",
+        table_name="t",
+        started_at=datetime(2022, 1, 1),
+        step_durations={"insert": 2.0, "verify": 0.2},
+        files_ingested=3,
+        rows_ingested=100,
+        retries=1,
+        outcome="unverified",
+    )
+
+    metrics.observe_run(run)
+
+    assert metrics.step_duration.count(table="t", step="insert") == 1
+    assert metrics.runs.value(table="t", outcome="unverified") == 1
+    assert metrics.verification_failures.value(table="t") == 1
+    assert metrics.retries.value(table="t") == 1
+    assert metrics.rows_ingested.value(table="t") == 100
+    assert metrics.files_ingested.value(table="t") == 3
+
+
+def test_table_service_metrics(mocker: MockerFixture, mock_table: Table):
+    """
+    TableService counts its statements and records ingest runs
+    """
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    cursor_mock.fetchall.return_value = [(10, 12)]
+    metrics = IngestionMetrics()
+    mock_table.sync_mode = "overwrite"
+
+    ts = TableService(mock_table, connection, metrics=metrics)
+    ts.insert = MagicMock()
+    ts.ingest()
+
+    # the verification query
+    assert metrics.statements.value(table="table_name", kind="SELECT") == 1
+    assert metrics.rows_ingested.value(table="table_name") == 10
+    assert metrics.verification_failures.value(table="table_name") == 1
+    assert metrics.in_flight.value(table="table_name") == 0
+
+
+@pytest.mark.parametrize("sync_mode", ["overwrite", "append", "merge"])
+def test_metrics_do_not_change_workload(
+    mocker: MockerFixture, mock_table: Table, sync_mode: str
+):
+    """
+    An ingest executes the same statements with and without metrics
+    """
+    for helper in ["raise_on_tables_non_compatibility", "drop_table"]:
+        mocker.patch(f"firebolt_ingest.table_service.{helper}")
+    mocker.patch(
+        "firebolt_ingest.table_service.get_table_schema", return_value="CREATE TABLE"
+    )
+    mocker.patch(
+        "firebolt_ingest.table_service.get_table_columns",
+        return_value=[("source_file_name", "TEXT")],
+    )
+    mocker.patch(
+        "firebolt_ingest.table_service.get_ingestion_rowcounts", return_value=(5, 5)
+    )
+    mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_file_names", return_value=True
+    )
+    mock_table.sync_mode = sync_mode
+    if sync_mode == "merge":
+        mock_table.primary_index = ["id"]
+
+    def executed(metrics):
+        connection = MagicMock()
+        cursor_mock = MagicMock()
+        connection.cursor.return_value = cursor_mock
+        cursor_mock.fetchone.return_value = (5, 1)
+        TableService(mock_table, connection, metrics=metrics).ingest()
+        return cursor_mock.execute.call_args_list
+
+    assert executed(IngestionMetrics()) == executed(None)
@@ -0,0 +1,213 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from firebolt.common.exception import EngineNotRunningError, FireboltError
+
+from firebolt_ingest.notifications import (
+    LocalMessageQueue,
+    NotificationConsumer,
+    S3ObjectEvent,
+    SQSMessageQueue,
+    parse_s3_event_notification,
+)
+from firebolt_ingest.table_model import Table
+
+
+def notification(*keys: str, bucket="bucket-name-1", event="ObjectCreated:Put"):
+    return json.dumps(
+        {
+            "Records": [
+                {
+                    "eventName": event,
+                    "s3": {
+                        "bucket": {"name": bucket},
+                        "object": {"key": key, "size": 10, "eTag": "abc"},
+                    },
+                }
+                for key in keys
+            ]
+        }
+    )
+
+
+@pytest.fixture
+def table_service(mock_table_with_s3_url: Table) -> MagicMock:
+    table_service = MagicMock()
+    table_service.table = mock_table_with_s3_url
+    table_service.get_ingested_file_names.return_value = set()
+    table_service.verify_files_ingestion.return_value = True
+    return table_service
+
+
+def test_parse_s3_event_notification():
+    assert parse_s3_event_notification(notification("dir/a+b%3D1.parquet")) == [
+        S3ObjectEvent(
+            "ObjectCreated:Put", "bucket-name-1", "dir/a b=1.parquet", 10, "abc"
+        )
+    ]
+
+    # notification wrapped into SNS
+    wrapped = json.dumps({"Message": notification("a.parquet")})
+    assert parse_s3_event_notification(wrapped)[0].key == "a.parquet"
+
+    with pytest.raises(ValueError):
+        parse_s3_event_notification("not a json")
+
+
+def test_consumer_requires_s3_url(mock_table: Table):
+    table_service = MagicMock()
+    table_service.table = mock_table
+    with pytest.raises(FireboltError):
+        NotificationConsumer([table_service], LocalMessageQueue())
+
+
+def test_consumer_batches_and_acks(table_service: MagicMock):
+    """
+    Files of matching notifications are inserted in one batch,
+    unrelated objects are skipped, all messages are acknowledged
+    """
+    queue = LocalMessageQueue()
+    queue.send(notification("a0.parquet"))
+    queue.send(notification("b0.parquet", "b.csv"))
+    queue.send(notification("c0.parquet", bucket="other-bucket"))
+    queue.send(notification("d0.parquet", event="ObjectRemoved:Delete"))
+
+    consumer = NotificationConsumer([table_service], queue, advanced_mode=True)
+    assert consumer.process_batch() == 4
+
+    table_service.check_compatibility.assert_called_once_with()
+    table_service.insert_files.assert_called_once_with(
+        ["a0.parquet", "b0.parquet"], check_compatibility=False, advanced_mode=True
+    )
+    table_service.verify_files_ingestion.assert_called_once_with(
+        ["a0.parquet", "b0.parquet"]
+    )
+    assert not queue.in_flight
+    assert not queue.dead_letters
+
+
+def test_consumer_skips_ingested_files(table_service: MagicMock):
+    """
+    Redelivered notifications don't ingest the file twice
+    """
+    table_service.get_ingested_file_names.return_value = {"a0.parquet"}
+    queue = LocalMessageQueue()
+    queue.send(notification("a0.parquet", "b0.parquet"))
+
+    NotificationConsumer([table_service], queue).process_batch()
+
+    table_service.insert_files.assert_called_once_with(
+        ["b0.parquet"], check_compatibility=False
+    )
+
+
+def test_consumer_dead_letters_failed_files(table_service: MagicMock):
+    """
+    A failing file is isolated, only its message is dead-lettered
+    """
+
+    def insert_files(files, check_compatibility):
+        if "bad0.parquet" in files:
+            raise FireboltError("corrupt file")
+
+    table_service.insert_files.side_effect = insert_files
+    queue = LocalMessageQueue()
+    queue.send(notification("a0.parquet"))
+    queue.send(notification("bad0.parquet"))
+    queue.send("{malformed")
+
+    NotificationConsumer([table_service], queue).process_batch()
+
+    table_service.insert_files.assert_any_call(
+        ["a0.parquet"], check_compatibility=False
+    )
+    assert not queue.in_flight
+    assert [(m.message_id, reason) for m, reason in queue.dead_letters] == [
+        (
+            "3",
+            "Malformed notification: JSONDecodeError('Expecting property name "
+            "enclosed in double quotes: line 1 column 2 (char 1)')",
+        ),
+        ("2", "bad0.parquet: corrupt file"),
+    ]
+
+
+def test_consumer_dead_letters_unverified_files(table_service: MagicMock):
+    table_service.verify_files_ingestion.return_value = False
+    queue = LocalMessageQueue()
+    queue.send(notification("a0.parquet"))
+
+    NotificationConsumer([table_service], queue).process_batch()
+
+    assert queue.dead_letters[0][1] == "a0.parquet: Ingestion verification failed"
+
+
+def test_consumer_leaves_messages_on_unavailable_engine(table_service: MagicMock):
+    """
+    Messages are redelivered, not dead-lettered, if the engine is unavailable
+    """
+    table_service.insert_files.side_effect = EngineNotRunningError("stopped")
+    queue = LocalMessageQueue()
+    queue.send(notification("a0.parquet"))
+    queue.send(notification("b0.parquet"))
+
+    NotificationConsumer([table_service], queue).process_batch()
+
+    # the batch isn't bisected
+    table_service.insert_files.assert_called_once()
+    assert not queue.dead_letters
+    assert list(queue.in_flight) == ["1", "2"]
+
+
+def test_consumer_raises_schema_mismatch(table_service: MagicMock):
+    """
+    A schema mismatch is raised once, the files are neither inserted
+    nor dead-lettered, the messages are left for redelivery
+    """
+    table_service.check_compatibility.side_effect = FireboltError("mismatch")
+    queue = LocalMessageQueue()
+    queue.send(notification("a0.parquet"))
+    queue.send(notification("b0.parquet"))
+
+    with pytest.raises(FireboltError, match="mismatch"):
+        NotificationConsumer([table_service], queue).process_batch()
+
+    table_service.insert_files.assert_not_called()
+    assert not queue.dead_letters
+    assert list(queue.in_flight) == ["1", "2"]
+
+
+def test_local_queue_redeliver():
+    queue = LocalMessageQueue()
+    first = queue.send("1")
+    queue.send("2")
+
+    assert queue.receive(1) == [first]
+    queue.redeliver()
+    assert [m.body for m in queue.receive(10)] == ["1", "2"]
+
+
+def test_sqs_queue():
+    client = MagicMock()
+    client.receive_message.return_value = {
+        "Messages": [{"MessageId": "1", "Body": "body", "ReceiptHandle": "handle"}]
+    }
+    queue = SQSMessageQueue("queue", dead_letter_queue_url="dlq", client=client)
+
+    (message,) = queue.receive(100)
+    client.receive_message.assert_called_once_with(
+        QueueUrl="queue", MaxNumberOfMessages=10, WaitTimeSeconds=20
+    )
+
+    queue.dead_letter(message, "reason")
+    client.send_message.assert_called_once_with(
+        QueueUrl="dlq",
+        MessageBody="body",
+        MessageAttributes={
+            "failure_reason": {"DataType": "String", "StringValue": "reason"}
+        },
+    )
+    client.delete_message.assert_called_once_with(
+        QueueUrl="queue", ReceiptHandle="handle"
+    )
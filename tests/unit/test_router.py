@@ -0,0 +1,132 @@
+from unittest.mock import MagicMock
+
+import pytest
+from firebolt.common.exception import (
+    EngineNotRunningError,
+    FireboltError,
+    OperationalError,
+)
+from pytest_mock import MockerFixture
+
+from firebolt_ingest.router import Engine, EngineRouter
+from firebolt_ingest.table_model import Table
+
+
+@pytest.fixture
+def engines():
+    return [
+        Engine("e1", MagicMock(name="c1")),
+        Engine("e2", MagicMock(name="c2"), weight=2),
+    ]
+
+
+def test_validation(engines):
+    with pytest.raises(ValueError):
+        EngineRouter([])
+    with pytest.raises(ValueError):
+        EngineRouter(engines + [Engine("e1", MagicMock())])
+    with pytest.raises(ValueError):
+        EngineRouter(engines, affinity={"t": "e3"})
+    with pytest.raises(ValueError):
+        Engine("e3", MagicMock(), weight=0)
+
+
+def test_choose_by_weighted_load(engines):
+    router = EngineRouter(engines)
+    e1, e2 = engines
+
+    assert router.choose("t") is e2
+    e2.in_flight = 2
+    assert router.choose("t") is e1
+    # equal load, prefer the engine, that last ran the table
+    e2.in_flight = 1
+    router._last_engine["t"] = "e2"
+    assert router.choose("t") is e2
+    assert router.choose("other") is e1
+
+
+def test_choose_affinity(engines):
+    router = EngineRouter(engines, affinity={"t": "e1"})
+    engines[0].in_flight = 10
+
+    assert router.choose("t") is engines[0]
+    router.mark_unavailable(engines[0])
+    assert router.choose("t") is engines[1]
+
+
+def test_run_fails_over(engines):
+    router = EngineRouter(engines, cooldown_seconds=60)
+    e1, e2 = engines
+
+    def job(connection):
+        if connection is e2.connection:
+            raise EngineNotRunningError("e2")
+        return "done"
+
+    assert router.run("t", job) == "done"
+    assert e2.unavailable_until > 0
+    assert e1.in_flight == e2.in_flight == 0
+    # e2 is skipped during the cooldown
+    assert router.choose("t") is e1
+
+    with pytest.raises(FireboltError, match="No engine"):
+        router.run("t", lambda c: (_ for _ in ()).throw(EngineNotRunningError("x")))
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        FireboltError("syntax error"),
+        OperationalError("Error executing query"),
+        OSError("No space left on device"),
+    ],
+)
+def test_run_does_not_fail_over_on_query_errors(engines, error: Exception):
+    router = EngineRouter(engines)
+    job = MagicMock(side_effect=error)
+
+    with pytest.raises(type(error)) as raised:
+        router.run("t", job)
+    assert raised.value is error
+    job.assert_called_once()
+    assert all(e.unavailable_until == 0 for e in engines)
+
+
+def test_run_without_failover(engines):
+    router = EngineRouter(engines)
+    job = MagicMock(side_effect=EngineNotRunningError("e"))
+
+    with pytest.raises(EngineNotRunningError):
+        router.run("t", job, failover=False)
+    job.assert_called_once()
+    assert sum(e.unavailable_until > 0 for e in engines) == 1
+
+
+def test_ingest_tables(mocker: MockerFixture, engines, mock_table: Table):
+    table_service = mocker.patch("firebolt_ingest.router.TableService")
+    table_service.return_value.ingest.return_value = "ingested"
+    tables = [mock_table.copy(update={"table_name": f"t{i}"}) for i in range(4)]
+
+    result = EngineRouter(engines).ingest_tables(
+        tables, table_service_kwargs={"internal_prefix": "p_"}, max_retries=1
+    )
+
+    assert result.results == {f"t{i}": "ingested" for i in range(4)}
+    assert set(result.engines) == {"t0", "t1", "t2", "t3"}
+    assert result.failed == {}
+    table_service.return_value.ingest.assert_called_with(max_retries=1)
+    assert table_service.call_args[1] == {"internal_prefix": "p_"}
+
+
+@pytest.mark.parametrize("sync_mode,attempts", [("append", 2), ("overwrite", 1)])
+def test_ingest_tables_failover_by_sync_mode(
+    mocker: MockerFixture, engines, mock_table: Table, sync_mode: str, attempts: int
+):
+    table_service = mocker.patch("firebolt_ingest.router.TableService")
+    table_service.return_value.ingest.side_effect = EngineNotRunningError("e")
+    table = mock_table.copy(update={"sync_mode": sync_mode})
+
+    result = EngineRouter(engines).ingest_tables([table])
+
+    assert set(result.failed) == {table.table_name}
+    assert table_service.return_value.ingest.call_count == attempts
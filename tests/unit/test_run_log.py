@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+from firebolt_ingest.run_log import (
+    IngestionRun,
+    JsonlRunLog,
+    SqliteRunLog,
+    timed_step,
+)
+
+
+def make_run(run_id: str, table_name: str, day: int, outcome: str) -> IngestionRun:
+    return IngestionRun(
+        run_id=run_id,
+        table_name=table_name,
+        sync_mode="append",
+        started_at=datetime(2022, 1, day),
+        finished_at=datetime(2022, 1, day, 1),
+        step_durations={"insert": 1.5, "verify": 0.5},
+        files_ingested=3,
+        rows_ingested=300,
+        outcome=outcome,
+    )
+
+
+@pytest.fixture(params=["jsonl", "sqlite"])
+def run_log(request, tmp_path):
+    if request.param == "jsonl":
+        return JsonlRunLog(str(tmp_path / "runs.jsonl"))
+    return SqliteRunLog(str(tmp_path / "runs.sqlite"))
+
+
+def test_run_log_query(run_log):
+    """
+    Recorded runs can be filtered by table, outcome and time, newest first
+    """
+    assert run_log.query() == []
+
+    runs = [
+        make_run("1", "table_a", 1, "success"),
+        make_run("2", "table_a", 2, "failed"),
+        make_run("3", "table_b", 3, "success"),
+    ]
+    for run in runs:
+        run_log.record(run)
+
+    assert run_log.query() == runs[::-1]
+    assert run_log.query(table_name="table_a") == [runs[1], runs[0]]
+    assert run_log.query(outcome="success", limit=1) == [runs[2]]
+    assert run_log.query(since=datetime(2022, 1, 2)) == [runs[2], runs[1]]
+
+
+def test_timed_step(mocker):
+    time_mock = mocker.patch("firebolt_ingest.run_log.time")
+    time_mock.monotonic.side_effect = [0, 2, 10, 11]
+    run = make_run("1", "table_a", 1, "success")
+
+    with timed_step(run, "warmup"):
+        pass
+    with pytest.raises(ValueError):
+        with timed_step(run, "warmup"):
+            raise ValueError()
+
+    assert run.step_durations["warmup"] == 3
@@ -0,0 +1,31 @@
+import pytest
+from pydantic import ValidationError
+
+from firebolt_ingest.sampling import SamplingSettings, sample_condition
+from firebolt_ingest.table_model import expression_column_references
+
+
+def test_sample_condition_fraction():
+    condition = sample_condition(SamplingSettings(fraction=0.01, seed=7), "ex_t")
+
+    assert condition == "ABS(CITY_HASH(source_file_name, 7) % 1000000) < 10000"
+    assert expression_column_references(condition) == ["source_file_name"]
+
+
+def test_sample_condition_file_count():
+    condition = sample_condition(SamplingSettings(file_count=10), "ex_t")
+
+    assert condition == (
+        "source_file_name IN (SELECT source_file_name FROM ("
+        "SELECT DISTINCT source_file_name FROM ex_t) "
+        "ORDER BY CITY_HASH(source_file_name, 0), source_file_name LIMIT 10)"
+    )
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [{}, {"fraction": 0.1, "file_count": 1}, {"fraction": 0}, {"fraction": 1.5}],
+)
+def test_sampling_settings_errors(settings: dict):
+    with pytest.raises(ValidationError):
+        SamplingSettings(**settings)
@@ -0,0 +1,148 @@
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+from unittest.mock import MagicMock
+
+import pytest
+from firebolt.common.exception import FireboltError
+from pytest_mock import MockerFixture
+
+from firebolt_ingest.run_log import IngestionRun
+from firebolt_ingest.scheduler import (
+    DagScheduler,
+    critical_path_lengths,
+    dependency_graph,
+    durations_from_run_log,
+    ingest_job,
+)
+from firebolt_ingest.table_model import Table
+
+
+@pytest.fixture
+def make_table(mock_table: Table):
+    def make(
+        name: str, depends_on: Optional[List[str]] = None, priority: int = None
+    ) -> Table:
+        return mock_table.copy(
+            update={"table_name": name, "depends_on": depends_on, "priority": priority}
+        )
+
+    return make
+
+
+def test_depends_on_itself(mock_table: Table):
+    with pytest.raises(ValueError):
+        Table.parse_obj({**mock_table.dict(), "depends_on": ["table_name"]})
+
+
+def test_dependency_graph_validation(make_table):
+    with pytest.raises(ValueError, match="unknown"):
+        dependency_graph([make_table("a", ["b"])])
+    with pytest.raises(ValueError, match="cycle"):
+        dependency_graph(
+            [make_table("a", ["c"]), make_table("b", ["a"]), make_table("c", ["b"])]
+        )
+    with pytest.raises(ValueError, match="Duplicate"):
+        dependency_graph([make_table("a"), make_table("a")])
+
+
+def test_critical_path_lengths(make_table):
+    graph = dependency_graph(
+        [make_table("dim"), make_table("fact", ["dim"]), make_table("other")]
+    )
+    assert critical_path_lengths(graph, {"dim": 2.0, "fact": 5.0}) == {
+        "dim": 7.0,
+        "fact": 5.0,
+        "other": 1.0,
+    }
+
+
+def test_schedule_order(make_table):
+    """
+    With a single worker, dependencies run first, then priority and the
+    longest chain decide
+    """
+    tables = [
+        make_table("small"),
+        make_table("critical", priority=1),
+        make_table("dim"),
+        make_table("fact", ["dim"]),
+        make_table("agg", ["fact"]),
+    ]
+    order = []
+
+    result = DagScheduler(tables, lambda t: order.append(t.table_name), 1).run()
+
+    assert order == ["critical", "dim", "fact", "agg", "small"]
+    assert result.completed == order
+    assert result.failed == result.skipped == {}
+
+
+def test_schedule_skips_downstream_of_failure(make_table):
+    tables = [
+        make_table("dim"),
+        make_table("fact", ["dim"]),
+        make_table("agg", ["fact"]),
+        make_table("independent"),
+    ]
+
+    def job(table: Table):
+        if table.table_name == "dim":
+            raise FireboltError("engine error")
+
+    result = DagScheduler(tables, job, 2).run()
+
+    assert result.completed == ["independent"]
+    assert result.failed == {"dim": "engine error"}
+    assert result.skipped == {"fact": "dim", "agg": "fact"}
+
+
+def test_schedule_bounded_parallelism(make_table):
+    tables = [make_table(f"t{i}") for i in range(6)] + [
+        make_table("fact", [f"t{i}" for i in range(6)])
+    ]
+    lock = threading.Lock()
+    running, max_running = [0], [0]
+    barrier = threading.Barrier(3)
+
+    def job(table: Table):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        if table.table_name != "fact":
+            barrier.wait(timeout=5)
+        with lock:
+            running[0] -= 1
+
+    result = DagScheduler(tables, job, 3).run()
+
+    assert max_running[0] == 3
+    assert result.completed[-1] == "fact"
+
+
+def test_durations_from_run_log(make_table):
+    started = datetime(2022, 1, 1)
+    run_log = MagicMock()
+    run_log.query.return_value = [
+        IngestionRun(
+            run_id=str(i),
+            table_name="p_a",
+            started_at=started,
+            finished_at=started + timedelta(seconds=seconds),
+        )
+        for i, seconds in enumerate([10, 20])
+    ]
+
+    assert durations_from_run_log(run_log, [make_table("a")], "p_") == {"a": 15.0}
+    run_log.query.assert_called_once_with("p_a", outcome="success", limit=5)
+
+
+def test_ingest_job(mocker: MockerFixture, mock_table: Table):
+    table_service = mocker.patch("firebolt_ingest.scheduler.TableService")
+    table_service.return_value.ingest.return_value.verified = False
+    connection = MagicMock()
+
+    with pytest.raises(FireboltError, match="not verified"):
+        ingest_job(connection, {"internal_prefix": "p_"}, max_retries=2)(mock_table)
+    table_service.assert_called_once_with(mock_table, connection, internal_prefix="p_")
+    table_service.return_value.ingest.assert_called_once_with(max_retries=2)
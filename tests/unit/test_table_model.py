@@ -1,7 +1,13 @@
 import pytest
 from pydantic import ValidationError
 
-from firebolt_ingest.table_model import Column, DatetimePart, Partition, Table
+from firebolt_ingest.table_model import (
+    Column,
+    DatetimePart,
+    Partition,
+    Table,
+    expression_column_references,
+)
 
 
 def prune_nested_dict(d):
@@ -75,6 +81,56 @@ def test_partition_valid_column():
         )
 
 
+@pytest.mark.parametrize(
+    "partitions,condition",
+    [
+        (
+            [Partition(column_name="d")],
+            "d >= CAST(NOW() - INTERVAL '7 DAY' AS DATE)",
+        ),
+        (
+            [Partition(column_name="d", datetime_part="YEAR")],
+            "EXTRACT(YEAR FROM d) >= "
+            "EXTRACT(YEAR FROM CAST(NOW() - INTERVAL '7 DAY' AS DATE))",
+        ),
+        (
+            [
+                Partition(column_name="id"),
+                Partition(column_name="d", datetime_part="YEAR"),
+                Partition(column_name="d", datetime_part="MONTH"),
+                Partition(column_name="d", datetime_part="DAY"),
+            ],
+            "(EXTRACT(YEAR FROM d) > EXTRACT(YEAR FROM c) "
+            "OR EXTRACT(YEAR FROM d) = EXTRACT(YEAR FROM c) "
+            "AND (EXTRACT(MONTH FROM d) > EXTRACT(MONTH FROM c) "
+            "OR EXTRACT(MONTH FROM d) = EXTRACT(MONTH FROM c) "
+            "AND EXTRACT(DAY FROM d) >= EXTRACT(DAY FROM c)))".replace(
+                " c)", " CAST(NOW() - INTERVAL '7 DAY' AS DATE))"
+            ),
+        ),
+        # partitions by a cyclic part only don't follow the time
+        ([Partition(column_name="d", datetime_part="DAY")], None),
+        ([Partition(column_name="id")], None),
+    ],
+)
+def test_lookback_condition(partitions, condition):
+    table_kwargs = dict(
+        table_name="test_table_1",
+        columns=[Column(name="id", type="INT"), Column(name="d", type="DATE")],
+        partitions=partitions,
+        primary_index=["id"],
+        file_type="PARQUET",
+        object_pattern="*.parquet",
+    )
+    if condition is None:
+        with pytest.raises(ValueError, match="dedup_lookback_days"):
+            Table(dedup_lookback_days=7, **table_kwargs)
+        assert Table(**table_kwargs).generate_lookback_condition() is None
+    else:
+        table = Table(dedup_lookback_days=7, **table_kwargs)
+        assert table.generate_lookback_condition() == condition
+
+
 def test_generate_external_columns_string(mock_table):
     """
     Test generate external columns string with 0, 1 and multiple columns
@@ -214,6 +270,24 @@ def test_unknown_sync_mode(table_dict):
     assert "Unknown sync mode test" in str(e)
 
 
+def test_merge_sync_mode(table_dict):
+    """
+    The unique key of the merge sync mode defaults to the primary index
+    and must refer to existing columns
+    """
+    table_dict["sync_mode"] = "MERGE"
+    table = Table.parse_obj(table_dict)
+    assert table.sync_mode == "merge"
+    assert table.get_unique_key() == table.primary_index
+
+    table_dict["unique_key"] = ["test_col_2"]
+    assert Table.parse_obj(table_dict).get_unique_key() == ["test_col_2"]
+
+    table_dict["unique_key"] = ["missing"]
+    with pytest.raises(ValidationError, match="Could not find unique key column"):
+        Table.parse_obj(table_dict)
+
+
 def test_date_time_partitions():
     table = Table(
         database_name="db_name",
@@ -278,3 +352,196 @@ def test_wrong_date_time_partitions():
             ],
             primary_index=["id"],
         )
+
+
+def test_aggregating_indexes(table_dict):
+    """
+    Aggregating index columns are validated against the table columns
+    """
+    table_dict["aggregating_indexes"] = [
+        {
+            "index_name": "agg_idx",
+            "key_columns": ["test_col_2"],
+            "aggregations": [
+                "SUM(test_col_1)",
+                "count(distinct test_col_4)",
+                "COUNT(*)",
+            ],
+        }
+    ]
+    table = Table.parse_obj(table_dict)
+    assert table.aggregating_indexes[0].as_sql_string() == (
+        "test_col_2, SUM(test_col_1), count(distinct test_col_4), COUNT(*)"
+    )
+
+    table_dict["aggregating_indexes"][0]["key_columns"] = ["test_col_2.member0"]
+    with pytest.raises(ValidationError, match="Could not find column"):
+        Table.parse_obj(table_dict)
+
+    table_dict["aggregating_indexes"][0]["key_columns"] = []
+    table_dict["aggregating_indexes"][0]["aggregations"] = ["SUM(unknown)"]
+    with pytest.raises(ValidationError, match="Could not find column unknown"):
+        Table.parse_obj(table_dict)
+
+    table_dict["aggregating_indexes"][0]["aggregations"] = ["SUM(a + b)"]
+    with pytest.raises(ValidationError, match="Unsupported aggregation"):
+        Table.parse_obj(table_dict)
+
+    table_dict["aggregating_indexes"] = [
+        {"index_name": "agg_idx", "aggregations": ["COUNT(*)"]},
+        {"index_name": "agg_idx", "aggregations": ["COUNT(*)"]},
+    ]
+    with pytest.raises(ValidationError, match="Duplicate aggregating index"):
+        Table.parse_obj(table_dict)
+
+
+def test_dimension_table(table_dict):
+    """
+    Join indexes are only allowed on dimension tables and validated
+    against the table columns, dimension tables cannot be partitioned
+    """
+    table_dict["table_type"] = "DIMENSION"
+    table_dict["join_indexes"] = [
+        {
+            "index_name": "join_idx",
+            "join_column": "test_col_1",
+            "dimension_columns": ["test_col_2", "test_col_4"],
+        }
+    ]
+    with pytest.raises(ValidationError, match="cannot be partitioned"):
+        Table.parse_obj(table_dict)
+
+    table_dict.pop("partitions")
+    table = Table.parse_obj(table_dict)
+    assert table.table_type == "dimension"
+    assert table.generate_table_type() == "DIMENSION"
+    assert table.join_indexes[0].as_sql_string() == "test_col_1, test_col_2, test_col_4"
+
+    table_dict["join_indexes"][0]["join_column"] = "test_col_5"
+    with pytest.raises(ValidationError, match="Could not find column test_col_5"):
+        Table.parse_obj(table_dict)
+
+    table_dict["join_indexes"][0]["join_column"] = "test_col_1"
+    table_dict["table_type"] = "fact"
+    with pytest.raises(ValidationError, match="Only dimension tables"):
+        Table.parse_obj(table_dict)
+
+    table_dict["table_type"] = "lookup"
+    with pytest.raises(ValidationError, match="Unknown table type"):
+        Table.parse_obj(table_dict)
+
+
+def test_parse_obj_bulk(table_dict):
+    """
+    The bulk path builds the same table as parse_obj
+    """
+    table_dict["columns"].append({"name": "test_col_5", "type": "TEXT", "unique": 1})
+    table_dict["columns"].append({"name": "test_col_6", "type": "INT", "default": "-1"})
+    table = Table.parse_obj_bulk(table_dict)
+
+    assert table == Table.parse_obj(table_dict)
+    assert table.__fields_set__ == Table.parse_obj(table_dict).__fields_set__
+    # the column with a coerced value went through pydantic
+    assert table.columns[-2].unique is True
+
+
+@pytest.mark.parametrize(
+    "change,match",
+    [
+        ({"columns": [{"name": "a.b", "type": "TEXT"}]}, "alias is required"),
+        ({"columns": [{"name": "a", "type": "ARRAY(TXT)"}]}, "Unknown column type"),
+        ({"columns": []}, "at least 1 column"),
+        ({"primary_index": ["missing"]}, "Could not find primary index"),
+        ({"sync_mode": "upsert"}, "Unknown sync mode"),
+        ({"table_name": "bad name"}, "table_name"),
+    ],
+)
+def test_parse_obj_bulk_errors(table_dict, change, match):
+    table_dict.update(change)
+    with pytest.raises(ValidationError, match=match):
+        Table.parse_obj_bulk(table_dict)
+
+
+@pytest.mark.parametrize(
+    "column,default",
+    [
+        (Column(name="a", type="INT", default="-1"), "-1"),
+        (Column(name="a", type="VARCHAR", nullable=True), "CAST(NULL AS TEXT)"),
+        (Column(name="a", type="VARCHAR"), "CAST('' AS TEXT)"),
+        (Column(name="a", type="NUMERIC(10,2)"), "CAST(0 AS DECIMAL(10,2))"),
+        (Column(name="a", type="PGDATE"), "CAST('1970-01-01' AS DATE)"),
+        (Column(name="a", type="ARRAY(INT)"), "CAST([] AS ARRAY(INTEGER))"),
+    ],
+)
+def test_column_default_string(column: Column, default: str):
+    assert column.generate_default_string() == default
+
+
+@pytest.mark.parametrize(
+    "expression,references",
+    [
+        ('"a.b" > 10 AND c IS NOT NULL', ["a.b", "c"]),
+        ("lower(name) LIKE 'x''s %' OR d::date = DATE '2024-01-01'", ["name", "d"]),
+        ("EXTRACT(YEAR FROM ts) IN (2023, 2024)", ["ts"]),
+        ("CAST(amount AS DECIMAL(10, 2)) * 100", ["amount"]),
+    ],
+)
+def test_expression_column_references(expression: str, references: list):
+    assert expression_column_references(expression) == references
+
+
+@pytest.mark.parametrize("expression", ["a = 1; DROP TABLE t", "a = 1 -- x", "a = ?"])
+def test_expression_column_references_errors(expression: str):
+    with pytest.raises(ValueError, match="Unexpected"):
+        expression_column_references(expression)
+
+
+def test_filter_and_transforms(table_dict):
+    """
+    Transformed columns are only internal, not ingested columns only external
+    """
+    table_dict["columns"] += [
+        {"name": "raw_amount", "type": "INTEGER", "ingest": False},
+        {"name": "amount", "type": "BIGINT", "transform": "raw_amount * 100"},
+    ]
+    table_dict["filter"] = "\"test_col_2.member0\" <> '' AND raw_amount > 0"
+    table = Table.parse_obj_bulk(table_dict)
+
+    assert table == Table.parse_obj(table_dict)
+    assert [c.name for c in table.external_columns][-1] == "raw_amount"
+    assert [c.name for c in table.internal_columns][-1] == "amount"
+    assert table.generate_select_list()[-2:] == [
+        '"test_col_4-member0" AS test_col_4',
+        "raw_amount * 100 AS amount",
+    ]
+    assert table.get_external_expressions()["amount"] == "raw_amount * 100"
+    assert "raw_amount" not in table.generate_internal_columns_string(False)[0]
+    assert ", amount BIGINT" in table.generate_internal_columns_string(False)[0]
+    assert '"amount"' not in table.generate_external_columns_string()[0]
+    assert "raw_amount" in table.generate_external_columns_string()[0]
+
+
+@pytest.mark.parametrize(
+    "change,match",
+    [
+        ({"filter": "missing > 1"}, "Could not find column missing of the filter"),
+        # the filter references external column names, not aliases
+        ({"filter": "test_col_2 > 1"}, "Could not find column test_col_2 "),
+        (
+            {"transform": "test_col_1 + missing"},
+            "Could not find column missing of the transform of column test_col_3",
+        ),
+        ({"transform": "1", "ingest": False}, "with a transform must be ingested"),
+        # a column, that isn't ingested, can't be in the primary index
+        ({"primary_index": ["test_col_3"], "ingest": False}, "primary index"),
+    ],
+)
+def test_filter_and_transforms_errors(table_dict, change, match):
+    for key in ["transform", "ingest"]:
+        if key in change:
+            table_dict["columns"][2][key] = change.pop(key)
+    table_dict.update(change)
+    table_dict["partitions"] = []
+
+    with pytest.raises(ValidationError, match=match):
+        Table.parse_obj(table_dict)
@@ -1,13 +1,26 @@
-from unittest.mock import MagicMock
+from datetime import datetime
+from unittest.mock import MagicMock, call
 
 import pytest
-from firebolt.common.exception import FireboltError
+from firebolt.common.exception import EngineNotRunningError, FireboltError
 from pytest_mock import MockerFixture
 
 from firebolt_ingest.aws_settings import AWSSettings
-from firebolt_ingest.table_model import Table
+from firebolt_ingest.ddl_state import DdlFingerprintStore
+from firebolt_ingest.file_source import LocalFileSource, SourceFile
+from firebolt_ingest.file_state import FileStateStore
+from firebolt_ingest.sampling import SamplingSettings
+from firebolt_ingest.table_model import (
+    AggregatingIndex,
+    Column,
+    DatetimePart,
+    JoinIndex,
+    Partition,
+    Table,
+)
 from firebolt_ingest.table_service import TableService
 from firebolt_ingest.utils import format_query
+from firebolt_ingest.warmup import WarmupSettings
 
 
 @pytest.mark.parametrize(
@@ -127,7 +140,10 @@ def test_create_external_table_csv(mock_aws_settings: AWSSettings, mock_table: T
 
 
 def test_create_internal_table_happy_path(
-    mock_aws_settings: AWSSettings, mock_table: Table, mock_table_partitioned: Table
+    mocker: MockerFixture,
+    mock_aws_settings: AWSSettings,
+    mock_table: Table,
+    mock_table_partitioned: Table,
 ):
     """
     call create internal table and check,
@@ -136,6 +152,7 @@ def test_create_internal_table_happy_path(
     connection = MagicMock()
     cursor_mock = MagicMock()
     connection.cursor.return_value = cursor_mock
+    mocker.patch("firebolt_ingest.table_service.drop_table")
 
     ts = TableService(mock_table_partitioned, connection)
     ts.create_internal_table(mock_aws_settings)
@@ -153,7 +170,10 @@ def test_create_internal_table_happy_path(
 
 
 def test_create_internal_table_happy_path_with_prefix(
-    mock_aws_settings: AWSSettings, mock_table: Table, mock_table_partitioned: Table
+    mocker: MockerFixture,
+    mock_aws_settings: AWSSettings,
+    mock_table: Table,
+    mock_table_partitioned: Table,
 ):
     """
     call create internal table with internal_prefix and check,
@@ -162,6 +182,7 @@ def test_create_internal_table_happy_path_with_prefix(
     connection = MagicMock()
     cursor_mock = MagicMock()
     connection.cursor.return_value = cursor_mock
+    mocker.patch("firebolt_ingest.table_service.drop_table")
 
     ts = TableService(
         mock_table_partitioned, connection, internal_prefix="my_internal_prefix_"
@@ -206,7 +227,7 @@ def test_insert_full_overwrite(
         ("aliased", "TEXT"),
     ]
 
-    # mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
 
     mock_table.sync_mode = "overwrite"
 
@@ -238,7 +259,7 @@ def test_insert_incremental_append(mocker: MockerFixture, mock_table: Table):
     does_table_exists_mock = mocker.patch(
         "firebolt_ingest.table_service.does_table_exist", return_value=[True, True]
     )
-    # mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
 
     mock_table.sync_mode = "append"
 
@@ -271,8 +292,8 @@ def test_verify_ingestion(mocker: MockerFixture, mock_table: Table):
     cursor_mock = MagicMock()
     connection.cursor.return_value = cursor_mock
 
-    verify_ingestion_rowcount_mock = mocker.patch(
-        "firebolt_ingest.table_service.verify_ingestion_rowcount", return_value=True
+    rowcounts_mock = mocker.patch(
+        "firebolt_ingest.table_service.get_ingestion_rowcounts", return_value=(5, 5)
     )
 
     verify_ingestion_file_names_mock = mocker.patch(
@@ -282,8 +303,8 @@ def test_verify_ingestion(mocker: MockerFixture, mock_table: Table):
     ts = TableService(mock_table, connection)
     assert ts.verify_ingestion()
 
-    verify_ingestion_rowcount_mock.assert_any_call(
-        cursor_mock, "table_name", "ex_table_name"
+    rowcounts_mock.assert_any_call(
+        cursor_mock, "table_name", "ex_table_name", external_filter=None
     )
     verify_ingestion_file_names_mock.assert_any_call(cursor_mock, "table_name")
 
@@ -353,6 +374,9 @@ def test_drop_tables(mocker: MockerFixture, mock_table: Table):
     expected_query = "SELECT * FROM information_schema.tables WHERE table_name = ?"
     cursor_mock.execute.assert_any_call(expected_query, [ts.external_table_name])
     cursor_mock.execute.assert_any_call(expected_query, [ts.internal_table_name])
+    cursor_mock.execute.assert_any_call(
+        query="DROP TABLE IF EXISTS table_name_ingested_files CASCADE"
+    )
 
 
 def test_drop_outdated_partitions_table_without_partitions(
@@ -446,3 +470,1283 @@ def test_drop_outdated_partitions_no_found(
     for call_args in cursor_mock.execute.call_args_list:
         executed_query = call_args[1].get("query")
         assert not executed_query.startswith("ALTER TABLE table_name DROP PARTITION")
+
+
+def test_insert_files(mocker: MockerFixture, mock_table: Table):
+    """
+    Insert of given files only selects those files from the external table
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+
+    ts = TableService(mock_table, connection)
+    ts.insert_files(["a.parquet", "b.parquet"])
+
+    cursor_mock.execute.assert_any_call(
+        format_query(
+            """
+            INSERT INTO table_name
+            SELECT "id", "name", "name.member0" AS aliased,
+                   source_file_name, source_file_timestamp
+            FROM ex_table_name
+            WHERE source_file_name IN (?, ?)"""
+        ),
+        ["a.parquet", "b.parquet"],
+    )
+
+    cursor_mock.reset_mock()
+    ts.insert_files([])
+    cursor_mock.execute.assert_not_called()
+
+
+def test_get_ingested_file_names(mock_table: Table):
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    cursor_mock.fetchall.return_value = [("a.parquet",), ("b.parquet",)]
+
+    ts = TableService(mock_table, connection)
+    assert ts.get_ingested_file_names() == {"a.parquet", "b.parquet"}
+    cursor_mock.execute.assert_called_once_with(
+        query="SELECT DISTINCT source_file_name FROM table_name"
+    )
+
+    cursor_mock.reset_mock()
+    ts.get_ingested_file_names(["a.parquet", "c.parquet"])
+    cursor_mock.execute.assert_called_once_with(
+        "SELECT DISTINCT source_file_name FROM table_name "
+        "WHERE source_file_name IN (?, ?)",
+        ["a.parquet", "c.parquet"],
+    )
+
+
+def test_insert_files_isolating_failures(mocker: MockerFixture, mock_table: Table):
+    """
+    A failing batch is bisected, only the bad file is quarantined
+    and the number of inserts grows logarithmically
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    connection = MagicMock()
+    ts = TableService(mock_table, connection)
+
+    def insert_files(files, **kwargs):
+        if "file_5" in files:
+            raise FireboltError("corrupt parquet")
+
+    ts.insert_files = MagicMock(side_effect=insert_files)
+    files = [f"file_{i}" for i in range(16)]
+
+    result = ts.insert_files_isolating_failures(files)
+
+    assert result.quarantined_files == {"file_5": "corrupt parquet"}
+    assert sorted(result.ingested_files) == sorted(set(files) - {"file_5"})
+    # 1 + 2 * log2(16)
+    assert len(result.inserts) == 9
+
+
+def test_insert_files_isolating_failures_engine_unavailable(
+    mocker: MockerFixture, mock_table: Table
+):
+    """
+    An unavailable engine is raised without bisecting or quarantining
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    ts = TableService(mock_table, MagicMock())
+    ts.insert_files = MagicMock(side_effect=EngineNotRunningError("stopped"))
+    ts._quarantine_files = MagicMock()
+
+    with pytest.raises(EngineNotRunningError):
+        ts.insert_files_isolating_failures(
+            ["a", "b", "c", "d"], quarantine_table_name="quarantine"
+        )
+
+    ts.insert_files.assert_called_once_with(
+        ["a", "b", "c", "d"], check_compatibility=False
+    )
+    ts._quarantine_files.assert_not_called()
+
+
+def test_insert_files_isolating_failures_incompatible(
+    mocker: MockerFixture, mock_table: Table
+):
+    """
+    A schema mismatch is raised once, before any insert,
+    and no file is quarantined
+    """
+    check = mocker.patch(
+        "firebolt_ingest.table_service.raise_on_tables_non_compatibility",
+        side_effect=FireboltError("Column (id, INT) expected but not found"),
+    )
+    ts = TableService(mock_table, MagicMock())
+    ts.insert_files = MagicMock()
+    ts._quarantine_files = MagicMock()
+
+    with pytest.raises(FireboltError, match="expected but not found"):
+        ts.insert_files_isolating_failures(
+            [f"file_{i}" for i in range(8)], quarantine_table_name="quarantine"
+        )
+
+    check.assert_called_once()
+    ts.insert_files.assert_not_called()
+    ts._quarantine_files.assert_not_called()
+
+
+def test_insert_files_isolating_failures_quarantine_table(
+    mocker: MockerFixture, mock_table: Table
+):
+    """
+    New files are found excluding quarantined ones,
+    and failing files are recorded in the quarantine table
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    cursor_mock.fetchall.return_value = [("b",), ("a",)]
+
+    ts = TableService(mock_table, connection)
+    ts.insert_files = MagicMock(side_effect=FireboltError("error"))
+
+    result = ts.insert_files_isolating_failures(quarantine_table_name="quarantine")
+
+    assert result.ingested_files == []
+    assert result.quarantined_files == {"a": "error", "b": "error"}
+    ts.insert_files.assert_any_call(["a", "b"], check_compatibility=False)
+
+    cursor_mock.execute.assert_any_call(
+        format_query(
+            """
+            SELECT DISTINCT source_file_name
+            FROM ex_table_name
+            WHERE (source_file_name, source_file_timestamp::timestampntz)
+            NOT IN (
+                SELECT DISTINCT source_file_name, source_file_timestamp
+                FROM table_name)
+            AND source_file_name NOT IN (
+                SELECT source_file_name
+                FROM quarantine
+                WHERE table_name = ?)"""
+        ),
+        ["table_name"],
+    )
+    insert_query, params = cursor_mock.execute.call_args_list[-1][0]
+    assert insert_query == "INSERT INTO quarantine VALUES (?, ?, ?, ?), (?, ?, ?, ?)"
+    assert params[:3] == ["table_name", "a", "error"]
+    assert params[4:7] == ["table_name", "b", "error"]
+
+
+def test_get_quarantined_file_names(mock_table: Table):
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    cursor_mock.fetchall.return_value = [("a",), ("b",)]
+
+    ts = TableService(mock_table, connection)
+    assert ts.get_quarantined_file_names("quarantine") == {"a", "b"}
+    assert cursor_mock.execute.call_args_list[0][0][0].startswith(
+        "CREATE FACT TABLE IF NOT EXISTS quarantine"
+    )
+    cursor_mock.execute.assert_called_with(
+        "SELECT DISTINCT source_file_name FROM quarantine WHERE table_name = ?",
+        ["table_name"],
+    )
+
+
+def test_backfill(mocker: MockerFixture, mock_table: Table, tmp_path):
+    """
+    Every partition value is a unit of drop partition and filtered insert,
+    completed units are skipped when the backfill is resumed
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    mocker.patch(
+        "firebolt_ingest.table_service.get_table_columns",
+        return_value=[
+            ("id", "INTEGER"),
+            ("source_file_name", "TEXT"),
+            ("source_file_timestamp", "TIMESTAMP"),
+        ],
+    )
+    mock_table.columns.append(
+        Column(name="event_time.member0", alias="event_time", type="TIMESTAMP")
+    )
+    mock_table.partitions = [
+        Partition(column_name="event_time", datetime_part=DatetimePart.YEAR)
+    ]
+
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+
+    def execute(query, params=None):
+        if params == [2021]:
+            raise FireboltError("engine error")
+
+    cursor_mock.execute.side_effect = execute
+    cursor_mock.fetchone.return_value = [100]
+    progress_path = str(tmp_path / "progress.json")
+    run_log = MagicMock()
+
+    ts = TableService(mock_table, connection, run_log=run_log)
+    result = ts.backfill(2020, 2022, max_workers=2, progress_path=progress_path)
+
+    assert result.completed == [2020, 2022]
+    # the rows of every completed partition are counted
+    assert run_log.record.call_args[0][0].rows_ingested == 200
+    cursor_mock.execute.assert_any_call(
+        "SELECT COUNT(*) FROM table_name WHERE EXTRACT(YEAR FROM event_time) = ?",
+        [2020],
+    )
+    assert result.skipped == []
+    assert list(result.failed) == [2021]
+    cursor_mock.execute.assert_any_call(
+        query="ALTER TABLE table_name DROP PARTITION 2020"
+    )
+    cursor_mock.execute.assert_any_call(
+        format_query(
+            """
+            INSERT INTO table_name
+            SELECT "id", "name", "name.member0" AS aliased,
+                   "event_time.member0" AS event_time,
+                   source_file_name, source_file_timestamp
+            FROM ex_table_name
+            WHERE EXTRACT(YEAR FROM "event_time.member0") = ?"""
+        ),
+        [2020],
+    )
+
+    cursor_mock.execute.side_effect = None
+    cursor_mock.execute.reset_mock()
+    result = ts.backfill(2020, 2022, progress_path=progress_path)
+
+    assert result.completed == [2021]
+    assert result.skipped == [2020, 2022]
+    assert not result.failed
+
+    # progress of another range is separate
+    result = ts.backfill(2021, 2022, progress_path=progress_path)
+    assert result.completed == [2021, 2022]
+    assert result.skipped == []
+
+
+def test_backfill_requires_single_partition(mock_table_partitioned: Table):
+    ts = TableService(mock_table_partitioned, MagicMock())
+    with pytest.raises(FireboltError, match="exactly one partition"):
+        ts.backfill(1, 2)
+
+
+def test_backfill_refuses_cyclic_partition(mock_table: Table):
+    """
+    EXTRACT(DAY ...) repeats every month, a unit would rewrite
+    the same day of every month
+    """
+    mock_table.partitions = [
+        Partition(column_name="event_time", datetime_part=DatetimePart.DAY)
+    ]
+    ts = TableService(mock_table, MagicMock())
+    with pytest.raises(FireboltError, match="cyclic partition"):
+        ts.backfill(1, 31)
+
+
+def test_create_internal_table_with_aggregating_index(
+    mocker: MockerFixture, mock_table: Table
+):
+    """
+    Aggregating indexes are created after the table, prefixed like the table
+    """
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mocker.patch("firebolt_ingest.table_service.drop_table")
+    mock_table.aggregating_indexes = [
+        AggregatingIndex(
+            index_name="agg_idx", key_columns=["name"], aggregations=["SUM(id)"]
+        )
+    ]
+
+    ts = TableService(mock_table, connection, internal_prefix="dev_")
+    ts.create_internal_table()
+
+    assert cursor_mock.execute.call_count == 2
+    cursor_mock.execute.assert_called_with(
+        query="CREATE AGGREGATING INDEX dev_agg_idx ON dev_table_name (name, SUM(id))"
+    )
+
+
+def test_insert_full_overwrite_recreates_aggregating_index(
+    mocker: MockerFixture, mock_table: Table
+):
+    """
+    Aggregating indexes are recreated between the table recreation and the insert
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    cursor_mock.execute.return_value = 0
+    connection.cursor.return_value = cursor_mock
+    mocker.patch(
+        "firebolt_ingest.table_service.get_table_schema",
+        return_value="create_fact_table_request",
+    )
+    mocker.patch("firebolt_ingest.table_service.get_table_columns", return_value=[])
+    mock_table.aggregating_indexes = [
+        AggregatingIndex(index_name="agg_idx", aggregations=["COUNT(*)"])
+    ]
+
+    TableService(mock_table, connection).insert_full_overwrite()
+
+    queries = [c.kwargs.get("query") for c in cursor_mock.execute.call_args_list]
+    create_index_query = "CREATE AGGREGATING INDEX agg_idx ON table_name (COUNT(*))"
+    assert queries.index("create_fact_table_request") < queries.index(
+        create_index_query
+    )
+    assert queries.index(create_index_query) < len(queries) - 1
+    assert queries[-1].startswith("INSERT INTO table_name")
+
+
+@pytest.fixture
+def mock_dimension_table(mock_table: Table) -> Table:
+    mock_table.table_type = "dimension"
+    mock_table.join_indexes = [
+        JoinIndex(index_name="join_idx", join_column="id", dimension_columns=["name"])
+    ]
+    return mock_table
+
+
+def test_create_internal_dimension_table(
+    mocker: MockerFixture, mock_dimension_table: Table
+):
+    """
+    Dimension tables are created with their join indexes
+    """
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mocker.patch("firebolt_ingest.table_service.drop_table")
+
+    ts = TableService(mock_dimension_table, connection)
+    ts.create_internal_table(add_file_metadata=False)
+
+    cursor_mock.execute.assert_any_call(
+        format_query(
+            """CREATE DIMENSION TABLE table_name
+                        (id INTEGER, name TEXT, aliased TEXT)
+                        PRIMARY INDEX id"""
+        ),
+        [],
+    )
+    cursor_mock.execute.assert_called_with(
+        query="CREATE JOIN INDEX join_idx ON table_name (id, name)"
+    )
+
+
+def test_insert_refreshes_join_indexes(
+    mocker: MockerFixture, mock_dimension_table: Table
+):
+    """
+    Join indexes are refreshed after every reload of a dimension table
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mocker.patch("firebolt_ingest.table_service.get_table_schema", return_value="")
+    mocker.patch("firebolt_ingest.table_service.get_table_columns", return_value=[])
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=True)
+    mocker.patch("firebolt_ingest.table_service.drop_table")
+
+    ts = TableService(mock_dimension_table, connection)
+    for insert in [
+        ts.insert_full_overwrite,
+        ts.insert_incremental_append,
+        lambda: ts.insert_files(["a.parquet"]),
+    ]:
+        cursor_mock.reset_mock()
+        insert()
+        assert cursor_mock.execute.call_args_list[-1] == call(
+            query="REFRESH JOIN INDEX join_idx"
+        )
+
+
+@pytest.mark.parametrize("verified", [True, False])
+def test_ingest(mock_table: Table, verified: bool):
+    """
+    Ingest inserts, verifies and only warms up verified ingestions
+    """
+    ts = TableService(mock_table, MagicMock())
+    ts.insert = MagicMock()
+    ts.verify_ingestion = MagicMock(return_value=verified)
+    ts.warmup = MagicMock(return_value=["step"])
+    settings = WarmupSettings()
+
+    result = ts.ingest(warmup=settings, advanced_mode=True)
+
+    ts.insert.assert_called_once_with(use_materialized_query=False, advanced_mode=True)
+    assert result.verified == verified
+    if verified:
+        ts.warmup.assert_called_once_with(settings)
+        assert result.warmup_steps == ["step"]
+    else:
+        ts.warmup.assert_not_called()
+        assert result.warmup_steps == []
+
+
+def test_ingest_records_run(mocker: MockerFixture, mock_table: Table):
+    """
+    Ingest records durations and retries in the run log,
+    without counting rows with extra queries
+    """
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    run_log = MagicMock()
+    mock_table.sync_mode = "append"
+
+    ts = TableService(mock_table, connection, run_log=run_log)
+    ts.insert = MagicMock(side_effect=[FireboltError("timeout"), None])
+    ts.verify_ingestion = MagicMock(return_value=True)
+
+    result = ts.ingest(max_retries=1)
+
+    run_log.record.assert_called_once_with(result.run)
+    assert result.run.outcome == "success"
+    assert result.run.retries == 1
+    assert result.run.rows_ingested is None
+    assert set(result.run.step_durations) == {"insert", "verify"}
+    cursor_mock.execute.assert_not_called()
+
+
+def test_ingest_records_overwrite_rows(mocker: MockerFixture, mock_table: Table):
+    """
+    The rows of an overwrite are taken from the verification
+    """
+    mocker.patch(
+        "firebolt_ingest.table_service.get_ingestion_rowcounts",
+        return_value=(250, 250),
+    )
+    mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_file_names", return_value=True
+    )
+    run_log = MagicMock()
+    mock_table.sync_mode = "overwrite"
+
+    ts = TableService(mock_table, MagicMock(), run_log=run_log)
+    ts.insert_full_overwrite = MagicMock()
+    result = ts.ingest()
+
+    assert result.run.rows_ingested == 250
+    run_log.record.assert_called_once_with(result.run)
+
+
+def test_insert_files_records_run(mocker: MockerFixture, mock_table: Table):
+    """
+    Inserts called directly are recorded too, nested inserts
+    are part of the outer run
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    run_log = MagicMock()
+
+    def execute(query, params=None):
+        if params and "bad" in params:
+            raise FireboltError("corrupt file")
+
+    cursor_mock.execute.side_effect = execute
+    ts = TableService(mock_table, connection, run_log=run_log)
+
+    ts.insert_files(["a", "b"])
+    run = run_log.record.call_args[0][0]
+    assert (run.outcome, run.files_ingested) == ("success", 2)
+    assert set(run.step_durations) == {"insert_files"}
+
+    run_log.reset_mock()
+    ts.insert_files_isolating_failures(["a", "b", "c", "bad"])
+    run_log.record.assert_called_once()
+    run = run_log.record.call_args[0][0]
+    assert (run.outcome, run.files_ingested) == ("success", 3)
+    assert set(run.step_durations) == {"insert_files_isolating_failures"}
+
+    with pytest.raises(FireboltError):
+        ts.insert_files(["bad"])
+    run = run_log.record.call_args[0][0]
+    assert (run.outcome, run.error) == ("failed", "corrupt file")
+
+
+def test_ingest_records_failed_run(mock_table: Table):
+    run_log = MagicMock()
+    mock_table.sync_mode = "overwrite"
+    ts = TableService(mock_table, MagicMock(), run_log=run_log)
+    ts.insert = MagicMock(side_effect=FireboltError("timeout"))
+
+    with pytest.raises(FireboltError):
+        ts.ingest()
+
+    run = run_log.record.call_args[0][0]
+    assert run.outcome == "failed"
+    assert run.error == "timeout"
+    assert run.finished_at is not None
+
+
+def test_run_log_failure_keeps_run_error(mock_table: Table):
+    """
+    A failing run log is logged, the error of the run is raised
+    """
+    run_log = MagicMock()
+    run_log.record.side_effect = OSError("disk full")
+    mock_table.sync_mode = "overwrite"
+    ts = TableService(mock_table, MagicMock(), run_log=run_log)
+    ts.insert = MagicMock(side_effect=FireboltError("timeout"))
+
+    with pytest.raises(FireboltError, match="timeout"):
+        ts.ingest()
+    run_log.record.assert_called_once()
+
+    ts.insert = MagicMock()
+    ts.verify_ingestion = MagicMock(return_value=True)
+    assert ts.ingest().run.outcome == "success"
+
+
+def test_ensure_external_table(
+    mocker: MockerFixture, tmp_path, mock_aws_settings: AWSSettings, mock_table: Table
+):
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    exists = mocker.patch(
+        "firebolt_ingest.table_service.does_table_exist", return_value=False
+    )
+    drop = mocker.patch("firebolt_ingest.table_service.drop_table")
+    store = DdlFingerprintStore(str(tmp_path / "ddl.json"))
+    ts = TableService(mock_table, connection)
+
+    assert ts.ensure_external_table(mock_aws_settings, store).action == "created"
+    assert cursor_mock.execute.call_count == 1
+    assert "role_arn" not in (tmp_path / "ddl.json").read_text()
+
+    exists.return_value = True
+    store = DdlFingerprintStore(str(tmp_path / "ddl.json"))
+    assert ts.ensure_external_table(mock_aws_settings, store).action == "unchanged"
+    assert cursor_mock.execute.call_count == 1
+
+    mock_table.object_pattern = "*.parquet"
+    result = ts.ensure_external_table(mock_aws_settings, store)
+    assert result == ("recreated", "definition changed")
+    drop.assert_called_once_with(cursor_mock, "ex_table_name")
+    assert cursor_mock.execute.call_count == 2
+
+
+def test_ensure_external_table_live_schema(
+    mocker: MockerFixture, mock_aws_settings: AWSSettings, mock_table: Table
+):
+    connection = MagicMock()
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=True)
+    mocker.patch("firebolt_ingest.table_service.drop_table")
+    get_columns = mocker.patch(
+        "firebolt_ingest.table_service.get_table_columns",
+        return_value=[("id", "INT"), ("name", "TEXT"), ("name.member0", "TEXT")],
+    )
+    ts = TableService(mock_table, connection)
+
+    assert ts.ensure_external_table(mock_aws_settings).action == "unchanged"
+
+    get_columns.return_value = [("id", "BIGINT"), ("name", "TEXT")]
+    result = ts.ensure_external_table(mock_aws_settings)
+    assert result.action == "recreated"
+    assert "Column (id, BIGINT) in table (ex_table_name) found but not expected" in (
+        result.reason
+    )
+
+
+def test_ensure_internal_table(
+    mocker: MockerFixture, tmp_path, mock_table_partitioned: Table
+):
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    exists = mocker.patch(
+        "firebolt_ingest.table_service.does_table_exist", return_value=False
+    )
+    drop = mocker.patch("firebolt_ingest.table_service.drop_table")
+    store = DdlFingerprintStore(str(tmp_path / "ddl.json"))
+    ts = TableService(mock_table_partitioned, connection)
+
+    assert ts.ensure_internal_table(store=store).action == "created"
+    # a file-state table left from a previous internal table is reset
+    drop.assert_called_once_with(cursor_mock, "table_name_ingested_files")
+    exists.return_value = True
+    assert ts.ensure_internal_table(store=store).action == "unchanged"
+
+    mock_table_partitioned.partitions = mock_table_partitioned.partitions[:1]
+    result = ts.ensure_internal_table(store=store)
+    assert result.action == "rebuild_required"
+    assert "PARTITION BY user, EXTRACT(DAY FROM birthdate);\n+CREATE" in result.reason
+    assert result.reason.endswith("PRIMARY INDEX id PARTITION BY user;")
+    assert cursor_mock.execute.call_count == 1
+
+
+def test_ensure_internal_table_live_schema(
+    mocker: MockerFixture, tmp_path, mock_table: Table
+):
+    connection = MagicMock()
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=True)
+    get_columns = mocker.patch(
+        "firebolt_ingest.table_service.get_table_columns",
+        return_value=[("id", "INTEGER"), ("name", "TEXT")],
+    )
+    store = DdlFingerprintStore(str(tmp_path / "ddl.json"))
+    ts = TableService(mock_table, connection)
+
+    result = ts.ensure_internal_table(add_file_metadata=False, store=store)
+    assert result.action == "rebuild_required"
+    assert result.reason == (
+        "Column (aliased, TEXT) in table (table_name) expected but not found"
+    )
+    assert store.get("table_name") is None
+
+    get_columns.return_value.append(("aliased", "STRING"))
+    result = ts.ensure_internal_table(add_file_metadata=False, store=store)
+    assert result.action == "unchanged"
+    assert store.get("table_name") is not None
+    connection.cursor.return_value.execute.assert_not_called()
+
+
+def test_evolve_schema_adds_columns(
+    mocker: MockerFixture, mock_table_partitioned: Table, tmp_path
+):
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mocker.patch(
+        "firebolt_ingest.table_service.get_table_columns",
+        return_value=[
+            ("id", "INT"),
+            ("user", "TEXT"),
+            ("source_file_name", "TEXT"),
+            ("source_file_timestamp", "TIMESTAMP"),
+        ],
+    )
+    drop = mocker.patch("firebolt_ingest.table_service.drop_table")
+    mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_rowcount", return_value=True
+    )
+    mock_table_partitioned.columns.append(
+        Column(name="score", type="INT", default="-1")
+    )
+
+    store = DdlFingerprintStore(str(tmp_path / "ddl.json"))
+    ts = TableService(mock_table_partitioned, connection)
+    assert ts.evolve_schema(store=store) == ["birthdate", "score"]
+
+    queries = [
+        c[0][0] if c[0] else c[1]["query"] for c in cursor_mock.execute.call_args_list
+    ]
+    assert queries[0].startswith("CREATE FACT TABLE table_name_staging")
+    assert queries[-3] == format_query(
+        """INSERT INTO table_name_staging
+        SELECT id, user, CAST('1970-01-01' AS DATE) AS birthdate,
+        -1 AS score, source_file_name, source_file_timestamp
+        FROM table_name"""
+    )
+    assert queries[-2:] == [
+        "ALTER TABLE table_name RENAME TO table_name_previous",
+        "ALTER TABLE table_name_staging RENAME TO table_name",
+    ]
+    drop.assert_called_with(cursor_mock, "table_name_previous")
+
+    # the store has the new definition
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=True)
+    assert ts.ensure_internal_table(store=store).action == "unchanged"
+
+
+def test_evolve_schema_restores_table(
+    mocker: MockerFixture, mock_table_partitioned: Table
+):
+    """
+    If the staging table can't replace the internal table,
+    the internal table is renamed back
+    """
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mocker.patch(
+        "firebolt_ingest.table_service.get_table_columns",
+        return_value=[("id", "INT"), ("user", "TEXT")],
+    )
+    drop = mocker.patch("firebolt_ingest.table_service.drop_table")
+    mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_rowcount", return_value=True
+    )
+
+    def execute(query, *args, **kwargs):
+        if query.startswith("ALTER TABLE table_name_staging"):
+            raise FireboltError("rename failed")
+
+    cursor_mock.execute.side_effect = execute
+
+    ts = TableService(mock_table_partitioned, connection)
+    with pytest.raises(FireboltError, match="rename failed"):
+        ts.evolve_schema()
+
+    assert [c[0][0] for c in cursor_mock.execute.call_args_list[-3:]] == [
+        "ALTER TABLE table_name RENAME TO table_name_previous",
+        "ALTER TABLE table_name_staging RENAME TO table_name",
+        "ALTER TABLE table_name_previous RENAME TO table_name",
+    ]
+    assert call(cursor_mock, "table_name_previous") not in drop.call_args_list[2:]
+
+
+def test_evolve_schema_unchanged(mocker: MockerFixture, mock_table: Table):
+    connection = MagicMock()
+    mocker.patch(
+        "firebolt_ingest.table_service.get_table_columns",
+        return_value=[("id", "INTEGER"), ("name", "TEXT"), ("aliased", "TEXT")],
+    )
+
+    assert TableService(mock_table, connection).evolve_schema() == []
+    connection.cursor.return_value.execute.assert_not_called()
+
+
+def test_evolve_schema_not_additive(mocker: MockerFixture, mock_table: Table):
+    connection = MagicMock()
+    mocker.patch(
+        "firebolt_ingest.table_service.get_table_columns",
+        return_value=[("id", "BIGINT"), ("name", "TEXT"), ("aliased", "TEXT")],
+    )
+
+    with pytest.raises(FireboltError, match="a full reload is required"):
+        TableService(mock_table, connection).evolve_schema()
+    connection.cursor.return_value.execute.assert_not_called()
+
+
+@pytest.mark.parametrize("merge_dedup", [None, False])
+def test_insert_merge(mocker: MockerFixture, mock_table: Table, merge_dedup):
+    """
+    Merge lists the new files, stages their rows, replaces the older rows
+    of their keys and records all listed files
+    """
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=True)
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    drop = mocker.patch("firebolt_ingest.table_service.drop_table")
+
+    mock_table.sync_mode = "merge"
+    mock_table.unique_key = ["id", "aliased"]
+    mock_table.merge_dedup = merge_dedup
+    # the filter applies to the staged rows, not to the recorded files
+    mock_table.filter = '"id" > 5'
+    cursor_mock.fetchone.return_value = (40, 3)
+    run_log = MagicMock()
+    TableService(mock_table, connection, run_log=run_log).insert()
+    run = run_log.record.call_args[0][0]
+    assert (run.rows_ingested, run.files_ingested) == (40, 3)
+
+    if merge_dedup is None:
+        merged = """
+            SELECT id, name, aliased, source_file_name, source_file_timestamp
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY id, aliased
+                    ORDER BY source_file_timestamp DESC, source_file_name DESC
+                ) AS merge_row_number
+                FROM table_name_merge)
+            WHERE merge_row_number = 1"""
+    else:
+        merged = """
+            SELECT id, name, aliased, source_file_name, source_file_timestamp
+            FROM table_name_merge"""
+
+    queries = [
+        c[1]["query"] if "query" in c[1] else c[0][0]
+        for c in cursor_mock.execute.call_args_list
+    ]
+    assert queries[0].startswith("CREATE FACT TABLE table_name_merge")
+    assert queries[1].startswith(
+        "CREATE FACT TABLE IF NOT EXISTS table_name_merge_files"
+    )
+    assert queries[-6:] == [
+        format_query(
+            """
+            INSERT INTO table_name_merge_files
+            SELECT DISTINCT source_file_name, source_file_timestamp
+            FROM ex_table_name
+            WHERE NOT EXISTS (
+                SELECT 1 FROM table_name_ingested_files f
+                WHERE f.source_file_name = ex_table_name.source_file_name
+                AND f.source_file_timestamp =
+                    ex_table_name.source_file_timestamp::timestampntz)"""
+        ),
+        format_query(
+            """
+            INSERT INTO table_name_merge
+            SELECT "id", "name", "name.member0" AS aliased,
+                   source_file_name, source_file_timestamp
+            FROM ex_table_name
+            WHERE EXISTS (
+                SELECT 1 FROM table_name_merge_files f
+                WHERE f.source_file_name = ex_table_name.source_file_name
+                AND f.source_file_timestamp =
+                    ex_table_name.source_file_timestamp::timestampntz)
+            AND ("id" > 5)"""
+        ),
+        "SELECT (SELECT COUNT(*) FROM table_name_merge), "
+        "(SELECT COUNT(*) FROM table_name_merge_files)",
+        format_query(
+            """
+            DELETE FROM table_name
+            WHERE EXISTS (
+                SELECT 1 FROM table_name_merge
+                WHERE table_name_merge.id = table_name.id
+                AND table_name_merge.aliased = table_name.aliased
+                AND table_name_merge.source_file_timestamp >=
+                    table_name.source_file_timestamp)"""
+        ),
+        format_query(
+            f"""
+            INSERT INTO table_name
+            SELECT id, name, aliased, source_file_name, source_file_timestamp
+            FROM ({merged}) AS merged
+            WHERE NOT EXISTS (
+                SELECT 1 FROM table_name
+                WHERE table_name.id = merged.id
+                AND table_name.aliased = merged.aliased)"""
+        ),
+        format_query(
+            """
+            INSERT INTO table_name_ingested_files
+            SELECT source_file_name, source_file_timestamp
+            FROM table_name_merge_files"""
+        ),
+    ]
+    drop.assert_any_call(cursor_mock, "table_name_merge")
+    drop.assert_called_with(cursor_mock, "table_name_merge_files")
+
+
+def test_insert_merge_twice(mocker: MockerFixture, mock_table: Table):
+    """
+    The first merge creates the ingested files table from the files
+    of the internal table, every merge reads only files not in it
+    """
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    existing = {"table_name", "ex_table_name"}
+
+    def does_table_exist(cursor, table_name):
+        return table_name in existing
+
+    def execute(query, *args, **kwargs):
+        if query.startswith("CREATE FACT TABLE IF NOT EXISTS"):
+            existing.add(query.split()[6])
+
+    mocker.patch(
+        "firebolt_ingest.table_service.does_table_exist", side_effect=does_table_exist
+    )
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    mocker.patch("firebolt_ingest.table_service.drop_table")
+    cursor_mock.execute.side_effect = execute
+    cursor_mock.fetchone.return_value = (0, 0)
+    mock_table.sync_mode = "merge"
+
+    ts = TableService(mock_table, connection)
+    for _ in range(2):
+        ts.insert_merge()
+
+    queries = [
+        c[1]["query"] if "query" in c[1] else c[0][0]
+        for c in cursor_mock.execute.call_args_list
+    ]
+    assert queries[:2] == [
+        format_query(
+            "CREATE FACT TABLE IF NOT EXISTS table_name_ingested_files\n"
+            "(source_file_name TEXT, source_file_timestamp TIMESTAMPNTZ)\n"
+            "PRIMARY INDEX source_file_name\n"
+        ),
+        format_query(
+            """
+            INSERT INTO table_name_ingested_files
+            SELECT DISTINCT source_file_name, source_file_timestamp
+            FROM table_name"""
+        ),
+    ]
+    assert len([q for q in queries if "EXISTS table_name_ingested_files" in q]) == 1
+    # both runs read the new files by the ingested files table,
+    # not by the internal table, where replaced files are gone
+    staging = [q for q in queries if "INSERT INTO table_name_merge_files" in q]
+    assert len(staging) == 2
+    assert all("FROM table_name_ingested_files" in q for q in staging)
+    assert all("FROM table_name\n" not in q for q in staging)
+
+
+def test_verify_ingestion_merge(mocker: MockerFixture, mock_table: Table):
+    key_count = mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_key_count", return_value=True
+    )
+    mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_file_names", return_value=True
+    )
+    mock_table.sync_mode = "merge"
+    mock_table.unique_key = ["aliased"]
+    ts = TableService(mock_table, MagicMock())
+
+    assert ts.verify_ingestion()
+    key_count.assert_called_once_with(
+        ts.connection.cursor(),
+        "table_name",
+        "ex_table_name",
+        ["aliased"],
+        ['"name.member0"'],
+        external_filter=None,
+    )
+
+    mock_table.merge_dedup = False
+    assert ts.verify_ingestion()
+    key_count.assert_called_once()
+
+
+@pytest.mark.parametrize("dedup_lookback_days", [None, 7])
+def test_insert_incremental_append_dedup(
+    mocker: MockerFixture, mock_table: Table, dedup_lookback_days
+):
+    """
+    Append with dedup skips keys already ingested or repeated in new files
+    """
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=True)
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    mock_table.sync_mode = "append"
+    mock_table.append_dedup = True
+    mock_table.dedup_lookback_days = dedup_lookback_days
+    mocker.patch.object(
+        Table,
+        "generate_lookback_condition",
+        return_value="EXTRACT(YEAR FROM d) >= 2024" if dedup_lookback_days else None,
+    )
+
+    TableService(mock_table, connection).insert(use_materialized_query=True)
+
+    lookback = " AND EXTRACT(YEAR FROM d) >= 2024" if dedup_lookback_days else ""
+    cursor_mock.execute.assert_any_call(
+        query=format_query(
+            f"""
+            INSERT INTO table_name
+            WITH a AS materialized (
+                SELECT DISTINCT source_file_name FROM table_name),
+            new_rows AS (
+                SELECT "id", "name", "name.member0" AS aliased,
+                    source_file_name, source_file_timestamp
+                FROM ex_table_name
+                WHERE source_file_name NOT IN (SELECT source_file_name FROM a))
+            SELECT id, name, aliased, source_file_name, source_file_timestamp
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY id
+                    ORDER BY source_file_timestamp, source_file_name
+                ) AS dedup_row_number
+                FROM new_rows) AS new_keys
+            WHERE dedup_row_number = 1
+            AND NOT EXISTS (
+                SELECT 1 FROM table_name
+                WHERE table_name.id = new_keys.id{lookback})"""
+        )
+    )
+
+
+def test_insert_files_dedup(mocker: MockerFixture, mock_table: Table):
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mock_table.append_dedup = True
+    mock_table.unique_key = ["name", "aliased"]
+
+    TableService(mock_table, connection).insert_files(["a.parquet"])
+
+    query, params = cursor_mock.execute.call_args_list[-1][0]
+    query = " ".join(query.split())
+    assert params == ["a.parquet"]
+    assert "WHERE source_file_name IN (?)" in query
+    assert "PARTITION BY name, aliased" in query
+    assert query.endswith(
+        "AND NOT EXISTS (SELECT 1 FROM table_name WHERE table_name.name = "
+        "new_keys.name AND table_name.aliased = new_keys.aliased)"
+    )
+
+
+def test_verify_ingestion_append_dedup(mocker: MockerFixture, mock_table: Table):
+    key_count = mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_key_count", return_value=True
+    )
+    rowcount = mocker.patch("firebolt_ingest.table_service.get_ingestion_rowcounts")
+    mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_file_names", return_value=True
+    )
+    mock_table.sync_mode = "append"
+    mock_table.append_dedup = True
+    ts = TableService(mock_table, MagicMock())
+
+    assert ts.verify_ingestion()
+    key_count.assert_called_once()
+
+    unique_keys = mocker.patch(
+        "firebolt_ingest.table_service.verify_unique_keys", return_value=False
+    )
+    mocker.patch.object(
+        Table, "generate_lookback_condition", return_value="EXTRACT(YEAR FROM d) > 0"
+    )
+    mock_table.dedup_lookback_days = 3
+    assert not ts.verify_ingestion()
+    key_count.assert_called_once()
+    rowcount.assert_not_called()
+    # keys are verified in the partitions of the lookback only
+    unique_keys.assert_called_once_with(
+        ts.connection.cursor(), "table_name", ["id"], "EXTRACT(YEAR FROM d) > 0"
+    )
+
+
+def test_reload_changed_files(tmp_path, mock_table: Table):
+    """
+    Rows of changed files are deleted and reloaded with the new files,
+    touched but unchanged files are left alone
+    """
+    (tmp_path / "a.parquet").write_bytes(b"1")
+    (tmp_path / "b.parquet").write_bytes(b"2")
+    file_source = LocalFileSource(str(tmp_path), "*.parquet", content_hash=True)
+    file_state = FileStateStore(str(tmp_path / "files.json"), "table_name")
+    file_state.mark_ingested(file_source.list_files())
+    (tmp_path / "a.parquet").write_bytes(b"3")
+    (tmp_path / "b.parquet").touch()
+    (tmp_path / "c.parquet").write_bytes(b"4")
+
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    ts = TableService(mock_table, connection)
+    ts.get_ingested_file_names = MagicMock(return_value={"a.parquet", "b.parquet"})
+    ts.insert_files = MagicMock()
+
+    changes = ts.reload_changed_files(file_source, file_state, advanced_mode=True)
+
+    assert [f.name for f in changes.changed] == ["a.parquet"]
+    cursor_mock.execute.assert_called_once_with(
+        "DELETE FROM table_name WHERE source_file_name IN (?)", ["a.parquet"]
+    )
+    ts.insert_files.assert_called_once_with(
+        ["a.parquet", "c.parquet"], advanced_mode=True
+    )
+    assert file_state.get_etag("a.parquet") == changes.changed[0].etag
+
+
+@pytest.mark.parametrize("sync_mode", ["merge", "overwrite"])
+def test_reload_changed_files_by_sync_mode(
+    mocker: MockerFixture, tmp_path, mock_table: Table, sync_mode: str
+):
+    """
+    Merge tables forget the changed files and merge them again,
+    overwrite tables are overwritten
+    """
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=True)
+    file_source = MagicMock()
+    file_source.list_files.return_value = [
+        SourceFile("a.parquet", 1, datetime(2024, 1, 1), "new_etag"),
+        SourceFile("b.parquet", 1, datetime(2024, 1, 1), "e"),
+    ]
+    file_state = FileStateStore(str(tmp_path / "files.json"), "table_name")
+    file_state.mark_ingested(
+        [
+            SourceFile("a.parquet", 1, datetime(2024, 1, 1), "e"),
+            SourceFile("b.parquet", 1, datetime(2024, 1, 1), "e"),
+        ]
+    )
+
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mock_table.sync_mode = sync_mode
+    ts = TableService(mock_table, connection)
+    ts.get_ingested_file_names = MagicMock(return_value={"a.parquet", "b.parquet"})
+    ts.insert_files = MagicMock()
+    ts.insert_merge = MagicMock(side_effect=FireboltError("timeout"))
+    ts.insert_full_overwrite = MagicMock(side_effect=FireboltError("timeout"))
+
+    with pytest.raises(FireboltError):
+        ts.reload_changed_files(file_source, file_state, advanced_mode=True)
+    # etags are stored only after the insert
+    assert file_state.get_etag("a.parquet") == "e"
+
+    ts.insert_merge.side_effect = ts.insert_full_overwrite.side_effect = None
+    ts.reload_changed_files(file_source, file_state, advanced_mode=True)
+
+    ts.insert_files.assert_not_called()
+    if sync_mode == "merge":
+        cursor_mock.execute.assert_called_with(
+            "DELETE FROM table_name_ingested_files WHERE source_file_name IN (?)",
+            ["a.parquet"],
+        )
+        ts.insert_merge.assert_called_with(advanced_mode=True)
+    else:
+        cursor_mock.execute.assert_not_called()
+        ts.insert_full_overwrite.assert_called_with(advanced_mode=True)
+    assert file_state.get_etag("a.parquet") == "new_etag"
+
+
+def test_get_ingested_file_names_merge(mocker: MockerFixture, mock_table: Table):
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=True)
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    cursor_mock.fetchall.return_value = [("a.parquet",)]
+    mock_table.sync_mode = "merge"
+
+    assert TableService(mock_table, connection).get_ingested_file_names() == {
+        "a.parquet"
+    }
+    cursor_mock.execute.assert_called_once_with(
+        query="SELECT DISTINCT source_file_name FROM table_name_ingested_files"
+    )
+
+
+def test_reload_changed_files_partitioned(
+    tmp_path, mock_table_partitioned_by_file: Table
+):
+    """
+    Partitions of changed files are dropped and all their files reloaded
+    """
+    file_source = MagicMock()
+    file_source.list_files.return_value = [
+        SourceFile("a.parquet", 1, datetime(2024, 1, 1), "new_etag")
+    ]
+    file_state = FileStateStore(str(tmp_path / "files.json"), "table_name")
+    file_state.mark_ingested([SourceFile("a.parquet", 1, datetime(2024, 1, 1), "e")])
+
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    cursor_mock.fetchall.side_effect = [
+        [("2024-01-01",)],
+        [("a.parquet",), ("b.parquet",)],
+    ]
+    connection.cursor.return_value = cursor_mock
+    ts = TableService(mock_table_partitioned_by_file, connection)
+    ts.get_ingested_file_names = MagicMock(return_value={"a.parquet"})
+    ts.insert_files = MagicMock()
+
+    ts.reload_changed_files(file_source, file_state)
+
+    cursor_mock.execute.assert_called_with(
+        query="ALTER TABLE table_name DROP PARTITION '2024-01-01'"
+    )
+    ts.insert_files.assert_called_once_with(["a.parquet", "b.parquet"])
+
+
+def test_insert_files_with_filter_and_transform(
+    mocker: MockerFixture, mock_table: Table
+):
+    """
+    The filter and column transforms are rendered into the insert
+    and the verification
+    """
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    rowcount = mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_rowcount_for_files",
+        return_value=True,
+    )
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mock_table.columns[1].ingest = False
+    mock_table.columns.append(
+        Column(name="name_length", type="INT", transform='LENGTH("name")')
+    )
+    mock_table.filter = "\"name\" <> ''"
+
+    ts = TableService(mock_table, connection)
+    ts.insert_files(["a.parquet"])
+    assert ts.verify_files_ingestion(["a.parquet"])
+
+    cursor_mock.execute.assert_any_call(
+        format_query(
+            """
+            INSERT INTO table_name
+            SELECT "id", "name.member0" AS aliased,
+                   LENGTH("name") AS name_length,
+                   source_file_name, source_file_timestamp
+            FROM ex_table_name
+            WHERE source_file_name IN (?)
+            AND ("name" <> '')"""
+        ),
+        ["a.parquet"],
+    )
+    rowcount.assert_called_once_with(
+        cursor_mock,
+        "table_name",
+        "ex_table_name",
+        ["a.parquet"],
+        external_filter="\"name\" <> ''",
+    )
+
+
+def test_ingest_sample(mocker: MockerFixture, mock_table: Table):
+    """
+    A sample is ingested into a separate internal table,
+    and only sampled files are inserted and verified
+    """
+    mocker.patch("firebolt_ingest.table_service.does_table_exist", return_value=False)
+    mocker.patch("firebolt_ingest.table_service.get_table_schema", return_value="")
+    mocker.patch("firebolt_ingest.table_service.get_table_columns", return_value=[])
+    mocker.patch("firebolt_ingest.table_service.drop_table")
+    mocker.patch("firebolt_ingest.table_service.raise_on_tables_non_compatibility")
+    rowcount = mocker.patch(
+        "firebolt_ingest.table_service.get_ingestion_rowcounts", return_value=(3, 3)
+    )
+    mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_file_names", return_value=True
+    )
+    connection = MagicMock()
+    cursor_mock = MagicMock()
+    connection.cursor.return_value = cursor_mock
+    mock_table.sync_mode = "overwrite"
+    mock_table.filter = '"id" > 0'
+
+    run_log, sample_run_log = MagicMock(), MagicMock()
+    ts = TableService(mock_table, connection, internal_prefix="dev_", run_log=run_log)
+    result = ts.ingest_sample(SamplingSettings(fraction=0.5), run_log=sample_run_log)
+
+    condition = "ABS(CITY_HASH(source_file_name, 0) % 1000000) < 500000"
+    assert result.verified
+    assert ts.table.filter == '"id" > 0'
+    assert cursor_mock.execute.call_args_list[0][0][0].startswith(
+        "CREATE FACT TABLE sample_dev_table_name"
+    )
+    cursor_mock.execute.assert_any_call(
+        query=format_query(
+            f"""INSERT INTO sample_dev_table_name
+            SELECT "id", "name", "name.member0" AS aliased
+            FROM ex_table_name
+            WHERE (("id" > 0) AND ({condition}))"""
+        )
+    )
+    rowcount.assert_called_once_with(
+        cursor_mock,
+        "sample_dev_table_name",
+        "ex_table_name",
+        external_filter=f'("id" > 0) AND ({condition})',
+    )
+    # sample runs are only recorded in the sample run log
+    run_log.record.assert_not_called()
+    sample_run_log.record.assert_called_once_with(result.run)
+
+
+@pytest.mark.parametrize("sync_mode", ["append", "merge"])
+def test_sampled_file_count_requires_overwrite(mock_table: Table, sync_mode: str):
+    mock_table.sync_mode = sync_mode
+    ts = TableService(mock_table, MagicMock())
+
+    with pytest.raises(ValueError, match="overwrite"):
+        ts.sampled(SamplingSettings(file_count=10))
+    assert ts.sampled(SamplingSettings(fraction=0.1))
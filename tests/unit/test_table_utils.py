@@ -1,10 +1,19 @@
 from typing import Sequence
 from unittest.mock import MagicMock, call
 
+import httpx
 import pytest
+from firebolt.common.exception import (
+    ConnectionClosedError,
+    EngineNotRunningError,
+    FireboltError,
+    OperationalError,
+    ProgrammingError,
+)
 from pytest import fixture
 from pytest_mock import MockerFixture
 
+from firebolt_ingest.table_model import Table
 from firebolt_ingest.table_utils import (
     check_table_compatibility,
     does_table_exist,
@@ -12,8 +21,12 @@ from firebolt_ingest.table_utils import (
     execute_set_statements,
     get_table_columns,
     get_table_schema,
+    is_engine_unavailable_error,
+    raise_on_tables_non_compatibility,
     verify_ingestion_file_names,
+    verify_ingestion_key_count,
     verify_ingestion_rowcount,
+    verify_ingestion_rowcount_for_files,
 )
 from firebolt_ingest.utils import format_query
 
@@ -118,21 +131,75 @@ def test_verify_ingestion_rowcount_different(cursor: MagicMock):
     cursor.fetchall.assert_called_once()
 
 
+def test_verify_ingestion_rowcount_with_filter(cursor: MagicMock):
+    """
+    Only external rows passing the filter are expected in the fact table
+    """
+    cursor.fetchall.return_value = [[90, 90]]
+
+    assert verify_ingestion_rowcount(
+        cursor, "internal_table_name", "external_table_name", "a > 1"
+    )
+    cursor.execute.assert_called_once_with(
+        query=format_query(
+            """
+            SELECT (SELECT count(*) FROM internal_table_name) AS rc_fact,
+                   (SELECT count(*) FROM external_table_name
+                    WHERE a > 1) AS rc_external"""
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "counts,verified",
+    [([10, 10, 10], True), ([11, 10, 10], False), ([9, 9, 10], False)],
+)
+def test_verify_ingestion_key_count(cursor: MagicMock, counts, verified: bool):
+    """
+    The fact table must have one row per distinct key of the external table
+    """
+    cursor.fetchall.return_value = [counts]
+
+    assert (
+        verify_ingestion_key_count(
+            cursor, "internal_table_name", "external_table_name", ["id"], ['"c.id"']
+        )
+        == verified
+    )
+    cursor.execute.assert_called_once_with(
+        query=format_query(
+            """
+            SELECT (SELECT count(*) FROM internal_table_name) AS rc_fact,
+                   (SELECT count(*) FROM (
+                        SELECT DISTINCT id FROM internal_table_name)) AS kc_fact,
+                   (SELECT count(*) FROM (
+                        SELECT DISTINCT "c.id"
+                        FROM external_table_name)) AS kc_external"""
+        )
+    )
+
+
 @pytest.mark.parametrize(
     "fetch_return,expected", [([], True), ([["some_file_name"]], False)]
 )
+@pytest.mark.parametrize("timestamp_type", ["TIMESTAMPNTZ", "TIMESTAMP"])
 def test_verify_ingestion_file_names(
-    cursor: MagicMock, mocker: MockerFixture, fetch_return: Sequence, expected: bool
+    cursor: MagicMock,
+    mocker: MockerFixture,
+    fetch_return: Sequence,
+    expected: bool,
+    timestamp_type: str,
 ):
     """
-    test verify ingestion correct and incorrect cases
+    test verify ingestion correct and incorrect cases,
+    the catalog may report the timestamp column as TIMESTAMP
     """
 
     mocker.patch(
         "firebolt_ingest.table_utils.get_table_columns",
         return_value=[
             ("source_file_name", "TEXT"),
-            ("source_file_timestamp", "TIMESTAMPNTZ"),
+            ("source_file_timestamp", timestamp_type),
             ("other_column", "BIGINT"),
         ],
     )
@@ -158,7 +225,7 @@ def test_verify_ingestion_file_names_no_meta(cursor: MagicMock, mocker: MockerFi
 
     mocker.patch(
         "firebolt_ingest.table_utils.get_table_columns",
-        return_value=["source_file_name", "other_column"],
+        return_value=[("source_file_name", "TEXT"), ("other_column", "BIGINT")],
     )
 
     assert verify_ingestion_file_names(cursor, "internal_table_name")
@@ -250,3 +317,119 @@ def test_with_provided_values(cursor: MagicMock):
 def test_with_invalid_value(cursor: MagicMock):
     with pytest.raises(ValueError):
         execute_set_statements(cursor, advanced_mode="not_a_boolean")
+
+
+def test_verify_ingestion_rowcount_for_files(cursor: MagicMock):
+    """
+    Test verify ingestion rowcount restricted to a set of files
+    """
+    cursor.fetchall.return_value = [[10, 10]]
+
+    assert verify_ingestion_rowcount_for_files(
+        cursor, "internal_table_name", "external_table_name", ["a", "b"]
+    )
+
+    cursor.execute.assert_called_once_with(
+        format_query(
+            """
+            SELECT
+                (SELECT count(*) FROM internal_table_name
+                 WHERE source_file_name IN (?, ?)) AS rc_fact,
+                (SELECT count(*) FROM external_table_name
+                 WHERE source_file_name IN (?, ?)) AS rc_external"""
+        ),
+        ["a", "b", "a", "b"],
+    )
+
+
+def test_check_table_compatibility_type_aliases(cursor, mocker: MockerFixture):
+    """
+    Type aliases are equivalent and errors report the canonical type
+    """
+    mocker.patch(
+        "firebolt_ingest.table_utils.get_table_columns",
+        return_value=[("name", "STRING"), ("ts", "TIMESTAMP"), ("id", "BIGINT")],
+    )
+
+    expected_columns = {("name", "TEXT"), ("ts", "TIMESTAMPNTZ"), ("id", "INT")}
+
+    err_list = check_table_compatibility(cursor, "table_name", expected_columns, set())
+    assert sorted(err_list) == [
+        ("id", "BIGINT", "table_name", "found but not expected"),
+        ("id", "INTEGER", "table_name", "expected but not found"),
+    ]
+
+
+def test_raise_on_tables_non_compatibility(cursor: MagicMock, mock_table: Table):
+    """
+    Both tables are fetched in one catalog query, types are compared normalized
+    """
+    cursor.fetchall.return_value = [
+        ("p_table_name", "id", "INT"),
+        ("p_table_name", "name", "STRING"),
+        ("p_table_name", "aliased", "TEXT"),
+        ("p_table_name", "source_file_name", "TEXT"),
+        ("p_table_name", "source_file_timestamp", "TIMESTAMP"),
+        ("x_table_name", "id", "INTEGER"),
+        ("x_table_name", "name", "TEXT"),
+        ("x_table_name", "name.member0", "VARCHAR"),
+    ]
+
+    raise_on_tables_non_compatibility(
+        cursor, mock_table, False, "p_table_name", "x_table_name"
+    )
+
+    cursor.execute.assert_called_once_with(
+        "SELECT table_name, column_name, data_type "
+        "FROM information_schema.columns WHERE table_name IN (?, ?)",
+        ["p_table_name", "x_table_name"],
+    )
+
+
+def test_raise_on_tables_non_compatibility_errors(cursor: MagicMock, mock_table: Table):
+    cursor.fetchall.return_value = [
+        ("table_name", "id", "BIGINT"),
+        ("table_name", "name", "TEXT"),
+        ("table_name", "aliased", "TEXT"),
+        ("ex_table_name", "id", "INTEGER"),
+        ("ex_table_name", "name", "TEXT"),
+        ("ex_table_name", "name.member0", "TEXT"),
+        ("ex_table_name", "extra", "DATE"),
+    ]
+
+    with pytest.raises(FireboltError) as e:
+        raise_on_tables_non_compatibility(cursor, mock_table, True)
+    assert str(e.value).split("\n") == [
+        "Column (id, BIGINT) in table (table_name) found but not expected",
+        "Column (id, INTEGER) in table (table_name) expected but not found",
+        "Column (extra, DATE) in table (ex_table_name) found but not expected",
+    ]
+
+    cursor.fetchall.return_value = cursor.fetchall.return_value[3:]
+    with pytest.raises(FireboltError, match="Table table_name does not exist"):
+        raise_on_tables_non_compatibility(cursor, mock_table, True)
+
+
+def status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://engine")
+    return httpx.HTTPStatusError(
+        "error", request=request, response=httpx.Response(status_code, request=request)
+    )
+
+
+@pytest.mark.parametrize(
+    "error,unavailable",
+    [
+        (ConnectionClosedError("closed"), True),
+        (EngineNotRunningError("stopped"), True),
+        (httpx.ConnectError("refused"), True),
+        (ConnectionResetError(), True),
+        (status_error(503), True),
+        (status_error(400), False),
+        (OperationalError("Error executing query:\ncorrupt file"), False),
+        (ProgrammingError("syntax error"), False),
+        (FireboltError("Ingestion verification failed"), False),
+    ],
+)
+def test_is_engine_unavailable_error(error: Exception, unavailable: bool):
+    assert is_engine_unavailable_error(error) == unavailable
@@ -0,0 +1,108 @@
+from unittest.mock import MagicMock, call
+
+import pytest
+from pytest_mock import MockerFixture
+
+from firebolt_ingest.table_model import Table
+from firebolt_ingest.table_service import TableService
+from firebolt_ingest.table_utils import execute_set_statements
+from firebolt_ingest.tracing import TracedCursor, Tracing
+
+sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+in_memory = pytest.importorskip(
+    "opentelemetry.sdk.trace.export.in_memory_span_exporter"
+)
+export = pytest.importorskip("opentelemetry.sdk.trace.export")
+
+
+@pytest.fixture
+def exporter():
+    return in_memory.InMemorySpanExporter()
+
+
+@pytest.fixture
+def tracing(exporter) -> Tracing:
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(export.SimpleSpanProcessor(exporter))
+    return Tracing(provider.get_tracer("test"))
+
+
+def test_traced_cursor_labels_statements(tracing: Tracing, exporter):
+    cursor = MagicMock()
+    traced = TracedCursor(cursor, tracing)
+
+    with tracing.span("parent", {}):
+        execute_set_statements(traced, advanced_mode=True)
+        traced.execute(query="SELECT 1")
+        traced.execute(query="SELECT 2")
+    with tracing.span("other", {}):
+        traced.execute(query="SELECT 3")
+
+    spans = exporter.get_finished_spans()
+    parent = next(s for s in spans if s.name == "parent")
+    other = next(s for s in spans if s.name == "other")
+    selects = [s for s in spans if s.name == "SELECT"]
+    assert selects[0].parent.span_id == parent.context.span_id
+    assert parent.attributes["firebolt.setting.advanced_mode"] == "1"
+    assert parent.attributes["firebolt.setting.mask_internal_errors"] == "1"
+
+    label = (
+        f"firebolt_ingest-{parent.context.trace_id:032x}"
+        f"-{parent.context.span_id:016x}"
+    )
+    other_label = (
+        f"firebolt_ingest-{other.context.trace_id:032x}"
+        f"-{other.context.span_id:016x}"
+    )
+    assert [s.attributes["firebolt.query_label"] for s in selects] == [
+        label,
+        label,
+        other_label,
+    ]
+    # the label is set once per span
+    assert cursor.execute.call_args_list[-5:] == [
+        call(f"SET query_label='{label}'"),
+        call(query="SELECT 1"),
+        call(query="SELECT 2"),
+        call(f"SET query_label='{other_label}'"),
+        call(query="SELECT 3"),
+    ]
+
+
+def test_table_service_spans(
+    mocker: MockerFixture, mock_table: Table, tracing: Tracing, exporter
+):
+    """
+    Public methods are spans, nested calls and statements are their children
+    """
+    connection = MagicMock()
+    connection.cursor.return_value.execute.return_value = 0
+    mocker.patch(
+        "firebolt_ingest.table_service.get_ingestion_rowcounts", return_value=(0, 0)
+    )
+    mocker.patch(
+        "firebolt_ingest.table_service.verify_ingestion_file_names",
+        return_value=True,
+    )
+    mock_table.sync_mode = "append"
+
+    ts = TableService(mock_table, connection, tracing=tracing)
+    ts.insert_incremental_append = MagicMock()
+    ts.insert()
+    ts.drop_internal_table()
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    assert spans["TableService.insert"].attributes == {
+        "firebolt.internal_table": "table_name",
+        "firebolt.external_table": "ex_table_name",
+        "firebolt.sync_mode": "append",
+    }
+    drop = spans["TableService.drop_internal_table"]
+    assert spans["DROP"].parent.span_id == drop.context.span_id
+    assert spans["DROP"].attributes["db.statement"].startswith("DROP TABLE")
+
+
+def test_tracing_disabled(mock_table: Table):
+    connection = MagicMock()
+    ts = TableService(mock_table, connection)
+    assert ts._cursor() is connection.cursor.return_value
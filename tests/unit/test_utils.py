@@ -0,0 +1,9 @@
+from datetime import date
+
+from firebolt_ingest.utils import format_sql_literal
+
+
+def test_format_sql_literal():
+    assert format_sql_literal(2022) == "2022"
+    assert format_sql_literal(date(2022, 1, 2)) == "'2022-01-02'"
+    assert format_sql_literal("it's") == "'it''s'"
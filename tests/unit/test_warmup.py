@@ -0,0 +1,134 @@
+from unittest.mock import MagicMock
+
+import pytest
+from firebolt.common.exception import QueryTimeoutError
+
+from firebolt_ingest.table_model import Column, DatetimePart, Partition, Table
+from firebolt_ingest.utils import format_query
+from firebolt_ingest.warmup import (
+    WarmupSettings,
+    generate_warmup_queries,
+    recent_partitions_query,
+    run_warmup,
+)
+
+
+@pytest.fixture
+def table() -> Table:
+    return Table(
+        table_name="events",
+        columns=[
+            Column(name="id", type="INTEGER"),
+            Column(name="country", type="TEXT"),
+            Column(name="tags", type="ARRAY(TEXT)"),
+        ],
+        partitions=[Partition(column_name="country")],
+        primary_index=["id"],
+        file_type="PARQUET",
+        object_pattern="*.parquet",
+    )
+
+
+def test_generate_warmup_queries(table: Table):
+    queries = generate_warmup_queries(
+        table, "events", WarmupSettings(hot_columns=["country", "tags"])
+    )
+    assert queries == [
+        ("primary_index", "SELECT MIN(id), MAX(id) FROM events"),
+        (
+            "hot_columns",
+            "SELECT MIN(country), MAX(country), MAX(LENGTH(tags)) FROM events",
+        ),
+    ]
+
+    with pytest.raises(ValueError, match="Unknown hot columns"):
+        generate_warmup_queries(table, "events", WarmupSettings(hot_columns=["x"]))
+
+
+def test_run_warmup_recent_partitions(table: Table):
+    """
+    Recent partitions are ordered by the latest value of the date/time column,
+    not by the cyclic partition value
+    """
+    table.columns.append(Column(name="event_time", type="TIMESTAMP"))
+    table.partitions = [
+        Partition(column_name="event_time", datetime_part=DatetimePart.DAY)
+    ]
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [(31,), (1,)]
+
+    steps = run_warmup(
+        cursor,
+        table,
+        "events",
+        WarmupSettings(primary_index=False, recent_partitions=2),
+    )
+
+    cursor.execute.assert_any_call(
+        query=format_query(
+            "SELECT EXTRACT(DAY FROM event_time) FROM events "
+            "GROUP BY EXTRACT(DAY FROM event_time) "
+            "ORDER BY MAX(event_time) DESC LIMIT 2"
+        ),
+        timeout_seconds=pytest.approx(60, abs=1),
+    )
+    assert [(s.name, s.skipped) for s in steps] == [("recent_partitions", False)]
+    assert steps[0].query == (
+        "SELECT COUNT(*), MIN(id), MAX(id) FROM events "
+        "WHERE EXTRACT(DAY FROM event_time) IN (31, 1)"
+    )
+
+
+def test_recent_partitions_query_requires_date_time_partition(table: Table):
+    cursor = MagicMock()
+    assert (
+        recent_partitions_query(
+            cursor, table, "events", WarmupSettings(recent_partitions=2)
+        )
+        is None
+    )
+    cursor.execute.assert_not_called()
+
+
+def test_run_warmup_timeout(table: Table):
+    """
+    A scan exceeding the time budget is aborted, the later scans are skipped
+    """
+    cursor = MagicMock()
+    cursor.execute.side_effect = QueryTimeoutError()
+
+    steps = run_warmup(
+        cursor,
+        table,
+        "events",
+        WarmupSettings(hot_columns=["country"], time_budget_seconds=0.5),
+    )
+
+    assert [(s.name, s.skipped, s.timed_out) for s in steps] == [
+        ("primary_index", False, True),
+        ("hot_columns", True, False),
+    ]
+    cursor.execute.assert_called_once()
+    assert cursor.execute.call_args.kwargs["timeout_seconds"] <= 0.5
+
+
+def test_run_warmup_time_budget(table: Table, mocker):
+    """
+    Steps starting after the time budget is spent are skipped
+    """
+    time_mock = mocker.patch("firebolt_ingest.warmup.time")
+    time_mock.monotonic.side_effect = [0, 0, 0, 5, 20]
+    cursor = MagicMock()
+
+    steps = run_warmup(
+        cursor,
+        table,
+        "events",
+        WarmupSettings(hot_columns=["country"], time_budget_seconds=10),
+    )
+
+    assert [(s.name, s.duration_seconds, s.skipped) for s in steps] == [
+        ("primary_index", 5, False),
+        ("hot_columns", 0.0, True),
+    ]
+    cursor.execute.assert_called_once()
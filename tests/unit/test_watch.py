@@ -0,0 +1,223 @@
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from firebolt_ingest.file_source import LocalFileSource, SourceFile
+from firebolt_ingest.file_state import FileStateStore
+from firebolt_ingest.table_service import IsolatedInsertResult
+from firebolt_ingest.watch import IngestionWatcher, WatchSettings
+
+
+@pytest.fixture
+def table_service() -> MagicMock:
+    table_service = MagicMock()
+    table_service.get_ingested_file_names.return_value = {"old.parquet"}
+    table_service.insert_files_isolating_failures.side_effect = ingest_all
+    return table_service
+
+
+def ingest_all(file_names, **kwargs) -> IsolatedInsertResult:
+    return IsolatedInsertResult(list(file_names), {}, [len(file_names)])
+
+
+def write_files(directory, *names, size=10):
+    for name in names:
+        (directory / name).write_bytes(b"x" * size)
+
+
+def test_watch_batches_by_file_count(tmp_path, table_service: MagicMock):
+    """
+    New files are buffered until max_batch_files is reached,
+    already ingested files are ignored
+    """
+    write_files(tmp_path, "old.parquet", "a.parquet")
+    watcher = IngestionWatcher(
+        table_service,
+        LocalFileSource(str(tmp_path), "*.parquet"),
+        WatchSettings(max_batch_files=2, max_batch_age_seconds=3600),
+        advanced_mode=True,
+    )
+
+    watcher.run_once()
+    assert [f.name for f in watcher.buffered_files] == ["a.parquet"]
+    table_service.insert_files_isolating_failures.assert_not_called()
+
+    write_files(tmp_path, "b.parquet")
+    watcher.run_once()
+    watcher._collect(wait=True)
+    table_service.insert_files_isolating_failures.assert_called_once_with(
+        ["a.parquet", "b.parquet"], quarantine_table_name=None, advanced_mode=True
+    )
+
+    # nothing new, no empty inserts
+    watcher.run_once()
+    watcher._collect(wait=True)
+    assert table_service.insert_files_isolating_failures.call_count == 1
+    table_service.get_ingested_file_names.assert_called_once()
+
+
+def test_watch_batches_by_bytes(tmp_path, table_service: MagicMock):
+    """
+    A batch never exceeds max_batch_bytes, unless a single file does
+    """
+    write_files(tmp_path, "a.parquet", "b.parquet", "c.parquet", size=60)
+    watcher = IngestionWatcher(
+        table_service,
+        LocalFileSource(str(tmp_path)),
+        WatchSettings(max_batch_bytes=100, max_batch_age_seconds=3600),
+    )
+
+    watcher.run_once()
+    watcher._collect(wait=True)
+    table_service.insert_files_isolating_failures.assert_called_once_with(
+        ["a.parquet"], quarantine_table_name=None
+    )
+    assert len(watcher.buffered_files) == 2
+
+
+def test_watch_backpressure(tmp_path, table_service: MagicMock):
+    """
+    While an insert is running no other insert starts, and polling pauses
+    once max_buffered_files are waiting
+    """
+    release = threading.Event()
+
+    def insert(file_names, **kwargs):
+        release.wait(5)
+        return ingest_all(file_names)
+
+    table_service.insert_files_isolating_failures.side_effect = insert
+
+    write_files(tmp_path, "a.parquet")
+    watcher = IngestionWatcher(
+        table_service,
+        LocalFileSource(str(tmp_path)),
+        WatchSettings(max_batch_age_seconds=0, max_buffered_files=1),
+    )
+    watcher.run_once()
+    assert watcher.is_inserting
+
+    write_files(tmp_path, "b.parquet", "c.parquet")
+    assert watcher.poll() == 1
+    assert watcher.poll() == 0
+    assert not watcher.flush()
+
+    release.set()
+    watcher._collect(wait=True)
+    assert watcher.flush()
+    watcher._collect(wait=True)
+    table_service.insert_files_isolating_failures.assert_called_with(
+        ["b.parquet"], quarantine_table_name=None
+    )
+
+
+def test_watch_failed_insert_is_retried(tmp_path, table_service: MagicMock):
+    """
+    Files of a failed insert return to the buffer and are ingested again
+    """
+    table_service.insert_files_isolating_failures.side_effect = [
+        RuntimeError("engine is down"),
+        ingest_all(["a.parquet"]),
+    ]
+    write_files(tmp_path, "a.parquet")
+    watcher = IngestionWatcher(
+        table_service,
+        LocalFileSource(str(tmp_path)),
+        WatchSettings(max_batch_age_seconds=0, retry_backoff_seconds=3600),
+    )
+
+    watcher.run_once()
+    watcher._collect(wait=True)
+    assert [f.name for f in watcher.buffered_files] == ["a.parquet"]
+
+    # backed off, not retried on the next poll
+    watcher.run_once()
+    assert not watcher.is_inserting
+
+    watcher._retry_at = 0
+    watcher.run_once()
+    watcher._collect(wait=True)
+    assert watcher.buffered_files == []
+    assert table_service.insert_files_isolating_failures.call_count == 2
+
+
+def test_watch_stop_flushes_buffer(tmp_path, table_service: MagicMock):
+    """
+    run() returns after stop() and ingests what is left in the buffer
+    """
+    write_files(tmp_path, "a.parquet")
+    watcher = IngestionWatcher(
+        table_service,
+        LocalFileSource(str(tmp_path)),
+        WatchSettings(poll_interval_seconds=0.01, max_batch_age_seconds=3600),
+    )
+
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    watcher.stop()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    table_service.insert_files_isolating_failures.assert_called_once_with(
+        ["a.parquet"], quarantine_table_name=None
+    )
+
+
+def test_watch_skips_identical_files(tmp_path, table_service: MagicMock):
+    """
+    Files with the etag of an ingested or buffered file are not ingested
+    """
+    listed = [
+        SourceFile("a.parquet", 10, datetime(2024, 1, 1), "e1"),
+        SourceFile("a_copy.parquet", 10, datetime(2024, 1, 2), "e1"),
+    ]
+    file_source = MagicMock()
+    file_source.list_files.side_effect = lambda: list(listed)
+    file_state = FileStateStore(str(tmp_path / "files.json"), "table_name")
+    watcher = IngestionWatcher(
+        table_service, file_source, WatchSettings(max_batch_files=1), file_state
+    )
+
+    watcher.run_once()
+    watcher._collect(wait=True)
+    table_service.insert_files_isolating_failures.assert_called_once_with(
+        ["a.parquet"], quarantine_table_name=None
+    )
+    assert file_state.get_etag("a.parquet") == "e1"
+
+    listed.append(SourceFile("b.parquet", 10, datetime(2024, 1, 3), "e1"))
+    watcher.run_once()
+    watcher._collect(wait=True)
+    assert table_service.insert_files_isolating_failures.call_count == 1
+
+
+def test_watch_quarantined_files_are_not_retried(tmp_path, table_service: MagicMock):
+    """
+    Failing files are quarantined, the rest of their batch is ingested,
+    files quarantined by a previous run are not polled
+    """
+    table_service.get_quarantined_file_names.return_value = {"old_bad.parquet"}
+    table_service.insert_files_isolating_failures.side_effect = [
+        IsolatedInsertResult(["a.parquet"], {"bad.parquet": "corrupt"}, [2, 1, 1])
+    ]
+    write_files(tmp_path, "a.parquet", "bad.parquet", "old_bad.parquet")
+    watcher = IngestionWatcher(
+        table_service,
+        LocalFileSource(str(tmp_path)),
+        WatchSettings(max_batch_age_seconds=0),
+        quarantine_table_name="quarantine",
+    )
+
+    watcher.run_once()
+    watcher._collect(wait=True)
+    table_service.insert_files_isolating_failures.assert_called_once_with(
+        ["a.parquet", "bad.parquet"], quarantine_table_name="quarantine"
+    )
+    table_service.get_quarantined_file_names.assert_called_once_with("quarantine")
+
+    watcher.run_once()
+    watcher._collect(wait=True)
+    assert watcher.buffered_files == []
+    assert table_service.insert_files_isolating_failures.call_count == 1